@@ -0,0 +1,399 @@
+"""
+Compression.
+
+Compress output files with gzip, xz or zstd, chosen by the extension of the
+file name. Data is split into blocks compressed independently on threads,
+and each block is a complete gzip member, xz stream or zstd frame. Blocks
+appended to a file are read as one stream by gzip, xz and zstd tools and by
+pandas.read_csv.
+
+Input logs are read in the same way, e.g. LOG.dat.gz, and members of zip
+archives are addressed as ARCHIVE.zip/MEMBER, e.g. day.zip/LOG.dat.gz.
+
+zstd requires the zstandard package.
+"""
+
+import os
+import gzip
+import lzma
+import zipfile
+import functools
+import contextlib
+import concurrent.futures
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Compression by extension of file name
+EXTENSIONS = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+# Default levels, chosen to keep up with writing csv files
+LEVELS = {"gzip": 6, "xz": 1, "zstd": 3}
+# Data compressed by a thread at once
+BLOCK_SIZE = 1 << 20
+# Extension of archives whose members are read as ARCHIVE.zip/MEMBER
+ARCHIVE = ".zip"
+# Data decompressed at once
+READ_SIZE = 1 << 22
+
+
+def compression_of(filename: str) -> Optional[str]:
+    """
+    Compression of a file by its extension.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, e.g. LOG_A.csv.gz.
+
+    Returns
+    -------
+    str or None
+        One of EXTENSIONS, or None for a file without compression.
+    """
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def splitext(filename: str) -> Tuple[str, str]:
+    """
+    Split extension including that of compression, e.g. (LOG_T, .csv.gz).
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+
+    Returns
+    -------
+    Tuple[str, str]
+        Root and extension.
+    """
+    root, ext = os.path.splitext(filename)
+    if ext.lower() in EXTENSIONS:
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return root, ext
+
+
+def compress_block(dat: bytes, compression: str, level: Optional[int] = None) -> bytes:
+    """
+    Compress data into a gzip member, xz stream or zstd frame.
+
+    zlib, lzma and zstandard release the GIL while compressing, so that
+    blocks are compressed in parallel on threads.
+
+    Parameters
+    ----------
+    dat : bytes
+        Data to be compressed.
+    compression : str
+        "gzip", "xz" or "zstd".
+    level : int, optional
+        Compression level. The default is LEVELS.
+
+    Returns
+    -------
+    bytes
+        Compressed data.
+    """
+    level = LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        return gzip.compress(dat, compresslevel=level, mtime=0)
+    if compression == "xz":
+        return lzma.compress(dat, preset=level)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compress(dat)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+@functools.lru_cache(maxsize=None)
+def _executor() -> concurrent.futures.ThreadPoolExecutor:
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=os.cpu_count() or 1, thread_name_prefix="compression"
+    )
+
+
+def compress_many(
+    items: Sequence[Tuple[bytes, Optional[str]]], level: Optional[int] = None
+) -> List[bytes]:
+    """
+    Compress data of several files at once.
+
+    Blocks of all data are compressed in parallel.
+
+    Parameters
+    ----------
+    items : Sequence[Tuple[bytes, Optional[str]]]
+        Data and its compression. Data with None is kept as it is.
+    level : int, optional
+        Compression level. The default is LEVELS.
+
+    Returns
+    -------
+    List[bytes]
+        Compressed data of each item, the blocks of which are concatenated.
+    """
+    blocks = [
+        (i, dat[start : start + BLOCK_SIZE], compression)
+        for i, (dat, compression) in enumerate(items)
+        if compression is not None
+        for start in range(0, len(dat), BLOCK_SIZE)
+    ]
+    compressed = _executor().map(
+        lambda block: compress_block(block[1], block[2], level), blocks
+    )
+    out = [[] if compression is not None else [dat] for dat, compression in items]
+    for (i, _, _), dat in zip(blocks, compressed):
+        out[i].append(dat)
+    return [b"".join(dat) for dat in out]
+
+
+def compress(
+    dat: bytes, compression: Optional[str], level: Optional[int] = None
+) -> bytes:
+    """
+    Compress data in blocks in parallel.
+
+    Parameters
+    ----------
+    dat : bytes
+        Data to be compressed.
+    compression : str or None
+        "gzip", "xz" or "zstd". None returns the data as it is.
+    level : int, optional
+        Compression level. The default is LEVELS.
+
+    Returns
+    -------
+    bytes
+        Compressed data.
+    """
+    return compress_many([(dat, compression)], level)[0]
+
+
+def write(filename: str, dat: bytes, append: bool = False) -> None:
+    """
+    Write data to a file compressed by its extension.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, e.g. LOG_A.csv.gz.
+    dat : bytes
+        Data before compression.
+    append : bool, optional
+        Append to the end of the file. The default is False.
+
+    Returns
+    -------
+    None.
+    """
+    with open(filename, mode="ab" if append else "wb") as f:
+        f.write(compress(dat, compression_of(filename)))
+
+
+def split_member(filename: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a member of zip archive, e.g. (day.zip, LOG.dat.gz).
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, or ARCHIVE.zip/MEMBER.
+
+    Returns
+    -------
+    Tuple[str, Optional[str]]
+        Archive and member. filename and None if it is not a member.
+    """
+    lower = filename.lower().replace(os.sep, "/")
+    position = lower.find(ARCHIVE + "/")
+    if position < 0:
+        return filename, None
+    end = position + len(ARCHIVE)
+    return filename[:end], filename[end + 1 :]
+
+
+def mappable(filename: str) -> bool:
+    """
+    Whether a file is stored as it is, so that it can be memory-mapped.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, or ARCHIVE.zip/MEMBER.
+
+    Returns
+    -------
+    bool
+        False for compressed files and members of zip archives.
+    """
+    return split_member(filename)[1] is None and compression_of(filename) is None
+
+
+def list_logs(filename: str, extension: str = ".dat") -> List[str]:
+    """
+    Logs in a zip archive, or the file itself.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file or zip archive.
+    extension : str, optional
+        Extension of logs before compression. The default is ".dat".
+
+    Returns
+    -------
+    List[str]
+        ARCHIVE.zip/MEMBER of each log in the archive in order, or
+        [filename] if it is not a zip archive.
+    """
+    if os.path.splitext(filename)[1].lower() != ARCHIVE:
+        return [filename]
+    extensions = {extension} | {extension + ext for ext in EXTENSIONS}
+    with zipfile.ZipFile(filename) as archive:
+        return [
+            f"{filename}/{info.filename}"
+            for info in archive.infolist()
+            if splitext(info.filename)[1].lower() in extensions
+        ]
+
+
+def input_size(filename: str) -> Optional[int]:
+    """
+    Size of a file after decompression, if it is known without reading.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, or ARCHIVE.zip/MEMBER.
+
+    Returns
+    -------
+    int or None
+        Size in byte. None for compressed files.
+    """
+    archive, member = split_member(filename)
+    if compression_of(member if member is not None else filename) is not None:
+        return None
+    if member is None:
+        return os.path.getsize(filename)
+    with zipfile.ZipFile(archive) as f:
+        return f.getinfo(member).file_size
+
+
+@contextlib.contextmanager
+def open_input(filename: str) -> Iterator[BinaryIO]:
+    """
+    Open a file for reading, decompressed by its extension.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, e.g. LOG.dat.gz, or ARCHIVE.zip/MEMBER.
+
+    Yields
+    ------
+    BinaryIO
+        Decompressed stream, closed with all underlying files.
+    """
+    archive, member = split_member(filename)
+    with contextlib.ExitStack() as stack:
+        if member is None:
+            raw = stack.enter_context(open(filename, "rb"))
+            compression = compression_of(filename)
+        else:
+            # メンバーを閉じるまでアーカイブのファイルは開いたまま
+            with zipfile.ZipFile(archive) as f:
+                raw = stack.enter_context(f.open(member))
+            compression = compression_of(member)
+        if compression == "gzip":
+            raw = stack.enter_context(gzip.GzipFile(fileobj=raw))
+        elif compression == "xz":
+            raw = stack.enter_context(lzma.LZMAFile(raw))
+        elif compression == "zstd":
+            import zstandard
+
+            raw = stack.enter_context(
+                zstandard.ZstdDecompressor().stream_reader(
+                    raw, read_across_frames=True, closefd=False
+                )
+            )
+        yield raw
+
+
+def read_blocks(
+    fobj: BinaryIO,
+    size: Optional[int] = None,
+    record_size: int = 32,
+    prefix: bytes = b"",
+    block_size: int = READ_SIZE,
+) -> Iterator[bytes]:
+    """
+    Read whole records from the current position in blocks of block_size.
+
+    Short reads of decompressing streams are joined, so that blocks are
+    always cut at the boundary of records.
+
+    Parameters
+    ----------
+    fobj : BinaryIO
+        Stream, e.g. of open_input.
+    size : int, optional
+        Bytes to be read including prefix. The default is None, until the end.
+    record_size : int, optional
+        Size of a record. The default is 32.
+    prefix : bytes, optional
+        Data already read from the stream. The default is b"".
+    block_size : int, optional
+        Bytes read at once. The default is READ_SIZE.
+
+    Yields
+    ------
+    bytes
+        Block of whole records. The last incomplete record is not yielded.
+    """
+    rest = prefix
+    remaining = None if size is None else size - len(prefix)
+    while remaining is None or remaining > 0:
+        request = block_size if remaining is None else min(block_size, remaining)
+        dat = fobj.read(request)
+        if len(dat) == 0:
+            break
+        if remaining is not None:
+            remaining -= len(dat)
+        dat = rest + dat if len(rest) > 0 else dat
+        end = len(dat) // record_size * record_size
+        rest = dat[end:]
+        if end > 0:
+            yield dat[:end]
+    end = len(rest) // record_size * record_size
+    if end > 0:
+        yield rest[:end]
+
+
+def read_records(filename: str, record_size: int = 32) -> np.ndarray:
+    """
+    Read all records of a file, decompressed by its extension.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file, e.g. LOG.dat.gz, or ARCHIVE.zip/MEMBER.
+    record_size : int, optional
+        Size of a record. The default is 32.
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array with shape (number of records, record_size).
+    """
+    with open_input(filename) as fobj:
+        blocks = [
+            np.frombuffer(block, dtype=np.uint8)
+            for block in read_blocks(fobj, record_size=record_size)
+        ]
+    if len(blocks) == 0:
+        return np.empty((0, record_size), dtype=np.uint8)
+    return np.concatenate(blocks).reshape(-1, record_size)
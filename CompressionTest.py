@@ -0,0 +1,133 @@
+import io
+import os
+import gzip
+import lzma
+import shutil
+import zipfile
+import tempfile
+import unittest
+import importlib.util
+import numpy as np
+from Compression import *
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.dat = rng.integers(0, 10, 3 * BLOCK_SIZE + 123, dtype=np.uint8).tobytes()
+
+    def test_blocks(self):
+        # 独立に圧縮したブロックを連結しても一つのファイルとして読める
+        self.assertEqual(gzip.decompress(compress(self.dat, "gzip")), self.dat)
+        self.assertEqual(lzma.decompress(compress(self.dat, "xz")), self.dat)
+        self.assertEqual(compress(self.dat, None), self.dat)
+
+    def test_compress_many(self):
+        items = [(self.dat, "gzip"), (b"abc", None), (b"", "xz"), (self.dat[:10], "xz")]
+        out = compress_many(items)
+        self.assertEqual(gzip.decompress(out[0]), self.dat)
+        self.assertEqual(out[1], b"abc")
+        self.assertEqual(out[2], b"")
+        self.assertEqual(lzma.decompress(out[3]), self.dat[:10])
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "needs zstandard")
+    def test_zstd(self):
+        import zstandard
+
+        stream = compress(self.dat, "zstd")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            stream, read_across_frames=True
+        )
+        self.assertEqual(reader.read(), self.dat)
+
+    def test_names(self):
+        self.assertEqual(compression_of("LOG_A.csv.gz"), "gzip")
+        self.assertEqual(compression_of("LOG_A.CSV.XZ"), "xz")
+        self.assertIsNone(compression_of("LOG_A.csv"))
+        self.assertEqual(splitext("LOG_T.csv.zst"), ("LOG_T", ".csv.zst"))
+        self.assertEqual(splitext("LOG_T.csv"), ("LOG_T", ".csv"))
+
+
+class ShortReader(io.RawIOBase):
+    # 解凍のストリームのように要求より短く返す
+    def __init__(self, dat):
+        self.dat = dat
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), 100, len(self.dat) - self.position)
+        buffer[:n] = self.dat[self.position : self.position + n]
+        self.position += n
+        return n
+
+
+class TestInput(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.dat = rng.integers(0, 10, 32 * 1000 + 5, dtype=np.uint8).tobytes()
+        self.plain = os.path.join(self.directory, "LOG.dat")
+        with open(self.plain, "wb") as f:
+            f.write(self.dat)
+        write(self.plain + ".gz", self.dat)
+        write(self.plain + ".xz", self.dat)
+        self.archive = os.path.join(self.directory, "day.zip")
+        with zipfile.ZipFile(self.archive, "w", zipfile.ZIP_DEFLATED) as f:
+            f.write(self.plain, "LOG.dat")
+            f.write(self.plain + ".xz", "sub/LOG2.dat.xz")
+            f.writestr("readme.txt", "not a log")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_open_input(self):
+        for filename in [
+            self.plain,
+            self.plain + ".gz",
+            self.plain + ".xz",
+            self.archive + "/LOG.dat",
+            self.archive + "/sub/LOG2.dat.xz",
+        ]:
+            with open_input(filename) as f:
+                self.assertEqual(f.read(), self.dat, filename)
+            records = read_records(filename)
+            self.assertEqual(records.shape, (1000, 32))
+            self.assertEqual(records.tobytes(), self.dat[:32000])
+
+    def test_names(self):
+        self.assertEqual(
+            list_logs(self.archive),
+            [self.archive + "/LOG.dat", self.archive + "/sub/LOG2.dat.xz"],
+        )
+        self.assertEqual(list_logs(self.plain), [self.plain])
+        self.assertEqual(
+            split_member("a/day.ZIP/sub/LOG.dat"), ("a/day.ZIP", "sub/LOG.dat")
+        )
+        self.assertEqual(split_member(self.plain), (self.plain, None))
+        self.assertEqual(input_size(self.plain), len(self.dat))
+        self.assertEqual(input_size(self.archive + "/LOG.dat"), len(self.dat))
+        self.assertIsNone(input_size(self.plain + ".gz"))
+        self.assertTrue(mappable(self.plain))
+        self.assertFalse(mappable(self.plain + ".xz"))
+        self.assertFalse(mappable(self.archive + "/LOG.dat"))
+
+    def test_read_blocks(self):
+        # 短い読み込みでもレコードの境界で区切る
+        blocks = list(
+            read_blocks(
+                io.BufferedReader(ShortReader(self.dat[7:]), 50),
+                prefix=self.dat[:7],
+                block_size=1000,
+            )
+        )
+        self.assertTrue(all(len(block) % 32 == 0 for block in blocks))
+        self.assertEqual(b"".join(blocks), self.dat[:32000])
+        blocks = list(read_blocks(io.BytesIO(self.dat[64:]), 640, prefix=b"x" * 64))
+        self.assertEqual(b"".join(blocks), b"x" * 64 + self.dat[64:640])
+
+
+if __name__ == "__main__":
+    unittest.main()
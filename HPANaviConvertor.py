@@ -4,7 +4,10 @@ import os
 import threading
 import tkinter as tk
 import tkinter.filedialog
-import SylphideProcessor
+import tkinter.messagebox
+import Compression
+import LogConvertor
+import LogSurvey
 
 
 class Application(tk.Frame):
@@ -28,6 +31,17 @@ class Application(tk.Frame):
         self.raw = tk.Checkbutton(self, text=u'Unit conversion', variable=self.raw_val)
         self.raw.pack(padx=_pad[0], pady=_pad[1])
 
+        self.incremental_val = tk.BooleanVar()
+        self.incremental = tk.Checkbutton(self, text=u'Incremental',
+                                          variable=self.incremental_val)
+        self.incremental.pack(padx=_pad[0], pady=_pad[1])
+
+        self.compression_val = tk.StringVar()
+        self.compression_val.set(u'none')
+        self.compression = tk.OptionMenu(self, self.compression_val,
+                                         u'none', *LogConvertor.EXTENSIONS)
+        self.compression.pack(padx=_pad[0], pady=_pad[1])
+
         self.bt = tk.Button(self, text=u'Open & Convert',
                             command=self.fileopen)
         self.bt.pack(fill=tk.BOTH, padx=_pad[0], pady=_pad[1])
@@ -47,6 +61,11 @@ class Application(tk.Frame):
         self.lbst = tk.Label(self, textvariable=self.status_str)
         self.lbst.pack(anchor=tk.W, padx=_pad[0], pady=_pad[1])
 
+        self.survey_str = tk.StringVar()
+        self.lbsv = tk.Label(self, textvariable=self.survey_str,
+                             font=("Courier", 9), justify=tk.LEFT)
+        self.lbsv.pack(anchor=tk.W, padx=_pad[0], pady=_pad[1])
+
     def fileopen(self):
         """
         File open dialog.
@@ -56,134 +75,103 @@ class Application(tk.Frame):
         None.
 
         """
-        fTyp = [("log file", "*.dat")]
+        fTyp = [("log file", "*.dat *.dat.gz *.dat.xz *.dat.zst *.zip")]
         filename = tk.filedialog.askopenfilename(filetypes=fTyp)
         if len(filename) > 0:
-            self.bt.configure(state=tk.DISABLED)
-            self.raw.configure(state=tk.DISABLED)
-            self.status_str.set(u"File selected.")
-            th = threading.Thread(target=self.convert, args=(filename,))
+            # 圧縮されたログの調査は展開に時間がかかるので、別のスレッドで行う
+            self.set_state(tk.DISABLED)
+            self.status_str.set(u"Surveying file.")
+            th = threading.Thread(target=self.survey, args=(filename,))
             th.start()
 
-    def func_handler_append(self, func, *args):
+    def set_state(self, state):
         """
-        Page selector for appending converted data.
+        Enable or disable the controls.
 
         Parameters
         ----------
-        func : TYPE
-            DESCRIPTION.
-        *args : TYPE
-            DESCRIPTION.
+        state : str
+            tk.NORMAL or tk.DISABLED.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        None.
 
         """
-        return func.append(*args)
+        self.bt.configure(state=state)
+        self.raw.configure(state=state)
+        self.incremental.configure(state=state)
+        self.compression.configure(state=state)
 
-    def func_handler_raw2phys(self, func):
+    def survey(self, filename):
         """
-        Page selector for converting data with pysical units.
+        Survey log files before conversion.
 
         Parameters
         ----------
-        func : TYPE
-            DESCRIPTION.
+        filename : str
+            Selected file. All logs of a zip archive are surveyed.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        None.
 
         """
-        return func.raw2phys()
-
-    def func_handler_save_raw_csv(self, func, *args):
+        # 変換前にページの数や欠落を表示して確認
+        # zipはアーカイブ内のログをすべて変換
+        filenames = Compression.list_logs(filename)
+        self.survey_str.set(u'\n\n'.join(
+            LogSurvey.LogSurvey(log).format() for log in filenames))
+        # 確認のダイアログはメインスレッドで開く
+        self.after(0, self.confirm, filenames)
+
+    def confirm(self, filenames):
         """
-        Page selector for saving csv file.
+        Ask whether to convert the surveyed log files.
 
         Parameters
         ----------
-        func : TYPE
-            DESCRIPTION.
-        *args : TYPE
-            DESCRIPTION.
+        filenames : list of str
+            Log files to be converted, e.g. LOG.dat.gz or ARCHIVE.zip/MEMBER.
 
         Returns
         -------
-        TYPE
-            DESCRIPTION.
+        None.
 
         """
-        return func.save_raw_csv(*args)
-
-    def convert(self, filename):
+        if not tk.messagebox.askyesno(u"Convert", u"Convert this file?"):
+            self.set_state(tk.NORMAL)
+            self.status_str.set(u"Select file.")
+            return
+        self.status_str.set(u"File selected.")
+        th = threading.Thread(target=self.convert, args=(filenames,))
+        th.start()
+
+    def convert(self, filenames):
         """
-        Open and convert binary log file.
+        Open and convert binary log files.
 
         Parameters
         ----------
-        filename : str
-            Log file to be converted.
+        filenames : list of str
+            Log files to be converted, e.g. LOG.dat.gz or ARCHIVE.zip/MEMBER.
 
         Returns
         -------
         None.
 
         """
-        with open(filename, 'rb') as fobj:
+        compression = self.compression_val.get()
+        for filename in filenames:
             self.filename_str.set(u"File name: " + filename)
-            filesize = os.path.getsize(filename)
+            filesize = Compression.input_size(filename)
+            if filesize is None:
+                filesize = os.path.getsize(Compression.split_member(filename)[0])
             self.filesize_str.set("File size: {0:,} byte".format(filesize))
-            self.status_str.set(u"File opened.")
-            name, _ = os.path.splitext(filename)
-            readsize = 0
-            pb_previous = 0
-
-            page = SylphideProcessor.Page()
-            page_list = ["A", "B", "F", "H", "L", "M", "N", "O", "P", "R", "S", "T", "U", "V"]
-            pages = {
-                page_elem: getattr(SylphideProcessor, f"Page{page_elem}")()
-                for page_elem in page_list
-            }
-            pages["G"] = SylphideProcessor.PageG()
-
-            self.status_str.set(u"Reading file.")
-            while True:
-                h_data = fobj.read(page.size)
-                if len(h_data) < page.size:
-                    break
-                readsize += page.size
-                pb_current = int(readsize / filesize * 100)
-                if pb_previous < pb_current:
-                    self.status_str.set(u"Reading file. {}% done."
-                                        .format(pb_current))
-                    pb_previous = pb_current
-                page_upper = chr(h_data[0]).upper()
-                if page_upper in pages:
-                    self.func_handler_append(pages[page_upper], h_data)
-
-            if self.raw_val.get() == True:
-                self.status_str.set(u"Converting unit.")
-                for page_elem in page_list:
-                    self.func_handler_raw2phys(pages[page_elem])
-
-            self.status_str.set(u"Writing csv files.")
-            for page_elem in page_list:
-                self.func_handler_save_raw_csv(
-                    pages[page_elem],
-                    name + "_" + page_elem.upper() + ".csv"
-                )
-
-            self.status_str.set(u"Writing ubx file.")
-            pages["G"].save_raw_ubx(name + "_G.ubx")
-
-            self.status_str.set(u"Done.")
-            self.bt.configure(state=tk.NORMAL)
-            self.raw.configure(state=tk.NORMAL)
+            LogConvertor.convert(filename, self.raw_val.get(),
+                                 self.incremental_val.get(), self.status_str.set,
+                                 None if compression == u'none' else compression)
+        self.set_state(tk.NORMAL)
 
 if __name__ == '__main__':
     root = tk.Tk()
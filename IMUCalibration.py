@@ -0,0 +1,383 @@
+"""
+IMU Calibration.
+
+Fit the accelerometer and gyroscope constants of [A] in config.ini from a
+calibration session, i.e. the unit left still in each of the six
+orientations, X, Y and Z axis up and down, with any motion between them.
+
+Static segments are found with the rolling variance of every sample, computed
+from cumulative sums. Following the memo in [A], the offset of an axis is the
+mean of the four orientations where the axis is horizontal, its scaling is
+the half difference between up and down divided by GRAVITY, and the offset
+of the gyroscope is its mean while static. The scaling of the gyroscope is a
+constant of the sensor and kept as it is.
+
+Usage
+-----
+python IMUCalibration.py LOG.dat [--update config.ini]
+python IMUCalibration.py LOG_A.csv
+"""
+
+import os
+import argparse
+import configparser
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import Compression
+import SylphideProcessor
+
+GRAVITY = 9.80665
+AXES = "xyz"
+# Columns of raw acceleration and angular rate in decoded page A
+COLUMNS = slice(2, 8)
+# Samples of cumulative sums kept exact in int64
+CHUNK = 1 << 12
+# Bounds of normalized acceleration to assign a segment to an orientation
+ALIGNED = 0.7
+HORIZONTAL = 0.5
+
+
+def read_samples(filename: str) -> np.ndarray:
+    """
+    Read raw acceleration and angular rate of page A.
+
+    Parameters
+    ----------
+    filename : str
+        Log file, e.g. LOG.dat or LOG.dat.gz, or csv file of page A converted
+        without unit conversion, e.g. LOG_A.csv.
+
+    Returns
+    -------
+    np.ndarray
+        int64 array with shape (number of samples, 6), acceleration X, Y, Z
+        and angular rate X, Y, Z.
+    """
+    if Compression.splitext(filename)[1].lower().startswith(".csv"):
+        values = pd.read_csv(filename).to_numpy()[:, COLUMNS]
+    else:
+        records = Compression.read_records(filename)
+        records = records[SylphideProcessor.DISPATCH[records[:, 0]] == ord("A")]
+        values = SylphideProcessor.PageA().unpack_array(records)[:, COLUMNS]
+    return np.rint(values.astype(np.float64)).astype(np.int64)
+
+
+def window_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum of every window of samples from cumulative sums.
+
+    Cumulative sums restart at every CHUNK samples, so that they do not
+    overflow int64 even for squares of 24 bit samples, and the sum of a
+    window crossing the start of a chunk adds the total of the previous one.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        int64 samples with shape (N, M). Absolute values must be below 2**24.
+    window : int
+        Number of samples in a window, at most CHUNK.
+
+    Returns
+    -------
+    np.ndarray
+        int64 sums with shape (N - window + 1, M). Row i is the sum of
+        x[i:i + window].
+    """
+    if not 0 < window <= CHUNK:
+        raise ValueError(f"window must be 1 to {CHUNK}: {window}")
+    n = len(x)
+    chunks = n // CHUNK + 1
+    shape = (chunks, CHUNK) + x.shape[1:]
+    padded = np.zeros((chunks * CHUNK,) + x.shape[1:], dtype=np.int64)
+    padded[:n] = x
+    totals = padded.reshape(shape).sum(axis=1)
+    # prefix[k] はチャンクの先頭から k の前までの和
+    shifted = np.zeros_like(padded)
+    shifted[1:] = padded[:-1]
+    shifted[::CHUNK] = 0
+    prefix = np.cumsum(shifted.reshape(shape), axis=1).reshape(padded.shape)
+    count = n - window + 1
+    sums = prefix[window : window + count] - prefix[:count]
+    # 次のチャンクにまたがる窓
+    crossed = np.flatnonzero(np.arange(count) % CHUNK + window >= CHUNK)
+    sums[crossed] += totals[crossed // CHUNK]
+    return sums
+
+
+def rolling_variance(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    Variance of every window of samples.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        int64 samples with shape (N, M), e.g. 24 bit raw values.
+    window : int
+        Number of samples in a window, at most CHUNK.
+
+    Returns
+    -------
+    np.ndarray
+        Variance with shape (N - window + 1, M). Row i is the variance of
+        x[i:i + window].
+    """
+    mean = window_sums(x, window) / window
+    return np.maximum(window_sums(x * x, window) / window - mean * mean, 0.0)
+
+
+def static_segments(
+    x: np.ndarray, window: int = 64, factor: float = 3.0, min_length: int = 512
+) -> np.ndarray:
+    """
+    Find segments where all channels are still.
+
+    A window is still when the variance of every channel is at most factor**2
+    times its noise, the 10th percentile of the variance of windows without
+    overlap.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        int64 samples with shape (N, M).
+    window : int, optional
+        Number of samples of the rolling variance. The default is 64.
+    factor : float, optional
+        Threshold of the standard deviation relative to the noise. The
+        default is 3.0.
+    min_length : int, optional
+        Shortest segment in samples. The default is 512.
+
+    Returns
+    -------
+    np.ndarray
+        Start and end (exclusive) of each segment with shape (K, 2).
+    """
+    if len(x) < window:
+        return np.empty((0, 2), dtype=np.int64)
+    variance = rolling_variance(x, window)
+    # 量子化で分散が0になるチャンネルも1カウントまでは雑音とする
+    noise = np.maximum(np.percentile(variance[::window], 10, axis=0), 1.0)
+    still = np.all(variance <= factor**2 * noise, axis=1)
+    edges = np.diff(np.concatenate(([0], still.astype(np.int8), [0])))
+    # 静止した窓が続く区間は、最後の窓の終わりまで静止
+    segments = np.column_stack(
+        (np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1 + window)
+    )
+    return segments[segments[:, 1] - segments[:, 0] >= min_length]
+
+
+class Calibration:
+    """
+    Calibration of page A from static segments.
+
+    Attributes
+    ----------
+    gravity : float
+        Gravity in m/s^2.
+    samples : int
+        Number of samples.
+    segments : np.ndarray
+        Start and end (exclusive) of each static segment with shape (K, 2).
+    means : np.ndarray
+        Mean of each channel of each segment with shape (K, 6).
+    orientations : Dict[str, np.ndarray]
+        Mean of each channel of the segments of each orientation, e.g. "+x"
+        is X axis up. Tilted segments are not used.
+    offset_acc : List[float]
+        Offset of acceleration X, Y, Z.
+    scaling_acc : List[float]
+        Scaling of acceleration X, Y, Z, i.e. raw per m/s^2.
+    offset_gyr : List[float]
+        Offset of angular rate X, Y, Z.
+    """
+
+    def __init__(
+        self,
+        x: np.ndarray,
+        window: int = 64,
+        factor: float = 3.0,
+        min_length: int = 512,
+        gravity: float = GRAVITY,
+    ) -> None:
+        self.gravity: float = gravity
+        self.samples: int = len(x)
+        self.segments: np.ndarray = static_segments(x, window, factor, min_length)
+        cumulative = np.concatenate((np.zeros((1, x.shape[1]), np.int64), x)).cumsum(
+            axis=0
+        )
+        lengths = self.segments[:, 1] - self.segments[:, 0]
+        self.means: np.ndarray = (
+            cumulative[self.segments[:, 1]] - cumulative[self.segments[:, 0]]
+        ) / lengths[:, np.newaxis]
+        self.orientations: Dict[str, np.ndarray] = self._orientations(lengths)
+        missing = [
+            sign + axis
+            for axis in AXES
+            for sign in "+-"
+            if sign + axis not in self.orientations
+        ]
+        if len(missing) > 0:
+            raise ValueError(f"No static segment of orientation: {', '.join(missing)}")
+        self.offset_acc: List[float] = []
+        self.scaling_acc: List[float] = []
+        for i, axis in enumerate(AXES):
+            up = self.orientations["+" + axis][i]
+            down = self.orientations["-" + axis][i]
+            self.offset_acc.append(float(np.mean(self._horizontal(i))))
+            self.scaling_acc.append(float((up - down) / 2 / gravity))
+        # ジャイロのバイアスは向きによらず静止中の平均
+        self.offset_gyr: List[float] = np.average(
+            self.means[:, 3:6], axis=0, weights=lengths
+        ).tolist()
+
+    def _orientations(self, lengths: np.ndarray) -> Dict[str, np.ndarray]:
+        acc = self.means[:, :3]
+        if len(acc) == 0:
+            return {}
+        center = (acc.max(axis=0) + acc.min(axis=0)) / 2
+        half = np.maximum((acc.max(axis=0) - acc.min(axis=0)) / 2, 1.0)
+        normalized = (acc - center) / half
+        magnitude = np.abs(normalized)
+        dominant = np.argmax(magnitude, axis=1)
+        others = np.sort(magnitude, axis=1)[:, 1]
+        aligned = (magnitude.max(axis=1) > ALIGNED) & (others < HORIZONTAL)
+        orientations = {}
+        for i, axis in enumerate(AXES):
+            for sign, direction in (("+", 1), ("-", -1)):
+                member = (
+                    aligned & (dominant == i) & (np.sign(normalized[:, i]) == direction)
+                )
+                if np.any(member):
+                    orientations[sign + axis] = np.average(
+                        self.means[member], axis=0, weights=lengths[member]
+                    )
+        return orientations
+
+    def _horizontal(self, i: int) -> List[float]:
+        # 軸が水平な4つの向きでの値
+        return [
+            float(self.orientations[sign + axis][i])
+            for axis in AXES
+            if axis != AXES[i]
+            for sign in "+-"
+        ]
+
+    def format(self, filename_config: str = "config.ini", source: str = "") -> str:
+        """
+        Format [A] section of config.ini.
+
+        Keys other than the fitted ones are kept from the current config.
+
+        Parameters
+        ----------
+        filename_config : str, optional
+            Current config. The default is "config.ini".
+        source : str, optional
+            Name of the calibration log shown in the comment. The default
+            is "".
+
+        Returns
+        -------
+        str
+            Multi-line text from [A], with the memo of the fitting.
+        """
+        config = configparser.ConfigParser()
+        config.read(filename_config)
+        current = dict(config["A"]) if config.has_section("A") else {}
+        values = {}
+        for i, axis in enumerate(AXES):
+            values[f"scaling_acc_{axis}"] = f"{self.scaling_acc[i]:.6f}"
+        for i, axis in enumerate(AXES):
+            values[f"offset_acc_{axis}"] = f"{self.offset_acc[i]:.4f}"
+        for axis in AXES:
+            key = f"scaling_gyr_{axis}"
+            values[key] = current.get(key, "131.0")
+        for i, axis in enumerate(AXES):
+            values[f"offset_gyr_{axis}"] = f"{self.offset_gyr[i]:.4f}"
+        lines = [
+            "[A]",
+            f"# Calibrated with IMUCalibration.py {source}".rstrip(),
+            f"# {len(self.segments)} static segments, "
+            f"{int(np.sum(self.segments[:, 1] - self.segments[:, 0])):,} of "
+            f"{self.samples:,} samples",
+        ]
+        lines += [f"{key} = {value}" for key, value in values.items()]
+        lines.append("")
+        lines += [
+            f"{key} = {value}" for key, value in current.items() if key not in values
+        ]
+        lines += ["", "# @memo"]
+        for i in range(3):
+            horizontal = " + ".join(f"{v:.4f}" for v in self._horizontal(i))
+            lines.append(f"# accel.bias_base[{i}] = ({horizontal}) / 4;")
+        for i, axis in enumerate(AXES):
+            up = self.orientations["+" + axis][i]
+            down = self.orientations["-" + axis][i]
+            lines.append(
+                f"# accel.sf[{i}] = ({up:.4f} - {down:.4f}) / 2 / {self.gravity};"
+            )
+        for i in range(3):
+            lines.append(f"# omega.bias_base[{i}] = {self.offset_gyr[i]:.4f};")
+        lines.append("# omega.sf: scaling_gyr of the sensor, not fitted")
+        return "\n".join(lines) + "\n"
+
+
+def update_config(filename_config: str, section: str) -> None:
+    """
+    Replace a section of config file, keeping the other lines as they are.
+
+    Parameters
+    ----------
+    filename_config : str
+        Config file, e.g. config.ini.
+    section : str
+        Text of the section starting with its header, e.g. [A].
+
+    Returns
+    -------
+    None.
+    """
+    header = section.splitlines()[0].strip()
+    with open(filename_config) as f:
+        lines = f.read().splitlines(keepends=True)
+    starts = [i for i, line in enumerate(lines) if line.startswith("[")]
+    begin = next((i for i in starts if lines[i].strip() == header), None)
+    if begin is None:
+        lines += ["\n", section]
+    else:
+        end = next((i for i in starts if i > begin), len(lines))
+        lines[begin:end] = [section, "\n"]
+    with open(filename_config + ".tmp", "w") as f:
+        f.write("".join(lines))
+    os.replace(filename_config + ".tmp", filename_config)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit [A] of config.ini from a calibration log."
+    )
+    parser.add_argument("filename", help="log file (.dat) or raw csv of page A")
+    parser.add_argument("--config", default="config.ini", help="current config")
+    parser.add_argument(
+        "--update", action="store_true", help="replace [A] of the config"
+    )
+    parser.add_argument(
+        "--window", type=int, default=64, help="samples of rolling variance"
+    )
+    parser.add_argument(
+        "--factor", type=float, default=3.0, help="threshold of std over noise"
+    )
+    parser.add_argument(
+        "--min-length", type=int, default=512, help="shortest segment in samples"
+    )
+    args = parser.parse_args()
+    calibration = Calibration(
+        read_samples(args.filename), args.window, args.factor, args.min_length
+    )
+    section = calibration.format(args.config, os.path.basename(args.filename))
+    print(section)
+    if args.update:
+        update_config(args.config, section)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from IMUCalibration import *
+
+OFFSET_ACC = np.array([6735680.0, 6749970.0, 6792648.0])
+SCALING_ACC = np.array([187617.0, 188595.0, 182720.0])
+OFFSET_GYR = np.array([8392639.0, 8387794.0, 8410701.0])
+
+
+def make_session(still: int = 3000, moving: int = 1000, seed: int = 0) -> np.ndarray:
+    # 6つの向きで静止し、その間は回転させる
+    rng = np.random.default_rng(seed)
+    parts = []
+    for axis in range(3):
+        for sign in (1, -1):
+            gravity = np.zeros(3)
+            gravity[axis] = sign * GRAVITY
+            acc = OFFSET_ACC + SCALING_ACC * gravity
+            parts.append(
+                np.column_stack(
+                    (
+                        acc + rng.normal(0, 300, (still, 3)),
+                        OFFSET_GYR + rng.normal(0, 100, (still, 3)),
+                    )
+                )
+            )
+            parts.append(
+                np.column_stack(
+                    (
+                        OFFSET_ACC + rng.uniform(-1, 1, (moving, 3)) * SCALING_ACC * 9,
+                        OFFSET_GYR + rng.normal(0, 50000, (moving, 3)),
+                    )
+                )
+            )
+    return np.rint(np.concatenate(parts)).astype(np.int64)
+
+
+class TestRollingVariance(unittest.TestCase):
+    def test_window_sums(self):
+        # チャンクの境界をまたぐ窓も正確に足す
+        rng = np.random.default_rng(0)
+        x = rng.integers(-(2**23), 2**23, (3 * CHUNK + 77, 2))
+        sums = window_sums(x * x, 100)
+        self.assertEqual(len(sums), len(x) - 99)
+        for i in [0, CHUNK - 100, CHUNK - 50, CHUNK, 2 * CHUNK - 1, len(x) - 100]:
+            np.testing.assert_array_equal(sums[i], (x[i : i + 100] ** 2).sum(axis=0))
+        np.testing.assert_allclose(
+            rolling_variance(x, 100)[CHUNK - 50], x[CHUNK - 50 : CHUNK + 50].var(axis=0)
+        )
+        with self.assertRaises(ValueError):
+            window_sums(x, CHUNK + 1)
+
+    def test_static_segments(self):
+        segments = static_segments(make_session())
+        self.assertEqual(len(segments), 6)
+        for i, (start, end) in enumerate(segments):
+            self.assertGreaterEqual(start, 4000 * i)
+            self.assertLessEqual(end, 4000 * i + 3000)
+            self.assertGreater(end - start, 2800)
+
+
+class TestCalibration(unittest.TestCase):
+    def test_fit(self):
+        calibration = Calibration(make_session())
+        self.assertEqual(
+            sorted(calibration.orientations), ["+x", "+y", "+z", "-x", "-y", "-z"]
+        )
+        np.testing.assert_allclose(calibration.offset_acc, OFFSET_ACC, atol=20)
+        np.testing.assert_allclose(calibration.scaling_acc, SCALING_ACC, rtol=1e-4)
+        np.testing.assert_allclose(calibration.offset_gyr, OFFSET_GYR, atol=5)
+
+    def test_missing(self):
+        with self.assertRaises(ValueError):
+            Calibration(make_session()[: 4000 * 5])
+
+    def test_config(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "config.ini")
+            shutil.copy("config.ini", filename)
+            section = Calibration(make_session()).format(filename, "LOG.dat")
+            update_config(filename, section)
+            config = configparser.ConfigParser()
+            config.read(filename)
+            self.assertAlmostEqual(
+                float(config["A"]["scaling_acc_x"]), SCALING_ACC[0], delta=20
+            )
+            # 固定の値や他のセクションはそのまま
+            self.assertEqual(
+                config["A"]["scaling_gyr_x"], "378152.14478634331778686782177309"
+            )
+            self.assertEqual(config["A"]["scaling_prs"], "1.0")
+            self.assertIn("scaling_cadence0", config["H"])
+            self.assertIn("# accel.sf[0] = (", section)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
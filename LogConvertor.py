@@ -0,0 +1,622 @@
+"""
+Log Convertor.
+
+Convert a log file into csv and ubx files of each page without GUI, in the
+same way as HPANaviConvertor. The log is converted block by block, while the
+next blocks are read and the previous ones are written on other threads, so
+that memory does not grow with the log. In incremental mode, the byte offset and the
+state of each page are kept in a checkpoint next to the outputs, and the next
+run converts only the records appended to the log since then, e.g. of a
+recording in progress, and appends them to the outputs. The outputs can be
+compressed with gzip, xz or zstd while they are written.
+
+Logs compressed with gzip, xz or zstd, e.g. LOG.dat.gz, and logs in zip
+archives are decompressed while they are read. The outputs of a log in an
+archive are written next to the archive, e.g. LOG_A.csv of day.zip/LOG.dat.
+
+Usage
+-----
+python LogConvertor.py LOG.dat [--unit] [--incremental] [--compress gzip|xz|zstd]
+python LogConvertor.py LOG.dat.gz day.zip day.zip/LOG.dat
+"""
+
+import os
+import base64
+import json
+import time
+import queue
+import argparse
+import threading
+import warnings
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import Compression
+import SylphideProcessor
+import UBXProcessor
+
+RECORD_SIZE = 32
+# Records read, converted and written at once
+BLOCK_SIZE = RECORD_SIZE << 15
+# Blocks waiting between stages of conversion
+QUEUE_SIZE = 4
+CHECKPOINT_SUFFIX = "_checkpoint.json"
+# Extension of outputs by compression
+EXTENSIONS = {compression: ext for ext, compression in Compression.EXTENSIONS.items()}
+# Longest UBX message, kept to be decoded with the stream of the next run
+UBX_MAX_MESSAGE = UBXProcessor.HEADER_SIZE + 0xFFFF + UBXProcessor.CHECKSUM_SIZE
+
+
+def output_names(root: str) -> List[str]:
+    """
+    Names of all output files of a log without compression.
+
+    Parameters
+    ----------
+    root : str
+        Name of the log file without extension.
+
+    Returns
+    -------
+    List[str]
+        Files of registered pages, e.g. LOG_A.csv, LOG_T_dump.csv and
+        LOG_G.ubx, and of UBX messages, e.g. LOG_G_NAV-PVT.csv.
+    """
+    names = []
+    for page_class in SylphideProcessor.PAGES.values():
+        names += page_class().output_names(root)
+    names += [
+        f"{root}_G_{message}.csv" for message, _ in UBXProcessor.MESSAGES.values()
+    ]
+    return names
+
+
+def output_files(root: str) -> List[str]:
+    """
+    Existing output files of a log, e.g. LOG_A.csv and LOG_G.ubx.gz.
+
+    Only the exact names of output_names are matched, with or without the
+    extension of compression, so that other files next to the log, e.g.
+    LOG_B.dat or LOG_A_notes.txt, are never taken for outputs.
+
+    Parameters
+    ----------
+    root : str
+        Name of the log file without extension.
+
+    Returns
+    -------
+    List[str]
+        Existing output files.
+    """
+    return sorted(f for f in _output_candidates(root) if os.path.isfile(f))
+
+
+def _output_candidates(root: str) -> List[str]:
+    # 圧縮の有無を含めた出力ファイルの名前
+    return [
+        name + ext
+        for name in output_names(root)
+        for ext in [""] + list(Compression.EXTENSIONS)
+    ]
+
+
+def listed_outputs(root: str, outputs: Dict[str, int]) -> List[str]:
+    """
+    Output files listed in a checkpoint.
+
+    Parameters
+    ----------
+    root : str
+        Name of the log file without extension.
+    outputs : Dict[str, int]
+        Size of each output file at the checkpoint.
+
+    Returns
+    -------
+    List[str]
+        Path of the listed files. Names which are not outputs of the log are
+        ignored.
+    """
+    return [f for f in _output_candidates(root) if os.path.basename(f) in outputs]
+
+
+def load_checkpoint(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Load checkpoint of incremental conversion.
+
+    Parameters
+    ----------
+    filename : str
+        Checkpoint file.
+
+    Returns
+    -------
+    Dict[str, Any] or None
+        Checkpoint. None if the file does not exist or is broken.
+    """
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(filename: str, checkpoint: Dict[str, Any]) -> None:
+    """
+    Save checkpoint of incremental conversion.
+
+    The file is replaced at once, so that it is not broken by interruption.
+
+    Parameters
+    ----------
+    filename : str
+        Checkpoint file.
+    checkpoint : Dict[str, Any]
+        Checkpoint.
+
+    Returns
+    -------
+    None.
+    """
+    with open(filename + ".tmp", "w") as f:
+        json.dump(checkpoint, f, indent=1)
+    os.replace(filename + ".tmp", filename)
+
+
+def restore_outputs(root: str, outputs: Dict[str, int]) -> None:
+    """
+    Restore outputs to the sizes at the checkpoint.
+
+    Rows appended by an interrupted run after the checkpoint are truncated,
+    so that they are not duplicated. Only the files listed in the checkpoint
+    are changed.
+
+    Parameters
+    ----------
+    root : str
+        Name of the log file without extension.
+    outputs : Dict[str, int]
+        Size of each output file at the checkpoint.
+
+    Returns
+    -------
+    None.
+    """
+    for filename in listed_outputs(root, outputs):
+        size = outputs[os.path.basename(filename)]
+        if os.path.isfile(filename) and os.path.getsize(filename) > size:
+            os.truncate(filename, size)
+
+
+def remove_outputs(root: str, outputs: Dict[str, int]) -> None:
+    """
+    Remove the outputs listed in a checkpoint.
+
+    Parameters
+    ----------
+    root : str
+        Name of the log file without extension.
+    outputs : Dict[str, int]
+        Size of each output file at the checkpoint.
+
+    Returns
+    -------
+    None.
+    """
+    for filename in listed_outputs(root, outputs):
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+
+def ubx_consumed(stream: bytes, index: Any) -> int:
+    """
+    Length of the UBX stream whose messages are decoded.
+
+    Parameters
+    ----------
+    stream : bytes
+        UBX stream.
+    index : np.ndarray
+        Output of UBXProcessor.index_messages.
+
+    Returns
+    -------
+    int
+        End of the last valid message. Without valid messages, all but the
+        last UBX_MAX_MESSAGE bytes, which may be the head of a message.
+    """
+    valid = index[index["valid"]]
+    if len(valid) == 0:
+        return max(0, len(stream) - UBX_MAX_MESSAGE)
+    return (
+        int(valid["offset"][-1])
+        + UBXProcessor.HEADER_SIZE
+        + int(valid["length"][-1])
+        + UBXProcessor.CHECKSUM_SIZE
+    )
+
+
+def output_root(filename: str) -> str:
+    """
+    Root of the output files of a log.
+
+    Parameters
+    ----------
+    filename : str
+        Log file, e.g. LOG.dat.gz, or ARCHIVE.zip/MEMBER.
+
+    Returns
+    -------
+    str
+        e.g. LOG, or LOG next to the archive for a member.
+    """
+    archive, member = Compression.split_member(filename)
+    if member is None:
+        return Compression.splitext(filename)[0]
+    return os.path.join(
+        os.path.dirname(archive),
+        Compression.splitext(os.path.basename(member))[0],
+    )
+
+
+def prefetch(items: Iterator[Any], maxsize: int = QUEUE_SIZE) -> Iterator[Any]:
+    """
+    Take items from an iterator on a dedicated thread.
+
+    At most maxsize items are taken ahead, e.g. blocks read from a file while
+    the previous ones are converted.
+
+    Parameters
+    ----------
+    items : Iterator[Any]
+        Iterator such as Compression.read_blocks.
+    maxsize : int, optional
+        Number of items taken ahead. The default is QUEUE_SIZE.
+
+    Yields
+    ------
+    Any
+        Items in order. An exception of the iterator is raised here.
+    """
+    buffer: "queue.Queue[Tuple[bool, Any]]" = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def run() -> None:
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                buffer.put((True, item))
+            buffer.put((False, None))
+        except Exception as e:
+            buffer.put((False, e))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, item = buffer.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                break
+            yield item
+    finally:
+        # 途中で止めた場合は読み込みのスレッドも止める
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class Stage:
+    """
+    Process items of a bounded queue on a dedicated thread.
+
+    put blocks while the queue is full, so that a fast producer waits for a
+    slow stage instead of keeping all data in memory.
+
+    Attributes
+    ----------
+    function : Callable[[Any], Any]
+        Called with each item in order.
+    error : Exception or None
+        Exception raised by function. Later items are discarded.
+    """
+
+    def __init__(
+        self, function: Callable[[Any], Any], maxsize: int = QUEUE_SIZE
+    ) -> None:
+        self.function: Callable[[Any], Any] = function
+        self.error: Optional[Exception] = None
+        self._queue: "queue.Queue[Tuple[bool, Any]]" = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        """Start the thread."""
+        self._thread.start()
+
+    def put(self, item: Any) -> None:
+        """Enqueue item, waiting while the queue is full."""
+        if self.error is not None:
+            raise self.error
+        self._queue.put((True, item))
+
+    def close(self) -> None:
+        """Wait until all items are processed, and raise the error if any."""
+        self._queue.put((False, None))
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        while True:
+            ok, item = self._queue.get()
+            if not ok:
+                break
+            if self.error is None:
+                try:
+                    self.function(item)
+                except Exception as e:
+                    self.error = e
+
+
+class OutputWriter:
+    """
+    Write outputs of pages block by block.
+
+    The first write of each file in a conversion overwrites the file unless
+    it is in append, and the following writes append to it. With
+    compression, the outputs of a block are compressed in parallel.
+
+    Attributes
+    ----------
+    append : set
+        Files appended to from the first write, e.g. outputs listed in the
+        checkpoint of incremental conversion.
+    compression : str or None
+        "gzip", "xz" or "zstd". The extension is added to the name of files.
+    written : set
+        Files written in this conversion.
+    """
+
+    def __init__(
+        self, append: Iterable[str] = (), compression: Optional[str] = None
+    ) -> None:
+        self.append: set = set(append)
+        self.compression: Optional[str] = compression
+        self.written: set = set()
+
+    def write(self, outputs: List[Tuple[str, Any]]) -> None:
+        """
+        Write outputs.
+
+        Parameters
+        ----------
+        outputs : List[Tuple[str, Any]]
+            Name of each file and its data. See Page.outputs.
+
+        Returns
+        -------
+        None.
+        """
+        if self.compression is None:
+            for filename, dat in outputs:
+                SylphideProcessor.write_output(
+                    filename, dat, filename in self.append or filename in self.written
+                )
+                self.written.add(filename)
+            return
+        ext = EXTENSIONS[self.compression]
+        files = [
+            (
+                filename + ext,
+                dat,
+                filename + ext in self.append or filename + ext in self.written,
+            )
+            for filename, dat in outputs
+        ]
+        compressed = Compression.compress_many(
+            [
+                (
+                    SylphideProcessor.render_output(filename, dat, append),
+                    self.compression,
+                )
+                for filename, dat, append in files
+            ]
+        )
+        for (filename, _, append), dat in zip(files, compressed):
+            with open(filename, mode="ab" if append else "wb") as f:
+                f.write(dat)
+            self.written.add(filename)
+
+
+def convert(
+    filename: str,
+    unit_conversion: bool = False,
+    incremental: bool = False,
+    status: Optional[Callable[[str], Any]] = None,
+    compression: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Convert log file into csv and ubx files of each page.
+
+    Parameters
+    ----------
+    filename : str
+        Log file to be converted, e.g. LOG.dat, LOG.dat.gz or
+        ARCHIVE.zip/MEMBER.
+    unit_conversion : bool, optional
+        Convert the data from raw to scaled. The default is False.
+    incremental : bool, optional
+        Convert only the records after the checkpoint and append them to the
+        outputs. Without a valid checkpoint, e.g. the log is replaced or
+        unit_conversion is changed, the whole log is converted again. The
+        default is False.
+    status : Callable[[str], Any], optional
+        Called with the progress message. The default is None.
+    compression : str, optional
+        Compress the outputs with "gzip", "xz" or "zstd", e.g. LOG_A.csv.gz.
+        The default is None.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Checkpoint after the conversion. offset is the converted bytes of the
+        log, and rows is the number of records converted of each page.
+    """
+    status = status if status is not None else (lambda message: None)
+    root = output_root(filename)
+    checkpoint_file = root + CHECKPOINT_SUFFIX
+    # 圧縮されたログの大きさは読み終わるまで分からない
+    filesize = Compression.input_size(filename)
+    with Compression.open_input(filename) as fobj:
+        status("File opened.")
+        head = fobj.read(RECORD_SIZE)
+        previous = load_checkpoint(checkpoint_file) if incremental else None
+        checkpoint = previous
+        if checkpoint is not None and (
+            checkpoint.get("head") != head.hex()
+            or checkpoint.get("unit_conversion") != unit_conversion
+            or checkpoint.get("compression") != compression
+            or (filesize is not None and checkpoint.get("offset", 0) > filesize)
+        ):
+            checkpoint = None
+        # チェックポイントにある出力だけに追記する
+        append = []
+        if checkpoint is not None:
+            restore_outputs(root, checkpoint["outputs"])
+            append = listed_outputs(root, checkpoint["outputs"])
+        else:
+            if previous is not None:
+                # 以前の出力に追記しないよう、書いた出力を消して最初から変換し直す
+                remove_outputs(root, previous.get("outputs", {}))
+            elif not incremental and os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+            checkpoint = {
+                "head": head.hex(),
+                "unit_conversion": unit_conversion,
+                "compression": compression,
+                "offset": 0,
+                "ubx_offset": 0,
+                "ubx_tail": "",
+                "rows": {},
+                "outputs": {},
+            }
+        if incremental:
+            # チェックポイントにないファイルは消さずに知らせる
+            for output in output_files(root):
+                if os.path.basename(output) not in checkpoint["outputs"]:
+                    warnings.warn(
+                        f"{output} is not in the checkpoint. It is kept, and "
+                        "overwritten if the page is converted."
+                    )
+
+        pages = {
+            name: page_class() for name, page_class in SylphideProcessor.PAGES.items()
+        }
+
+        # 前回までに復号されていないUBXの残りから続ける
+        stream = base64.b64decode(checkpoint.get("ubx_tail", ""))
+
+        # 読み込み、変換、書き込みを別のスレッドで同時に進める
+        # 最後の不完全なレコードは次回に変換
+        # 圧縮されたログは戻れないので、読んだ先頭から続ける
+        offset = checkpoint["offset"]
+        if offset < len(head):
+            prefix = head[offset:]
+        else:
+            prefix = b""
+            fobj.seek(offset)
+        remaining = None
+        if filesize is not None:
+            remaining = (filesize - offset) // RECORD_SIZE * RECORD_SIZE
+        output_writer = OutputWriter(append, compression)
+        writer = Stage(output_writer.write)
+        writer.start()
+        status("Reading file.")
+        start_time = time.perf_counter()
+        readsize = 0
+        pb_previous = 0
+        try:
+            blocks = Compression.read_blocks(
+                fobj, remaining, RECORD_SIZE, prefix, BLOCK_SIZE
+            )
+            for block in prefetch(blocks):
+                readsize += len(block)
+
+                # ブロックごとにページのレコードをまとめ、配列のまま変換する
+                records = np.frombuffer(block, np.uint8).reshape(-1, RECORD_SIZE)
+                outputs = []
+                for name, group in SylphideProcessor.group_records(records):
+                    outputs += pages[name].outputs_array(root, group, unit_conversion)
+                    checkpoint["rows"][name] = checkpoint["rows"].get(name, 0) + len(
+                        group
+                    )
+                    if name == "G":
+                        stream += group[:, 1:].tobytes()
+                index = UBXProcessor.index_messages(stream)
+                for (cls, message_id), (message, _) in UBXProcessor.MESSAGES.items():
+                    df = UBXProcessor.to_frame(
+                        UBXProcessor.decode(stream, index, cls, message_id)
+                    )
+                    if df is not None:
+                        outputs.append((f"{root}_G_{message}.csv", df))
+                consumed = ubx_consumed(stream, index)
+                checkpoint["ubx_offset"] += consumed
+                stream = stream[consumed:]
+                writer.put(outputs)
+
+                if remaining is None:
+                    status("Reading file. {:,} byte done.".format(readsize))
+                    continue
+                pb_current = int(readsize / remaining * 100)
+                if pb_previous < pb_current:
+                    status("Reading file. {}% done.".format(pb_current))
+                    pb_previous = pb_current
+        finally:
+            writer.close()
+        elapsed = time.perf_counter() - start_time
+
+    checkpoint["offset"] = offset + readsize
+    checkpoint["ubx_tail"] = base64.b64encode(stream).decode()
+    checkpoint["outputs"] = {
+        os.path.basename(output): os.path.getsize(output)
+        for output in sorted(set(append) | output_writer.written)
+        if os.path.isfile(output)
+    }
+    if incremental:
+        save_checkpoint(checkpoint_file, checkpoint)
+    status(f"Done. {elapsed:.1f} s.")
+    return checkpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert HPA_Navi log files.")
+    parser.add_argument(
+        "filename", nargs="+", help="log file (.dat, .dat.gz, .dat.xz, .dat.zst, .zip)"
+    )
+    parser.add_argument(
+        "--unit", action="store_true", help="convert the data from raw to scaled"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="convert only the records appended since the last run",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=list(EXTENSIONS),
+        help="compress the outputs, e.g. LOG_A.csv.gz",
+    )
+    args = parser.parse_args()
+    filenames = [log for name in args.filename for log in Compression.list_logs(name)]
+    for filename in filenames:
+        checkpoint = convert(
+            filename, args.unit, args.incremental, compression=args.compress
+        )
+        print(f"{filename}: {checkpoint['offset']:,} byte converted")
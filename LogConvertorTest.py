@@ -0,0 +1,181 @@
+import os
+import gzip
+import lzma
+import shutil
+import zipfile
+import filecmp
+import tempfile
+import unittest
+import numpy as np
+from LogConvertor import *
+from UBXProcessorTest import make_pvt
+
+
+def make_log(n: int = 3000) -> bytes:
+    rng = np.random.default_rng(0)
+    records = rng.integers(0, 256, size=(n, RECORD_SIZE), dtype=np.uint8)
+    records[:, 0] = np.frombuffer(b"AaHPG" * (n // 5), dtype=np.uint8)
+    # Gページには有効なUBXのメッセージ
+    stream = b"".join(make_pvt(1000 * i, 35.0, 139.0) for i in range(200))
+    g = np.flatnonzero(records[:, 0] == ord("G"))[: len(stream) // 31]
+    records[g, 1:] = np.frombuffer(stream[: len(g) * 31], dtype=np.uint8).reshape(
+        -1, 31
+    )
+    return records.tobytes()
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.full = os.path.join(self.directory, "full.dat")
+        self.log = os.path.join(self.directory, "log.dat")
+        self.dat = make_log()
+        with open(self.full, "wb") as f:
+            f.write(self.dat)
+        convert(self.full)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append(self, dat):
+        with open(self.log, "ab") as f:
+            f.write(dat)
+
+    def assert_same_outputs(self):
+        full = output_files(os.path.splitext(self.full)[0])
+        log = output_files(os.path.splitext(self.log)[0])
+        self.assertEqual(
+            [os.path.basename(f)[4:] for f in full],
+            [os.path.basename(f)[3:] for f in log],
+        )
+        for a, b in zip(full, log):
+            self.assertTrue(filecmp.cmp(a, b, shallow=False), b)
+
+    def test_incremental(self):
+        # レコードやUBXのメッセージの途中で区切って追記
+        for start, end in [(0, 10001), (10001, 50003), (50003, len(self.dat))]:
+            self.append(self.dat[start:end])
+            checkpoint = convert(self.log, incremental=True)
+        self.assertEqual(checkpoint["offset"], len(self.dat))
+        self.assertEqual(checkpoint["rows"]["G"], 600)
+        self.assert_same_outputs()
+        # 追記がなければ何も変わらない
+        self.assertEqual(convert(self.log, incremental=True), checkpoint)
+
+    def test_interrupted(self):
+        self.append(self.dat[:40000])
+        convert(self.log, incremental=True)
+        # チェックポイントの後の追記は捨て、チェックポイントにないファイルは残す
+        with open(os.path.join(self.directory, "log_A.csv"), "a") as f:
+            f.write("1,2,3\n")
+        stray = os.path.join(self.directory, "log_V_TX.csv")
+        with open(stray, "w") as f:
+            f.write("1,2,3\n")
+        self.append(self.dat[40000:])
+        with self.assertWarns(UserWarning):
+            checkpoint = convert(self.log, incremental=True)
+        self.assertNotIn("log_V_TX.csv", checkpoint["outputs"])
+        with open(stray) as f:
+            self.assertEqual(f.read(), "1,2,3\n")
+        os.remove(stray)
+        self.assert_same_outputs()
+
+    def test_other_files(self):
+        # ログの隣にある出力でないファイルは、最初から変換し直しても消さない
+        others = {"log_X.dat": b"X", "log_B.dat": b"B", "log_A_notes.txt": b"A"}
+        for name, dat in others.items():
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(dat)
+        self.append(self.dat[:40000])
+        convert(self.log, unit_conversion=True, incremental=True)
+        self.append(self.dat[40000:])
+        checkpoint = convert(self.log, incremental=True)
+        for name, dat in others.items():
+            self.assertNotIn(name, checkpoint["outputs"])
+            with open(os.path.join(self.directory, name), "rb") as f:
+                self.assertEqual(f.read(), dat)
+        self.assertIn("log_G_NAV-PVT.csv", checkpoint["outputs"])
+        self.assert_same_outputs()
+
+    def test_compression(self):
+        for start, end in [(0, 33333), (33333, len(self.dat))]:
+            self.append(self.dat[start:end])
+            convert(self.log, incremental=True, compression="gzip")
+        full = output_files(os.path.splitext(self.full)[0])
+        log = output_files(os.path.splitext(self.log)[0])
+        self.assertEqual(
+            [os.path.basename(f)[4:] + ".gz" for f in full],
+            [os.path.basename(f)[3:] for f in log],
+        )
+        for a, b in zip(full, log):
+            with open(a, "rb") as f, gzip.open(b) as g:
+                self.assertEqual(f.read(), g.read(), b)
+
+    def test_restart(self):
+        self.append(self.dat[:40000])
+        convert(self.log, unit_conversion=True, incremental=True)
+        # 単位の変換を変えると最初から変換し直す
+        self.append(self.dat[40000:])
+        checkpoint = convert(self.log, incremental=True)
+        self.assertFalse(checkpoint["unit_conversion"])
+        self.assert_same_outputs()
+
+    def test_compressed_input(self):
+        # 圧縮されたログやzipの中のログも同じ出力
+        with open(self.log + ".gz", "wb") as f:
+            f.write(gzip.compress(self.dat))
+        convert(self.log + ".gz")
+        self.assert_same_outputs()
+        for output in output_files(os.path.splitext(self.log)[0]):
+            os.remove(output)
+        archive = os.path.join(self.directory, "day.zip")
+        with zipfile.ZipFile(archive, "w") as f:
+            f.writestr("logs/log.dat.xz", lzma.compress(self.dat))
+        convert(archive + "/logs/log.dat.xz")
+        self.assert_same_outputs()
+
+    def test_compressed_incremental(self):
+        with open(self.log + ".gz", "wb") as f:
+            f.write(gzip.compress(self.dat[:40005]))
+        convert(self.log + ".gz", incremental=True)
+        with open(self.log + ".gz", "ab") as f:
+            f.write(gzip.compress(self.dat[40005:]))
+        checkpoint = convert(self.log + ".gz", incremental=True)
+        self.assertEqual(checkpoint["offset"], len(self.dat))
+        self.assert_same_outputs()
+
+
+class TestPipeline(unittest.TestCase):
+    def test_prefetch(self):
+        def items():
+            yield from range(10)
+            raise ValueError("broken")
+
+        taken = []
+        with self.assertRaises(ValueError):
+            for item in prefetch(items(), maxsize=2):
+                taken.append(item)
+        self.assertEqual(taken, list(range(10)))
+        # 途中で止めても読み込みのスレッドは終わる
+        for item in prefetch(iter(range(100)), maxsize=2):
+            break
+
+    def test_stage(self):
+        processed = []
+
+        def function(item):
+            if item == 5:
+                raise ValueError("broken")
+            processed.append(item)
+
+        stage = Stage(function, maxsize=2)
+        stage.start()
+        with self.assertRaises(ValueError):
+            for i in range(20):
+                stage.put(i)
+            stage.close()
+        self.assertEqual(processed, list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
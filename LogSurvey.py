@@ -0,0 +1,255 @@
+"""
+Log Survey.
+
+Survey a log file without decoding, i.e. number of records of each page, GNSS
+time span, rates and gaps. The file is memory-mapped, and only the header
+bytes, the records at both ends and every SAMPLE-th record are read. Records
+between samples are read only where the samples show a jump of GNSS time.
+Compressed logs and logs in zip archives cannot be mapped, so they are
+surveyed block by block while decompressed: the headers of every record are
+counted, and the times are read in the same way within each block.
+
+Usage
+-----
+python LogSurvey.py LOG.dat [--gap SECONDS]
+python LogSurvey.py LOG.dat.gz day.zip/LOG.dat
+"""
+
+import os
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import Compression
+import SylphideProcessor
+import TelemetrySource
+
+RECORD_SIZE = 32
+# Records counted at once
+CHUNK = 1 << 16
+# Interval of records whose time is read to find gaps
+SAMPLE = 64
+
+
+class LogSurvey:
+    """
+    Contents of a log file.
+
+    Headers are counted with their page, e.g. lowercase ones.
+
+    Attributes
+    ----------
+    filename : str
+        Log file, e.g. LOG.dat, LOG.dat.gz or ARCHIVE.zip/MEMBER.
+    gap : float
+        Minimum interval in second reported as a gap.
+    size : int
+        File size in byte after decompression.
+    records : int
+        Number of records.
+    trailing : int
+        Number of bytes after the last complete record.
+        0 for compressed logs, whose incomplete record is not read.
+    counts : np.ndarray
+        Number of records of each header byte.
+    times : Dict[str, Tuple[float, float]]
+        First and last GNSS time in second of each page with time. Records
+        whose GNSS time is 0, e.g. before GNSS lock, are ignored.
+    gaps : List[Tuple[float, float]]
+        Start and end in second of the intervals without any record.
+    backward : int
+        Number of jumps of GNSS time backward, e.g. restart of the logger.
+    """
+
+    def __init__(self, filename: str, gap: float = 1.0) -> None:
+        self.filename: str = filename
+        self.gap: float = gap
+        self.counts: np.ndarray = np.zeros(256, dtype=np.int64)
+        self.times: Dict[str, Tuple[float, float]] = {}
+        self.gaps: List[Tuple[float, float]] = []
+        self.backward: int = 0
+        self.records: int = 0
+        if Compression.mappable(filename):
+            self.size: int = os.path.getsize(filename)
+            self.records = self.size // RECORD_SIZE
+            if self.records > 0:
+                mapped = np.memmap(self.filename, dtype=np.uint8, mode="r")
+                records = mapped[: self.records * RECORD_SIZE].reshape(-1, RECORD_SIZE)
+                self._survey(records)
+        else:
+            # 展開したログ全体はメモリに置かない、最後の不完全なレコードは読まれない
+            with Compression.open_input(filename) as fobj:
+                self._stream(
+                    Compression.read_blocks(
+                        fobj, record_size=RECORD_SIZE, block_size=CHUNK * RECORD_SIZE
+                    )
+                )
+            self.size = self.records * RECORD_SIZE
+        self.trailing: int = self.size % RECORD_SIZE
+
+    def _survey(self, records: np.ndarray) -> None:
+        # ページキャッシュに収まる大きさずつ数える
+        for start in range(0, self.records, CHUNK):
+            self.counts += np.bincount(records[start : start + CHUNK, 0], minlength=256)
+        self._edges(records)
+        self._gaps(records)
+
+    def _stream(self, blocks: Iterator[bytes]) -> None:
+        first: Dict[str, float] = {}
+        last: Dict[str, float] = {}
+        # 前のブロックの最後の時刻のある標本から後のレコード、ブロックをまたぐ欠落用
+        carry = np.empty((0, RECORD_SIZE), dtype=np.uint8)
+        for block in blocks:
+            records = np.frombuffer(block, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+            start = self.records
+            self.records += len(records)
+            self.counts += np.bincount(records[:, 0], minlength=256)
+
+            headers = SylphideProcessor.DISPATCH[records[:, 0]]
+            for header in TelemetrySource.TIMED_PAGES:
+                index = np.flatnonzero(headers == ord(header))
+                if header not in first:
+                    found = self._find_time(records, index)
+                    if found is not None:
+                        first[header] = found
+                found = self._find_time(records, index, reverse=True)
+                if found is not None:
+                    last[header] = found
+
+            # ファイル全体と同じ位置のレコードと、ブロックの最後のレコードを標本にする
+            index = np.unique(
+                np.r_[-start % SAMPLE : len(records) : SAMPLE, len(records) - 1]
+            )
+            index = np.r_[np.zeros(min(len(carry), 1), dtype=int), index + len(carry)]
+            segment = np.concatenate([carry, records]) if len(carry) > 0 else records
+            latest = self._sampled_gaps(segment, index)
+            if latest is not None:
+                carry = segment[latest:]
+        self.times = {header: (first[header], last[header]) for header in first}
+
+    @staticmethod
+    def _find_time(
+        records: np.ndarray, index: np.ndarray, reverse: bool = False
+    ) -> Optional[float]:
+        # 端の SAMPLE 個で見つからなければ、すべての時刻を読む
+        for part in (index[-SAMPLE:] if reverse else index[:SAMPLE], index):
+            times = TelemetrySource.page_time(records[part])
+            timed = np.flatnonzero(times > 0)
+            if len(timed) > 0:
+                return times[timed[-1 if reverse else 0]] / 1e3
+        return None
+
+    def _edges(self, records: np.ndarray) -> None:
+        # 時刻のあるページの最初と最後の時刻を、ファイルの両端から探す
+        pages = self.pages
+        present = {header for header in TelemetrySource.TIMED_PAGES if header in pages}
+        first: Dict[str, float] = {}
+        last: Dict[str, float] = {}
+        for found, reverse in ((first, False), (last, True)):
+            starts = range(0, self.records, CHUNK)
+            for start in reversed(starts) if reverse else starts:
+                if len(found) == len(present):
+                    break
+                block = records[start : start + CHUNK]
+                times = TelemetrySource.page_time(block)
+                headers = SylphideProcessor.DISPATCH[block[:, 0]]
+                for header in present - found.keys():
+                    index = np.flatnonzero((headers == ord(header)) & (times > 0))
+                    if len(index) > 0:
+                        found[header] = times[index[-1 if reverse else 0]] / 1e3
+        self.times = {header: (first[header], last[header]) for header in first}
+
+    def _gaps(self, records: np.ndarray) -> None:
+        # 間引いたレコードの時刻で欠落の候補を探し、候補の区間だけ全レコードを読む
+        index = np.unique(np.r_[0 : self.records : SAMPLE, self.records - 1])
+        self._sampled_gaps(records, index)
+
+    def _sampled_gaps(self, records: np.ndarray, index: np.ndarray) -> Optional[int]:
+        # 標本の時刻が飛んだ区間だけ全レコードを読み、最後の時刻のある標本を返す
+        times = TelemetrySource.page_time(records[index])
+        timed = times > 0
+        index, times = index[timed], times[timed]
+        step = np.abs(np.diff(times))
+        gap = self.gap * 1e3
+        for i in np.flatnonzero(step > gap).tolist():
+            t = TelemetrySource.page_time(records[index[i] : index[i + 1] + 1])
+            t = t[t > 0]
+            step = np.diff(t)
+            self.backward += int(np.count_nonzero(step < -gap))
+            self.gaps.extend(
+                (t[j] / 1e3, t[j + 1] / 1e3) for j in np.flatnonzero(step > gap)
+            )
+        return int(index[-1]) if len(index) > 0 else None
+
+    @property
+    def pages(self) -> Dict[str, int]:
+        """Number of records of each page. Unregistered headers are kept."""
+        dispatch = SylphideProcessor.DISPATCH
+        counts = np.zeros(256, dtype=np.int64)
+        np.add.at(counts, np.where(dispatch > 0, dispatch, np.arange(256)), self.counts)
+        return {chr(code): int(counts[code]) for code in np.flatnonzero(counts)}
+
+    @property
+    def span(self) -> Tuple[float, float]:
+        """First and last GNSS time in second. NaN without time."""
+        if len(self.times) == 0:
+            return np.nan, np.nan
+        return (
+            min(first for first, _ in self.times.values()),
+            max(last for _, last in self.times.values()),
+        )
+
+    def format(self) -> str:
+        """
+        Format survey as text for display.
+
+        Returns
+        -------
+        str
+            Multi-line text.
+        """
+        text = [
+            f"File       : {os.path.basename(self.filename)}",
+            f"Size       : {self.size:,} byte, {self.records:,} records"
+            + (f" (+{self.trailing} byte)" if self.trailing > 0 else ""),
+        ]
+        first, last = self.span
+        if np.isfinite(first):
+            duration = last - first
+            missing = sum(end - start for start, end in self.gaps)
+            coverage = 100.0 * (1.0 - missing / duration) if duration > 0 else 100.0
+            text.append(
+                f"GNSS time  : {first:.3f} - {last:.3f} s ({duration:,.1f} s, "
+                f"{coverage:.1f} % covered)"
+            )
+        text.append("Pages      :")
+        for header, count in self.pages.items():
+            line = f"  {header}: {count:10,d}"
+            if header in self.times:
+                start, end = self.times[header]
+                if end > start:
+                    line += f", {count / (end - start):8.1f} /s"
+                line += f", {start:.3f} - {end:.3f} s"
+            text.append(line)
+        if self.backward > 0:
+            text.append(f"Time back  : {self.backward} times")
+        text.append(f"Gaps > {self.gap:g} s : {len(self.gaps)}")
+        for start, end in self.gaps[:20]:
+            text.append(f"  {start:.3f} - {end:.3f} s ({end - start:.3f} s)")
+        if len(self.gaps) > 20:
+            text.append(f"  ... {len(self.gaps) - 20} more")
+        return "\n".join(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Survey HPA_Navi log files.")
+    parser.add_argument("filename", nargs="+", help="log file (.dat, .dat.gz, .zip)")
+    parser.add_argument(
+        "--gap", type=float, default=1.0, help="minimum gap in second to report"
+    )
+    args = parser.parse_args()
+    for filename in [
+        log for name in args.filename for log in Compression.list_logs(name)
+    ]:
+        print(LogSurvey(filename, args.gap).format())
@@ -0,0 +1,106 @@
+import os
+import gzip
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from LogSurvey import *
+
+
+def make_page(header: str, offset: int, itow: int) -> bytes:
+    page = bytearray(RECORD_SIZE)
+    page[0] = ord(header)
+    struct.pack_into("<I", page, offset, itow)
+    return bytes(page)
+
+
+class TestLogSurvey(unittest.TestCase):
+    def setUp(self):
+        pages = []
+        # GNSS測位前の時刻0のページ
+        for i in range(100):
+            pages.append(make_page("A", 2, 0))
+        for i in range(20000):
+            itow = 1000 + 10 * i
+            # 100.0 s から 105.0 s まで欠落
+            if 99000 <= itow < 105000:
+                continue
+            pages.append(make_page("a" if i % 2 else "A", 2, itow))
+            if i % 5 == 0:
+                pages.append(make_page("P", 4, itow + 1))
+                pages.append(make_page("G", 4, 0xFFFFFFFF))
+        fd, self.filename = tempfile.mkstemp(suffix=".dat")
+        with os.fdopen(fd, "wb") as fobj:
+            fobj.write(b"".join(pages) + bytes(7))
+        self.pages = len(pages)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_survey(self):
+        survey = LogSurvey(self.filename)
+        self.assertEqual(survey.records, self.pages)
+        self.assertEqual(survey.trailing, 7)
+        self.assertEqual(survey.counts[ord("a")], 9700)
+        self.assertEqual(survey.pages, {"A": 19500, "G": 3880, "P": 3880})
+        self.assertEqual(survey.times["A"], (1.0, 200.99))
+        self.assertEqual(survey.times["P"], (1.001, 200.951))
+        self.assertNotIn("G", survey.times)
+        self.assertEqual(survey.span, (1.0, 200.99))
+        self.assertEqual(survey.gaps, [(98.99, 105.0)])
+        self.assertEqual(survey.backward, 0)
+        self.assertIn("Gaps > 1 s : 1", survey.format())
+
+    def test_compressed(self):
+        with open(self.filename, "rb") as fobj, gzip.open(
+            self.filename + ".gz", "wb"
+        ) as g:
+            g.write(fobj.read())
+        try:
+            survey = LogSurvey(self.filename + ".gz")
+        finally:
+            os.remove(self.filename + ".gz")
+        self.assertEqual(survey.records, self.pages)
+        self.assertEqual(survey.times, LogSurvey(self.filename).times)
+        self.assertEqual(survey.gaps, [(98.99, 105.0)])
+
+    def test_compressed_blocks(self):
+        # 欠落と逆行がブロックの境界をまたいでも、展開せずに調べた結果と同じ
+        with open(self.filename, "ab") as fobj:
+            fobj.write(bytes(RECORD_SIZE - 7) + make_page("A", 2, 5000))
+        with open(self.filename, "rb") as fobj, gzip.open(
+            self.filename + ".gz", "wb"
+        ) as g:
+            g.write(fobj.read())
+        expected = LogSurvey(self.filename)
+        try:
+            for chunk in [37, 1000]:
+                with self.subTest(chunk=chunk), patch("LogSurvey.CHUNK", chunk):
+                    survey = LogSurvey(self.filename + ".gz")
+                    self.assertEqual(survey.records, expected.records)
+                    np.testing.assert_array_equal(survey.counts, expected.counts)
+                    self.assertEqual(survey.times, expected.times)
+                    self.assertEqual(survey.gaps, expected.gaps)
+                    self.assertEqual(survey.backward, 1)
+        finally:
+            os.remove(self.filename + ".gz")
+
+    def test_backward(self):
+        with open(self.filename, "ab") as fobj:
+            fobj.write(bytes(RECORD_SIZE - 7) + make_page("A", 2, 5000))
+        survey = LogSurvey(self.filename, gap=10.0)
+        self.assertEqual(survey.backward, 1)
+        self.assertEqual(survey.gaps, [])
+
+    def test_empty(self):
+        with open(self.filename, "wb"):
+            pass
+        survey = LogSurvey(self.filename)
+        self.assertEqual(survey.records, 0)
+        self.assertEqual(survey.pages, {})
+        self.assertTrue(np.isnan(survey.span[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,11 +5,277 @@ Convert Sylphide format binary data into readable csv or ubx files.
 """
 
 # Imports
+import os
+import re
+import copy
 import struct
+import functools
 import configparser
 import numpy as np
 import pandas as pd
-from typing import Any, List
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import Compression
+
+# struct format characters and the corresponding numpy type codes
+_STRUCT2NUMPY = {
+    "b": "i1",
+    "B": "u1",
+    "h": "i2",
+    "H": "u2",
+    "i": "i4",
+    "I": "u4",
+    "l": "i4",
+    "L": "u4",
+    "q": "i8",
+    "Q": "u8",
+    "f": "f4",
+    "d": "f8",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def format2dtype(payload_format: str) -> np.dtype:
+    """
+    Convert struct format string to numpy structured dtype.
+
+    Every item of the format becomes one field, so that the fields of the
+    dtype are in the same order as the values returned by struct.unpack.
+
+    Parameters
+    ----------
+    payload_format : str
+        Format string of struct module.
+
+    Returns
+    -------
+    np.dtype
+        Structured dtype with the same layout as the format.
+    """
+    byte_order = "="
+    body = payload_format
+    if len(body) > 0 and body[0] in "@=<>!":
+        byte_order = body[0]
+        body = body[1:]
+    aligned = byte_order == "@"
+    prefix = {"@": "=", "=": "=", "<": "<", ">": ">", "!": ">"}[byte_order]
+    names: List[str] = []
+    formats: List[str] = []
+    offsets: List[int] = []
+    offset = 0
+    for count, code in re.findall(r"(\d*)([xbBhHiIlLqQfd])", body):
+        count = int(count) if len(count) > 0 else 1
+        if code == "x":
+            offset += count
+            continue
+        size = struct.calcsize("=" + code)
+        if aligned and offset % size != 0:
+            offset += size - offset % size
+        for _ in range(count):
+            names.append(f"f{len(names)}")
+            formats.append(prefix + _STRUCT2NUMPY[code])
+            offsets.append(offset)
+            offset += size
+    return np.dtype(
+        {
+            "names": names,
+            "formats": formats,
+            "offsets": offsets,
+            "itemsize": struct.calcsize(payload_format),
+        }
+    )
+
+
+def as_records(dat: Any, size: int = 32) -> np.ndarray:
+    """
+    Arrange raw binary data as an array of records.
+
+    Parameters
+    ----------
+    dat : bytes or np.ndarray
+        Concatenated records.
+    size : int, optional
+        Size of a record. The default is 32.
+
+    Returns
+    -------
+    np.ndarray
+        Contiguous uint8 array with shape (number of records, size).
+    """
+    if isinstance(dat, (bytes, bytearray, memoryview)):
+        dat = np.frombuffer(dat, dtype=np.uint8)
+    return np.ascontiguousarray(np.asarray(dat, dtype=np.uint8).reshape(-1, size))
+
+
+def unpack_records(payload_format: str, dat: Any, offset: int = 0) -> np.ndarray:
+    """
+    Unpack all records at once.
+
+    Parameters
+    ----------
+    payload_format : str
+        Format string of struct module applied to every record.
+    dat : bytes or np.ndarray
+        Records to be unpacked. See as_records.
+    offset : int, optional
+        Position in a record where the format starts. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        Unpacked values with shape (number of records, number of items).
+        Row i equals struct.unpack(payload_format, record_i[offset:...]).
+    """
+    recs = as_records(dat)
+    dtype = format2dtype(payload_format)
+    view = np.ndarray(
+        shape=(len(recs),),
+        dtype=dtype,
+        buffer=recs,
+        offset=offset,
+        strides=(recs.shape[1],),
+    )
+    out = np.empty((len(recs), len(dtype.names)), dtype=np.float64)
+    for i, name in enumerate(dtype.names):
+        out[:, i] = view[name]
+    return out
+
+
+def render_output(filename: str, dat: Any, append: bool = False) -> bytes:
+    """
+    Bytes of output of a page written to file, before compression.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+    dat : pd.DataFrame or bytes
+        Rows of csv file with column names as the header, or binary data.
+    append : bool, optional
+        Appended to the end of the file. The header of csv is written only
+        if the file does not exist or is empty. The default is False.
+
+    Returns
+    -------
+    bytes
+        Csv text or binary data.
+    """
+    if not isinstance(dat, pd.DataFrame):
+        return bytes(dat)
+    header = not (append and os.path.exists(filename) and os.path.getsize(filename) > 0)
+    return dat.to_csv(index=False, header=header).encode()
+
+
+def write_output(filename: str, dat: Any, append: bool = False) -> None:
+    """
+    Write output of a page to file.
+
+    The file is compressed by its extension, e.g. LOG_A.csv.gz. See
+    Compression.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file.
+    dat : pd.DataFrame or bytes
+        Rows of csv file with column names as the header, or binary data.
+    append : bool, optional
+        Append to the end of the file. The header of csv is written only if
+        the file does not exist or is empty. The default is False.
+
+    Returns
+    -------
+    None.
+    """
+    if isinstance(dat, pd.DataFrame):
+        write_csv(dat, filename, append)
+    else:
+        Compression.write(filename, bytes(dat), append)
+
+
+def write_csv(df: pd.DataFrame, filename: str, append: bool = False) -> None:
+    """
+    Write data frame to csv file.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data with column names as the header.
+    filename : str
+        Name of the file, compressed by the extension, e.g. LOG_A.csv.gz.
+    append : bool, optional
+        Append rows to the end of the file without the header. The header is
+        written if the file does not exist or is empty. The default is False.
+
+    Returns
+    -------
+    None.
+    """
+    if Compression.compression_of(filename) is not None:
+        Compression.write(filename, render_output(filename, df, append), append)
+    elif append and os.path.exists(filename) and os.path.getsize(filename) > 0:
+        df.to_csv(filename, index=False, header=False, mode="a")
+    else:
+        df.to_csv(filename, index=False)
+
+
+# Registered page classes by name, and name of page by header byte (0: none)
+PAGES: Dict[str, type] = {}
+DISPATCH = np.zeros(256, dtype=np.uint8)
+
+
+def register_page(page_class: type) -> type:
+    """
+    Register page class by its header bytes.
+
+    Parameters
+    ----------
+    page_class : type
+        Subclass of Page. The first one of headers is the name of the page.
+
+    Returns
+    -------
+    type
+        page_class.
+
+    Raises
+    ------
+    ValueError
+        If a header byte is registered to another page.
+    """
+    name = page_class.headers[0]
+    for code in page_class.headers:
+        if DISPATCH[code] not in (0, name):
+            raise ValueError(
+                f"{page_class.__name__}: header {chr(code)!r} is registered "
+                f"to page {chr(DISPATCH[code])}"
+            )
+    for code in page_class.headers:
+        DISPATCH[code] = name
+    PAGES[chr(name)] = page_class
+    return page_class
+
+
+def group_records(dat: Any) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    Split records by page with DISPATCH.
+
+    Parameters
+    ----------
+    dat : bytes or np.ndarray
+        Concatenated records of any header. See as_records.
+
+    Yields
+    ------
+    Tuple[str, np.ndarray]
+        Name of page and its records in order. Records of headers which are
+        not registered are skipped.
+    """
+    records = as_records(dat)
+    keys = DISPATCH[records[:, 0]]
+    for code in np.unique(keys).tolist():
+        if code > 0:
+            yield chr(code), records[keys == code]
 
 
 # Base class for handling pages of data
@@ -23,12 +289,32 @@ class Page:
         Description of format used in unpack.
     payload : list
         List of unpacked data.
+    time_offset : int or None
+        Position of GNSS time (uint32, millisecond) in a record.
+        None if the page has no GNSS time at fixed position.
+    headers : bytes
+        Header bytes of the page. The first one is the name of the page and
+        its output files, and the others, e.g. lowercase, are read as the
+        same page. Subclasses declaring headers are registered to PAGES.
     """
 
+    time_offset: Optional[int] = None
+    headers: bytes = b""
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        if "headers" in cls.__dict__ and len(cls.headers) > 0:
+            register_page(cls)
+
     def __init__(self) -> None:
         self.payload_format = ""
         self.payload: List[Any] = []
 
+    @property
+    def name(self) -> str:
+        """Name of page, e.g. "A"."""
+        return chr(self.headers[0])
+
     def unpack(self, dat: bytes) -> Any:
         """
         Unpack raw binary data.
@@ -48,6 +334,23 @@ class Page:
         """Placeholder for unpack method to be overridden in derived classes."""
         raise NotImplementedError("Subclasses must implement this method.")
 
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        """
+        Unpack multiple records at once.
+
+        Parameters
+        ----------
+        dat : bytes or np.ndarray
+            Concatenated records or uint8 array with shape (N, 32).
+
+        Returns
+        -------
+        np.ndarray
+            Output data unpacked. Rows are the same as the ones appended to
+            payload by calling append for every record in order.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
     def append(self, dat: bytes) -> None:
         """
         Append unpacked data to data list.
@@ -64,6 +367,112 @@ class Page:
         unpacked_data = self.unpack(dat)
         self.payload.append(unpacked_data)
 
+    def raw2phys(self) -> None:
+        """
+        Convert payload into physical values. Nothing to convert by default.
+
+        Returns
+        -------
+        None.
+        """
+
+    def take(self) -> "Page":
+        """
+        Move stored data into a copy of the page.
+
+        The copy can be converted and saved while this page stores the
+        following records.
+
+        Returns
+        -------
+        Page
+            Shallow copy of the page with the stored data.
+        """
+        taken = copy.copy(self)
+        self.payload = []
+        return taken
+
+    def outputs(self, root: str) -> List[Tuple[str, Any]]:
+        """
+        Output files of stored data.
+
+        Parameters
+        ----------
+        root : str
+            Name of the log file without extension.
+
+        Returns
+        -------
+        List[Tuple[str, Any]]
+            Name of each file, e.g. LOG_A.csv, and its data, pd.DataFrame for
+            csv file or bytes for binary file. Empty without data.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def output_names(self, root: str) -> List[str]:
+        """
+        Names of all files which outputs can return.
+
+        Parameters
+        ----------
+        root : str
+            Name of the log file without extension.
+
+        Returns
+        -------
+        List[str]
+            e.g. [LOG_A.csv].
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def outputs_array(
+        self, root: str, records: np.ndarray, unit_conversion: bool = False
+    ) -> List[Tuple[str, Any]]:
+        """
+        Output files of records, without keeping them in payload.
+
+        Parameters
+        ----------
+        root : str
+            Name of the log file without extension.
+        records : np.ndarray
+            Records of the page, uint8 array with shape (N, 32).
+        unit_conversion : bool, optional
+            Convert the data from raw to scaled. The default is False.
+
+        Returns
+        -------
+        List[Tuple[str, Any]]
+            The same files as outputs after appending the records to payload
+            and raw2phys.
+        """
+        # 配列で解凍できないページは、レコードごとに追加して変換する
+        for record in records:
+            self.append(record.tobytes())
+        chunk = self.take()
+        if unit_conversion:
+            chunk.raw2phys()
+        return chunk.outputs(root)
+
+    def save(self, root: str, append: bool = False) -> None:
+        """
+        Save payload into the files of the page, e.g. LOG_A.csv.
+
+        Parameters
+        ----------
+        root : str
+            Name of the log file without extension.
+        append : bool, optional
+            Append to the existing files, e.g. of incremental conversion.
+            The default is False.
+
+        Returns
+        -------
+        None.
+        """
+        for filename, dat in self.outputs(root):
+            write_output(filename, dat, append)
+
     @property
     def size(self) -> int:
         return 32
@@ -79,14 +488,148 @@ class PageCsv(Page):
         Header added to output csv file.
     filename_config : str
         Filename of configureation file.
+    time_column : int
+        Column of GNSS time in millisecond.
+    phys_scaling, phys_offset, phys_divisor : np.ndarray
+        Coefficients of unit conversion for each column,
+        phys = (raw * phys_scaling + phys_offset) / phys_divisor.
+    samples_per_record : int
+        Number of samples packed in a record.
+    sample_stride : int
+        Number of values of a sample.
+    sample_interval : float
+        Interval of samples in millisecond.
+    sample_delay : float
+        Time of the last sample before the time of a record in millisecond.
     """
 
+    time_offset: Optional[int] = 4
+    samples_per_record: int = 1
+    sample_stride: int = 0
+    sample_interval: float = 0
+    sample_delay: float = 0
+
     def __init__(self, filename_config="config.ini"):
         super().__init__()
         self.csv_header: List[str] = []
         self.filename_config: str = filename_config
+        self.time_column: int = 1
+        self.phys_scaling: Optional[np.ndarray] = None
+        self.phys_offset: Optional[np.ndarray] = None
+        self.phys_divisor: Optional[np.ndarray] = None
+        self._int_columns: Optional[np.ndarray] = None
+
+    def outputs(self, root: str) -> List[Tuple[str, Any]]:
+        return self.csv_outputs(f"{root}_{self.name}.csv")
+
+    def output_names(self, root: str) -> List[str]:
+        return [f"{root}_{self.name}.csv"]
+
+    def outputs_array(
+        self, root: str, records: np.ndarray, unit_conversion: bool = False
+    ) -> List[Tuple[str, Any]]:
+        if len(records) == 0:
+            return []
+        dat = self.unpack_array(records)
+        if unit_conversion:
+            dat = self.raw2phys_array(dat)
+        return self.csv_outputs_array(f"{root}_{self.name}.csv", dat, unit_conversion)
+
+    def int_columns(self) -> np.ndarray:
+        """
+        Columns which unpack gives as int.
+
+        Returns
+        -------
+        np.ndarray
+            bool array of each column of a row.
+        """
+        if self._int_columns is None:
+            record = bytearray(self.size)
+            record[0] = self.headers[0]
+            rows = self.unpack(bytes(record))
+            row = rows[0] if isinstance(rows[0], list) else rows
+            self._int_columns = np.array(
+                [isinstance(value, (int, np.integer)) for value in row]
+            )
+        return self._int_columns
 
-    def save_raw_csv(self, filename: str) -> None:
+    def frame(self, dat: Any, raw: bool = False) -> pd.DataFrame:
+        """
+        Data frame of rows with csv_header.
+
+        Parameters
+        ----------
+        dat : list or np.ndarray
+            Rows of payload, or output of unpack_array or raw2phys_array.
+        raw : bool, optional
+            dat is an output of unpack_array. Columns which unpack gives as
+            int are written as int, so that csv files are the same as those
+            of payload. The default is False.
+
+        Returns
+        -------
+        pd.DataFrame
+            Rows with column names.
+        """
+        if raw:
+            ints = self.int_columns()
+            df = pd.DataFrame(
+                {
+                    i: dat[:, i].astype(np.int64) if ints[i] else dat[:, i]
+                    for i in range(dat.shape[1])
+                }
+            )
+        else:
+            df = pd.DataFrame(dat)
+        if len(self.csv_header) > 0:
+            df.columns = ["# " + self.csv_header[0]] + self.csv_header[1:]
+        return df
+
+    def csv_outputs_array(
+        self, filename: str, dat: np.ndarray, converted: bool = False
+    ) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Csv files of decoded rows.
+
+        Parameters
+        ----------
+        filename : str
+            保存するファイルの名前。
+        dat : np.ndarray
+            Output of unpack_array, or of raw2phys_array if converted.
+        converted : bool, optional
+            dat is converted to physical units. The default is False.
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of each file and its rows. Empty without data.
+        """
+        if len(dat) == 0:
+            return []
+        return [(filename, self.frame(dat, raw=not converted))]
+
+    def csv_outputs(self, filename: str) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Csv files of stored data.
+
+        Parameters
+        ----------
+        filename : str
+            保存するファイルの名前。
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of each file and its rows. Empty without data.
+        """
+        # @todo 1を含めない理由は?
+        if len(self.payload) == 0:
+            return []
+        return [(filename, self.frame(self.payload))]
+
+    def save_raw_csv(self, filename: str, append: bool = False) -> None:
         """
         Save stored data to csv file.
 
@@ -94,20 +637,16 @@ class PageCsv(Page):
         ----------
         filename : str
             保存するファイルの名前。
+        append : bool, optional
+            Append to the existing file. The default is False.
 
         Returns
         -------
         None.
 
         """
-        # @todo 1を含めない理由は?
-        if len(self.payload) > 0:
-            df = pd.DataFrame(self.payload)
-            header = self.csv_header
-            if len(self.csv_header) > 0:
-                header[0] = "# " + header[0]
-                df.columns = header
-            df.to_csv(filename, index=False)
+        for output, df in self.csv_outputs(filename):
+            write_csv(df, output, append)
 
     def unpack(self, dat: bytes) -> List[Any]:
         """
@@ -125,6 +664,83 @@ class PageCsv(Page):
         """
         return list(struct.unpack(self.payload_format, dat))
 
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        return unpack_records(self.payload_format, dat)
+
+    def expand_record(
+        self, head: Sequence[Any], values: Sequence[Any], tail: Sequence[Any] = ()
+    ) -> List[List[Any]]:
+        """
+        Expand a record into rows of each sample.
+
+        Parameters
+        ----------
+        head : Sequence[Any]
+            Values common to the samples, i.e. internal time and time.
+        values : Sequence[Any]
+            sample_stride values of each sample in order.
+        tail : Sequence[Any], optional
+            Values common to the samples added after the sample.
+
+        Returns
+        -------
+        List[List[Any]]
+            samples_per_record rows. Time goes back by sample_interval for
+            each earlier sample.
+        """
+        n = self.samples_per_record
+        stride = self.sample_stride
+        out: List[List[Any]] = []
+        for i in range(n):
+            row = list(head)
+            row[self.time_column] -= (
+                self.sample_interval * (n - 1 - i) + self.sample_delay
+            )
+            out.append(row + list(values[i * stride : (i + 1) * stride]) + list(tail))
+        return out
+
+    def expand_samples(
+        self, head: np.ndarray, values: np.ndarray, tail: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Expand all records into rows of each sample at once.
+
+        Parameters
+        ----------
+        head : np.ndarray
+            Values common to the samples with shape (N, H).
+        values : np.ndarray
+            Values of samples with shape (N, samples_per_record * sample_stride).
+        tail : np.ndarray, optional
+            Values common to the samples added after the sample, shape (N, T).
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape (N * samples_per_record, H + sample_stride + T),
+            the same rows as expand_record of each record.
+        """
+        n = self.samples_per_record
+        stride = self.sample_stride
+        width = head.shape[1] + stride + (0 if tail is None else tail.shape[1])
+        out = np.empty((len(head), n, width))
+        out[:, :, : head.shape[1]] = head[:, np.newaxis]
+        out[:, :, self.time_column] -= (
+            self.sample_interval * (n - 1 - np.arange(n)) + self.sample_delay
+        )
+        out[:, :, head.shape[1] : head.shape[1] + stride] = values.reshape(
+            len(head), n, stride
+        )
+        if tail is not None:
+            out[:, :, head.shape[1] + stride :] = tail[:, np.newaxis]
+        return out.reshape(-1, width)
+
+    def append(self, dat: bytes) -> None:
+        if self.samples_per_record > 1:
+            self.payload.extend(self.unpack(dat))
+        else:
+            self.payload.append(self.unpack(dat))
+
     def millisec2sec(self, dat, column: int = 1) -> None:
         """
         Convert time from millisecond to second.
@@ -143,12 +759,55 @@ class PageCsv(Page):
         """
         dat[:, column] /= 1.0e3
 
+    def init_phys(self, columns: int) -> None:
+        """
+        Initialize coefficients of unit conversion.
+
+        Only the time column is converted from millisecond to second.
+        Derived classes modify the coefficients after calling this.
+
+        Parameters
+        ----------
+        columns : int
+            Number of columns of unpacked data.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.phys_scaling = np.ones(columns)
+        self.phys_offset = np.zeros(columns)
+        self.phys_divisor = np.ones(columns)
+        self.phys_divisor[self.time_column] = 1.0e3
+
+    def raw2phys_array(self, dat: np.ndarray) -> np.ndarray:
+        """
+        Convert unpacked data to physical units.
+
+        Parameters
+        ----------
+        dat : np.ndarray
+            Unpacked data, i.e. output of unpack_array.
+
+        Returns
+        -------
+        np.ndarray
+            Converted data. Input data is not modified.
+
+        """
+        out = np.array(dat, dtype=np.float64)
+        if self.phys_scaling is None or len(self.phys_scaling) != out.shape[1]:
+            self.init_phys(out.shape[1])
+        out *= self.phys_scaling
+        out += self.phys_offset
+        out /= self.phys_divisor
+        return out
+
     def raw2phys(self) -> None:
-        # @todo 1を含めない理由は?
         if len(self.payload) > 0:
             unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            self.payload = unpacked_data.tolist()
+            self.payload = self.raw2phys_array(unpacked_data).tolist()
 
 
 class PageCsv24(PageCsv):
@@ -159,6 +818,8 @@ class PageCsv24(PageCsv):
     @todo uintとintを実装
     """
 
+    time_offset: Optional[int] = 2
+
     def convert24bit(self, dat: List[int]) -> int:
         """
         Convert 24 bit data to unsigned int.
@@ -176,6 +837,23 @@ class PageCsv24(PageCsv):
         """
         return dat[2] + dat[1] * 2**8 + dat[0] * 2**16
 
+    def convert24bit_array(self, dat: np.ndarray) -> np.ndarray:
+        """
+        Convert columns of 24 bit data to unsigned int.
+
+        Parameters
+        ----------
+        dat : np.ndarray
+            3バイトずつ並んだ24ビットデータ。 shape (N, 3 * M)
+
+        Returns
+        -------
+        np.ndarray
+            変換された符号なし整数。 shape (N, M)
+
+        """
+        return dat[:, 2::3] + dat[:, 1::3] * 2**8 + dat[:, 0::3] * 2**16
+
 
 class PageBOL(PageCsv24):
     """
@@ -211,6 +889,9 @@ class PageBOL(PageCsv24):
             "Ch4",
             "LQI",
         ]
+        self.samples_per_record = 2
+        self.sample_stride = 4
+        self.sample_interval = 20
 
     def unpack(self, dat: bytes) -> List[List[Any]]:
         unpacked_data = list(struct.unpack(self.payload_format, dat))
@@ -221,23 +902,15 @@ class PageBOL(PageCsv24):
             dat_conv[i] = self.convert24bit(unpacked_data[start_index:end_index])
             if dat_conv[i] > 2**23:
                 dat_conv[i] = -(2**24) + dat_conv[i]
-        out: List[List[Any]] = []
-        out.append(
-            [unpacked_data[0], unpacked_data[1] - 20]
-            + list(dat_conv[:4])
-            + [unpacked_data[26]]
+        return self.expand_record(unpacked_data[:2], dat_conv, unpacked_data[26:])
+
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        unpacked_data = unpack_records(self.payload_format, dat)
+        dat_conv = self.convert24bit_array(unpacked_data[:, 2:26])
+        dat_conv = np.where(dat_conv > 2**23, dat_conv - 2**24, dat_conv)
+        return self.expand_samples(
+            unpacked_data[:, :2], dat_conv, unpacked_data[:, 26:]
         )
-        out.append(
-            [unpacked_data[0], unpacked_data[1]]
-            + list(dat_conv[4:])
-            + [unpacked_data[26]]
-        )
-        return out
-
-    def append(self, dat: bytes) -> None:
-        unpacked_data = self.unpack(dat)
-        for i in range(2):
-            self.payload.append(unpacked_data[i])
 
 
 class PageA(PageCsv24):
@@ -248,6 +921,8 @@ class PageA(PageCsv24):
     @memo OK
     """
 
+    headers: bytes = b"Aa"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x1B1I24B1H"
@@ -292,26 +967,16 @@ class PageA(PageCsv24):
         self.offset_tmp_prs: float = float(configA["offset_tmp_prs"])
         self.scaling_tmp_imu: float = float(configA["scaling_tmp_imu"])
         self.offset_tmp_imu: float = float(configA["offset_tmp_imu"])
-
-    def raw2phys(self) -> None:
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            for i in range(3):
-                unpacked_data[:, 2 + i] = (
-                    unpacked_data[:, 2 + i] - self.offset_acc[i]
-                ) / self.scaling_acc[i]
-                unpacked_data[:, 5 + i] = (
-                    unpacked_data[:, 5 + i] - self.offset_gyr[i]
-                ) / self.scaling_gyr[i]
-            unpacked_data[:, 8] = unpacked_data[:, 8] * self.scaling_prs
-            unpacked_data[:, 9] = (
-                unpacked_data[:, 9] * self.scaling_tmp_prs - self.offset_tmp_prs
-            )
-            unpacked_data[:, 10] = (
-                unpacked_data[:, 10] * self.scaling_tmp_imu - self.offset_tmp_imu
-            )
-            self.payload = unpacked_data.tolist()
+        self.init_phys(len(self.csv_header))
+        self.phys_offset[2:5] = np.negative(self.offset_acc)
+        self.phys_divisor[2:5] = self.scaling_acc
+        self.phys_offset[5:8] = np.negative(self.offset_gyr)
+        self.phys_divisor[5:8] = self.scaling_gyr
+        self.phys_scaling[8] = self.scaling_prs
+        self.phys_scaling[9] = self.scaling_tmp_prs
+        self.phys_offset[9] = -self.offset_tmp_prs
+        self.phys_scaling[10] = self.scaling_tmp_imu
+        self.phys_offset[10] = -self.offset_tmp_imu
 
     def unpack(self, dat) -> List[Any]:
         unpacked_data = list(struct.unpack(self.payload_format, dat))
@@ -322,6 +987,16 @@ class PageA(PageCsv24):
             [unpacked_data[0], unpacked_data[1]] + list(dat_conv) + [unpacked_data[26]]
         )
 
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        unpacked_data = unpack_records(self.payload_format, dat)
+        return np.column_stack(
+            (
+                unpacked_data[:, :2],
+                self.convert24bit_array(unpacked_data[:, 2:26]),
+                unpacked_data[:, 26:],
+            )
+        )
+
 
 class PageB(PageBOL):
     """
@@ -345,6 +1020,8 @@ class PageB(PageBOL):
     [30-31]: LQI
     """
 
+    headers: bytes = b"Bb"
+
     def __init__(self):
         super().__init__()
 
@@ -366,6 +1043,8 @@ class PageF(PageCsv):
     @todo OK
     """
 
+    headers: bytes = b"Ff"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "1x2x1B1I24B"
@@ -418,6 +1097,16 @@ class PageF(PageCsv):
             )
         return [unpacked_data[0], unpacked_data[1]] + list(dat_conv)
 
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        recs = as_records(dat)
+        unpacked_data = unpack_records(self.payload_format, recs)
+        raw = recs[:, 8:].astype(np.uint16)
+        out = np.empty((len(recs), 18))
+        out[:, :2] = unpacked_data[:, :2]
+        out[:, 2::2] = (raw[:, 1::3] & 0xF0) >> 4 | (raw[:, 0::3] << 4)
+        out[:, 3::2] = (raw[:, 1::3] & 0x0F) << 8 | raw[:, 2::3]
+        return out
+
 
 class PageG(Page):
     """
@@ -428,10 +1117,27 @@ class PageG(Page):
     @todo OK
     """
 
+    headers: bytes = b"Gg"
+
     def __init__(self):
         super().__init__()
 
-    def save_raw_ubx(self, filename: str) -> None:
+    def outputs(self, root: str) -> List[Tuple[str, Any]]:
+        if len(self.payload) == 0:
+            return []
+        return [(f"{root}_{self.name}.ubx", b"".join(self.payload))]
+
+    def output_names(self, root: str) -> List[str]:
+        return [f"{root}_{self.name}.ubx"]
+
+    def outputs_array(
+        self, root: str, records: np.ndarray, unit_conversion: bool = False
+    ) -> List[Tuple[str, Any]]:
+        if len(records) == 0:
+            return []
+        return [(f"{root}_{self.name}.ubx", self.unpack_array(records).tobytes())]
+
+    def save_raw_ubx(self, filename: str, append: bool = False) -> None:
         """
         Save raw ubx binary file.
 
@@ -439,6 +1145,8 @@ class PageG(Page):
         ----------
         filename : str
             保存するファイルの名前。
+        append : bool, optional
+            Append to the existing file. The default is False.
 
         Returns
         -------
@@ -446,9 +1154,8 @@ class PageG(Page):
 
         """
         if len(self.payload) > 0:
-            with open(filename, mode="wb") as f:
-                for dat in self.payload:
-                    f.write(dat)
+            with open(filename, mode="ab" if append else "wb") as f:
+                f.write(b"".join(self.payload))
 
     def unpack(self, dat: bytes) -> bytes:
         """
@@ -466,6 +1173,9 @@ class PageG(Page):
         """
         return dat[1:]
 
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        return as_records(dat)[:, 1:]
+
 
 class PageH(PageCsv):
     """
@@ -475,6 +1185,8 @@ class PageH(PageCsv):
     @memo OK
     """
 
+    headers: bytes = b"Hh"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x2x1B1I12H"
@@ -524,24 +1236,19 @@ class PageH(PageCsv):
             float(configH["offset_adc6"]),
             float(configH["offset_adc7"]),
         ]
-
-    def raw2phys(self) -> None:
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            for i in range(2):
-                unpacked_data[:, 2 + i] = (
-                    self.scaling_cadence[i] / unpacked_data[:, 2 + i]
-                )
-            unpacked_data[:, 4] = (
-                unpacked_data[:, 4] * self.scaling_ias + self.offset_ias
-            )
-            unpacked_data[:, 5] = unpacked_data[:, 5] * self.scaling_alt
-            for i in range(8):
-                unpacked_data[:, 6 + i] = (
-                    unpacked_data[:, 6 + i] * self.scaling_adc[i] - self.offset_adc[i]
-                )
-            self.payload = unpacked_data.tolist()
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[4] = self.scaling_ias
+        self.phys_offset[4] = self.offset_ias
+        self.phys_scaling[5] = self.scaling_alt
+        self.phys_scaling[6:14] = self.scaling_adc
+        self.phys_offset[6:14] = np.negative(self.offset_adc)
+
+    def raw2phys_array(self, dat: np.ndarray) -> np.ndarray:
+        out = super().raw2phys_array(dat)
+        # 回転数は周期の逆数に比例
+        with np.errstate(divide="ignore"):
+            out[:, 2:4] = self.scaling_cadence / out[:, 2:4]
+        return out
 
 
 class PageL(PageBOL):
@@ -566,6 +1273,8 @@ class PageL(PageBOL):
     [30-31]: LQI
     """
 
+    headers: bytes = b"Ll"
+
     def __init__(self):
         super().__init__()
 
@@ -578,10 +1287,19 @@ class PageM(PageCsv):
     @todo OK
     """
 
+    headers: bytes = b"Mm"
+
     def __init__(self):
         super().__init__()
-        self.payload_format_LE: str = "<1x2x1B1I12h"
-        self.payload_format_BE: str = ">1x2x1B1I12h"
+        # 時刻はリトルエンディアン、4サンプルのXYZはビッグエンディアン
+        self.record_dtype: np.dtype = np.dtype(
+            {
+                "names": ["internal_time", "time", "mag"],
+                "formats": ["u1", "<u4", (">i2", (4, 3))],
+                "offsets": [3, 4, 8],
+                "itemsize": 32,
+            }
+        )
         self.csv_header: List[str] = [
             "Internal Time",
             "GNSS Time (s)",
@@ -593,6 +1311,9 @@ class PageM(PageCsv):
         config.read(self.filename_config)
         configM = config["M"]
         self.sampling_interval: float = float(configM["sampling_interval"])
+        self.samples_per_record = 4
+        self.sample_stride = 3
+        self.sample_interval = self.sampling_interval
         self.scaling: np.ndarray = np.array(
             [
                 float(configM["scaling_x"]),
@@ -607,19 +1328,9 @@ class PageM(PageCsv):
                 float(configM["offset_z"]),
             ]
         )
-
-    def raw2phys(self) -> None:
-        """
-        ペイロードデータを物理単位に変換します。
-        """
-        if len(self.payload) > 1:
-            unpacked_data: np.ndarray = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            for i in range(3):
-                unpacked_data[:, 2 + i] = (
-                    unpacked_data[:, 2 + i] * self.scaling[i] - self.offset[i]
-                )
-            self.payload = unpacked_data.tolist()
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[2:5] = self.scaling
+        self.phys_offset[2:5] = -self.offset
 
     def unpack(self, dat: bytes) -> List[List[float]]:
         """
@@ -635,26 +1346,30 @@ class PageM(PageCsv):
         List[List[float]]
             解析後のデータリスト。
         """
-        unpacked_data_LE = list(struct.unpack(self.payload_format_LE, dat))
-        unpacked_data_BE = list(struct.unpack(self.payload_format_BE, dat))
-        out: List[List[float]] = []
-        for i in range(4):
-            out.append(
-                [
-                    unpacked_data_LE[0],
-                    unpacked_data_LE[1] - self.sampling_interval * (3 - i),
-                    *unpacked_data_BE[2 + i * 3 : 5 + i * 3],
-                ]
-            )
-        return out
+        return self.expand_record(
+            struct.unpack_from("<BI", dat, 3), struct.unpack_from(">12h", dat, 8)
+        )
 
-    def append(self, dat):
+    def unpack_array(self, dat: Any) -> np.ndarray:
         """
-        アンパックされたデータをペイロードに追加します。
+        Unpack all records at once into the table of 4 samples per record.
+
+        Parameters
+        ----------
+        dat : bytes or np.ndarray
+            Concatenated M records.
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape (4N, 5). Time of the earlier samples is
+            interpolated back by sampling_interval.
         """
-        unpacked_data = self.unpack(dat)
-        for i in range(4):
-            self.payload.append(unpacked_data[i])
+        records = as_records(dat).view(self.record_dtype)[:, 0]
+        return self.expand_samples(
+            np.stack([records["internal_time"], records["time"]], axis=1),
+            records["mag"].reshape(len(records), -1),
+        )
 
 
 class PageN(PageCsv):
@@ -665,6 +1380,8 @@ class PageN(PageCsv):
     @todo OK
     """
 
+    headers: bytes = b"Nn"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x1B2x4i6h"
@@ -681,18 +1398,11 @@ class PageN(PageCsv):
             "Roll (deg.)",
             "Pitch (deg.)",
         ]
-
-    def raw2phys(self) -> None:
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            unpacked_data[:, 2] /= 1.0e7  # Longitude
-            unpacked_data[:, 3] /= 1.0e7  # Latitude
-            unpacked_data[:, 4] /= 1.0e4  # Altitude
-
-            for i in np.arange(5, 11):  # Velocity and orientation
-                unpacked_data[:, i] /= 1.0e2
-            self.payload = unpacked_data.tolist()
+        self.init_phys(len(self.csv_header))
+        self.phys_divisor[2] = 1.0e7  # Latitude
+        self.phys_divisor[3] = 1.0e7  # Longitude
+        self.phys_divisor[4] = 1.0e4  # Altitude
+        self.phys_divisor[5:11] = 1.0e2  # Velocity and orientation
 
 
 class PageO(PageBOL):
@@ -717,6 +1427,8 @@ class PageO(PageBOL):
     [30-31]: LQI
     """
 
+    headers: bytes = b"Oo"
+
     def __init__(self):
         super().__init__()
 
@@ -748,6 +1460,8 @@ class PageP(PageCsv):
     [28-31]:temperature
     """
 
+    headers: bytes = b"Pp"
+
     def __init__(self):
         super().__init__()
         self.payload_format: List[str] = ["<1x2x1B1I", ">6I"]
@@ -762,33 +1476,24 @@ class PageP(PageCsv):
         configP = config["P"]
         self.sampling_interval: float = float(configP["sampling_interval"])
         self.scaling_tmp: float = float(configP["scaling_tmp"])
+        self.samples_per_record = 3
+        self.sample_stride = 2
+        self.sample_interval = self.sampling_interval
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[3] = self.scaling_tmp
 
     def unpack(self, dat: bytes) -> List[List[Any]]:
-        unpacked_data_1 = list(struct.unpack(self.payload_format[0], dat[:8]))
-        unpacked_data_2 = list(struct.unpack(self.payload_format[1], dat[8:]))
-        out: List[List[Any]] = []
-        for i in range(3):
-            out.append(
-                [
-                    unpacked_data_1[0],
-                    unpacked_data_1[1] - self.sampling_interval * (2 - i),
-                    unpacked_data_2[0 + i * 2],
-                    unpacked_data_2[1 + i * 2],
-                ]
-            )
-        return out
-
-    def append(self, dat: bytes) -> None:
-        unpacked_data = self.unpack(dat)
-        for i in range(3):
-            self.payload.append(unpacked_data[i])
+        # 時刻はリトルエンディアン、サンプルはビッグエンディアン
+        return self.expand_record(
+            struct.unpack_from(self.payload_format[0], dat),
+            struct.unpack_from(self.payload_format[1], dat, 8),
+        )
 
-    def raw2phys(self) -> None:
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            unpacked_data[:, 3] *= self.scaling_tmp
-            self.payload = unpacked_data.tolist()
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        return self.expand_samples(
+            unpack_records(self.payload_format[0], dat),
+            unpack_records(self.payload_format[1], dat, 8),
+        )
 
 
 class PageR(PageCsv):
@@ -825,9 +1530,11 @@ class PageR(PageCsv):
     [30-31]: Temperature 3 (Signed, little endian)
     """
 
+    headers: bytes = b"Rr"
+
     def __init__(self):
         super().__init__()
-        self.payload_format: str = ["<1x2x1B1I", "<12h"]
+        self.payload_format: str = "<1x2x1B1I12h"
         self.csv_header: List[str] = [
             "Internal Time",
             "GNSS Time (s)",
@@ -844,39 +1551,22 @@ class PageR(PageCsv):
         self.sampling_interval: float = float(configR["sampling_interval"])
         self.scaling_prs: float = float(configR["scaling_prs"])
         self.scaling_tmp: float = float(configR["scaling_tmp"])
+        self.samples_per_record = 2
+        self.sample_stride = 6
+        self.sample_interval = self.sampling_interval
+        # 最後のサンプルもレコードの時刻の1周期前
+        self.sample_delay = self.sampling_interval
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[2:5] = self.scaling_prs
+        self.phys_scaling[5:8] = self.scaling_tmp
 
     def unpack(self, dat: bytes) -> List[List[Any]]:
-        unpacked_data_1 = list(struct.unpack(self.payload_format[0], dat[:8]))
-        unpacked_data_2 = list(struct.unpack(self.payload_format[1], dat[8:]))
-        out: List[List[Any]] = []
-        for i in range(2):
-            out.append(
-                [
-                    unpacked_data_1[0],
-                    unpacked_data_1[1] - self.sampling_interval * (2 - i),
-                    *unpacked_data_2[0 + i * 6 : 6 + i * 6],
-                ]
-            )
-        return out
+        unpacked_data = struct.unpack(self.payload_format, dat)
+        return self.expand_record(unpacked_data[:2], unpacked_data[2:])
 
-    def append(self, dat: bytes) -> None:
-        """
-        アンパックしたデータをペイロードに追加します。
-        """
-        unpacked_data = self.unpack(dat)
-        for i in range(2):
-            self.payload.append(unpacked_data[i])
-
-    def raw2phys(self) -> None:
-        """
-        ペイロードデータを物理単位に変換します。
-        """
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            unpacked_data[:, 2:5] *= self.scaling_prs
-            unpacked_data[:, 5:] *= self.scaling_tmp
-            self.payload = unpacked_data.tolist()
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        unpacked_data = unpack_records(self.payload_format, dat)
+        return self.expand_samples(unpacked_data[:, :2], unpacked_data[:, 2:])
 
 
 class PageS(PageCsv):
@@ -893,6 +1583,8 @@ class PageS(PageCsv):
     @todo OK
     """
 
+    headers: bytes = b"Ss"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x2x1B1I12H"
@@ -913,17 +1605,12 @@ class PageS(PageCsv):
         self.scaling_5V0_Vol: float = float(configS["scaling_5V0_Vol"])
         self.scaling_Bat_Cur: float = float(configS["scaling_Bat_Cur"])
         self.scaling_USB_Cur: float = float(configS["scaling_USB_Cur"])
-
-    def raw2phys(self) -> None:
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            unpacked_data[:, 2] *= self.scaling_3V3_Vol
-            unpacked_data[:, 3] *= self.scaling_Pow_Vol
-            unpacked_data[:, 4] *= self.scaling_5V0_Vol
-            unpacked_data[:, 5] *= self.scaling_Bat_Cur
-            unpacked_data[:, 6] *= self.scaling_USB_Cur
-            self.payload = unpacked_data.tolist()
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[2] = self.scaling_3V3_Vol
+        self.phys_scaling[3] = self.scaling_Pow_Vol
+        self.phys_scaling[4] = self.scaling_5V0_Vol
+        self.phys_scaling[5] = self.scaling_Bat_Cur
+        self.phys_scaling[6] = self.scaling_USB_Cur
 
 
 class PageT(PageCsv):
@@ -932,66 +1619,163 @@ class PageT(PageCsv):
 
     - ANT+
 
+    Records of format mode ('F') have two samples, and records of dump mode
+    ('D') have 30 bytes of a message. They are stored into separate tables.
+
     Attributes:
-        payload_format (str): Basic unpack format string.
-        payload_format_format (str): Unpack format string for formatted data.
-        payload_format_dump (str): Unpack format string for dump mode.
-        csv_header (List[str]): Headers for the CSV output.
+        payload_format_format (str): Unpack format string of a sample of
+            format mode.
+        payload_dump (List[List[int]]): Rows of dump mode.
+        csv_header (List[str]): Headers for the CSV output of format mode.
+        csv_header_dump (List[str]): Headers for the CSV output of dump mode.
+
+    Format
+    [0]: "T"
+    [1]: mode, 'F' or 'D'
+    'F'
+    [2]: Reserved
+    [3]: internal time
+    [4-7]: gnss time
+    [8-15]: dat
+    [16-18]: Reserved
+    [19]: internal time
+    [20-23]: gnss time
+    [24-31]: dat
+    'D'
+    [2-31]: dat
 
     @todo OK
     """
 
+    headers: bytes = b"Tt"
+    time_offset: Optional[int] = None
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x1B"
-        self.payload_format_format: str = "<1x1B1I8B"  # フォーマットモード
-        # self.payload_format_dump:str = '<1B30B'  # ダンプモード
-        self.payload_format_dump: str = "<30B"  # ダンプモード
+        self.payload_format_format: str = "<1B1I8B"  # フォーマットモード
+        self.payload_dump: List[List[int]] = []  # ダンプモード
         self.csv_header: List[str] = [
-            "Mode",
-            "Internal Time/dat",
-            "GNSS Time (s)/dat",
+            "Internal Time",
+            "GNSS Time (s)",
         ] + ["dat"] * 8
+        self.csv_header_dump: List[str] = ["dat"] * 30
+        self.init_phys(len(self.csv_header))
 
-    def raw2phys(self) -> None:
+    def unpack(self, dat: bytes) -> List[List[int]]:
         """
-        Convert the raw data in the payload to physical units.
-        """
-        if len(self.payload) > 1:
-            for i, pl in enumerate(self.payload):
-                if len(pl) == 11:
-                    # pl_temp = list(pl)
-                    pl[2] *= 1.0e-3
-                    self.payload[i] = pl
-
-    def unpack(self, dat: bytes):
-        unpacked_data = list(struct.unpack(self.payload_format, dat[:2]))
-        if unpacked_data[0] == 70:  # 'F'
-            out = []
-            out.append(
-                [70] + list(struct.unpack(self.payload_format_format, dat[2:16]))
-            )
-            out.append([70] + list(struct.unpack(self.payload_format_format, dat[18:])))
-            return out
-        elif unpacked_data[0] == 68:  # 'D'
-            # print(["#"] + list(struct.unpack(self.payload_format_dump, dat[1:])))
-            return ["# 68"] + list(struct.unpack(self.payload_format_dump, dat[2:]))
-        return None
+        Unpack a record.
+
+        Parameters
+        ----------
+        dat : bytes
+            Record.
+
+        Returns
+        -------
+        List[List[int]]
+            Two rows of format mode, a row of dump mode, or no row for the
+            other modes.
+        """
+        if dat[1] == ord("F"):
+            return [
+                list(struct.unpack_from(self.payload_format_format, dat, 3)),
+                list(struct.unpack_from(self.payload_format_format, dat, 19)),
+            ]
+        elif dat[1] == ord("D"):
+            return [list(dat[2:])]
+        return []
+
+    def unpack_array(self, dat: Any) -> np.ndarray:
+        """Unpack samples of format mode of all records, shape (2N, 10)."""
+        records = as_records(dat)
+        records = records[records[:, 1] == ord("F")]
+        first = unpack_records(self.payload_format_format, records, 3)
+        second = unpack_records(self.payload_format_format, records, 19)
+        return np.stack([first, second], axis=1).reshape(-1, first.shape[1])
+
+    def unpack_dump_array(self, dat: Any) -> np.ndarray:
+        """Unpack dump mode of all records, shape (N, 30)."""
+        records = as_records(dat)
+        return records[records[:, 1] == ord("D"), 2:]
 
     def append(self, dat: bytes) -> None:
         """
-        Append unpacked data to the payload if it's valid.
+        Append unpacked data to the table of its mode.
 
         Args:
-            dat (bytes): The data to be unpacked and possibly appended.
+            dat (bytes): The data to be unpacked and appended.
         """
-        unpacked_data = self.unpack(dat)
-        if unpacked_data != None:
-            if len(unpacked_data) == 2:
-                for i in range(2):
-                    self.payload.append(unpacked_data[i])
-            else:
-                self.payload.append(unpacked_data)
+        if dat[1] == ord("D"):
+            self.payload_dump.extend(self.unpack(dat))
+        else:
+            self.payload.extend(self.unpack(dat))
+
+    def take(self) -> "PageT":
+        taken = super().take()
+        self.payload_dump = []
+        return taken
+
+    def output_names(self, root: str) -> List[str]:
+        return [f"{root}_{self.name}.csv", f"{root}_{self.name}_dump.csv"]
+
+    def int_columns(self) -> np.ndarray:
+        # フォーマットモードの値はすべて整数
+        return np.ones(len(self.csv_header), dtype=bool)
+
+    def outputs_array(
+        self, root: str, records: np.ndarray, unit_conversion: bool = False
+    ) -> List[Tuple[str, Any]]:
+        # モードごとにまとめて解凍する
+        if len(records) == 0:
+            return []
+        filename = f"{root}_{self.name}.csv"
+        dat = self.unpack_array(records)
+        if unit_conversion:
+            dat = self.raw2phys_array(dat)
+        outputs = self.csv_outputs_array(filename, dat, unit_conversion)
+        return outputs + self.dump_outputs(filename, self.unpack_dump_array(records))
+
+    def dump_outputs(self, filename: str, dump: Any) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Csv file of dump mode, filename with _dump.
+
+        Parameters
+        ----------
+        filename : str
+            Csv file of format mode.
+        dump : list or np.ndarray
+            Rows of dump mode.
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of the file and its rows. Empty without data.
+        """
+        if len(dump) == 0:
+            return []
+        root, ext = Compression.splitext(filename)
+        df = pd.DataFrame(dump, dtype=np.uint8)
+        df.columns = ["# " + self.csv_header_dump[0]] + self.csv_header_dump[1:]
+        return [(root + "_dump" + ext, df)]
+
+    def csv_outputs(self, filename: str) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        Format mode to filename and dump mode to filename with _dump.
+
+        Parameters
+        ----------
+        filename : str
+            保存するファイルの名前。
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of each file and its rows.
+        """
+        return super().csv_outputs(filename) + self.dump_outputs(
+            filename, self.payload_dump
+        )
 
 
 class PageU(PageCsv):
@@ -1027,6 +1811,8 @@ class PageU(PageCsv):
     [31]: Voltage 3, V_SYS, 0 -  4.096 V, 3.3 V nominal, V_SYS =  1.0 * ADCout [mV], (ADCout - 3300) / 1 count, int8_t, 3172 - 3428 mV,  1 mV step
     """
 
+    headers: bytes = b"Uu"
+
     def __init__(self):
         super().__init__()
         self.payload_format: str = "<1x2x1B1I5H5h4b"
@@ -1070,32 +1856,34 @@ class PageU(PageCsv):
         self.offset_voltage_1: float = float(configU["offset_voltage_1"])
         self.offset_voltage_2: float = float(configU["offset_voltage_2"])
         self.offset_voltage_3: float = float(configU["offset_voltage_3"])
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[2] = self.scaling_sensor_current_0
+        self.phys_scaling[3] = self.scaling_sensor_current_1
+        self.phys_scaling[4] = self.scaling_sensor_current_2
+        self.phys_scaling[5] = self.scaling_servo_current_0
+        self.phys_scaling[6] = self.scaling_servo_current_1
+        self.scaling_voltage: np.ndarray = np.array(
+            [
+                self.scaling_voltage_0,
+                self.scaling_voltage_1,
+                self.scaling_voltage_2,
+                self.scaling_voltage_3,
+            ]
+        )
+        self.offset_voltage: np.ndarray = np.array(
+            [
+                self.offset_voltage_0,
+                self.offset_voltage_1,
+                self.offset_voltage_2,
+                self.offset_voltage_3,
+            ]
+        )
 
-    def raw2phys(self):
-        """
-        ペイロードデータを物理単位に変換します。
-        """
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data, 2)
-            unpacked_data[:, 2] *= self.scaling_sensor_current_0
-            unpacked_data[:, 3] *= self.scaling_sensor_current_1
-            unpacked_data[:, 4] *= self.scaling_sensor_current_2
-            unpacked_data[:, 5] *= self.scaling_servo_current_0
-            unpacked_data[:, 6] *= self.scaling_servo_current_1
-            unpacked_data[:, 12] = (
-                unpacked_data[:, 12] - self.offset_voltage_0
-            ) * self.scaling_voltage_0
-            unpacked_data[:, 13] = (
-                unpacked_data[:, 13] - self.offset_voltage_1
-            ) * self.scaling_voltage_1
-            unpacked_data[:, 14] = (
-                unpacked_data[:, 14] - self.offset_voltage_2
-            ) * self.scaling_voltage_2
-            unpacked_data[:, 15] = (
-                unpacked_data[:, 15] - self.offset_voltage_3
-            ) * self.scaling_voltage_3
-            self.payload = unpacked_data.tolist()
+    def raw2phys_array(self, dat: np.ndarray) -> np.ndarray:
+        out = super().raw2phys_array(dat)
+        # 電圧はオフセットを引いてからスケーリング
+        out[:, 12:16] = (out[:, 12:16] - self.offset_voltage) * self.scaling_voltage
+        return out
 
 
 class PageV(PageCsv):
@@ -1132,9 +1920,14 @@ class PageV(PageCsv):
     @todo OK
     """
 
+    headers: bytes = b"Vv"
+
+    # [1-2]をuint16として読んだ値
+    TX: int = 22612  # b"TX"
+    RX: int = 22610  # b"RX"
+
     def __init__(self):
         super().__init__()
-        # self.payload_rx = [] # ファイルを送受信で分割する場合必要
         self.payload_format: str = "<1x1H1B1I3H1h8H"
         self.csv_header: List[str] = [
             "TX or RX",
@@ -1156,48 +1949,79 @@ class PageV(PageCsv):
         self.scaling_bat_motor: float = float(configV["scaling_bat_motor"])
         self.scaling_cur: float = float(configV["scaling_cur"])
         self.scaling_bat_control: float = float(configV["scaling_bat_control"])
+        self.time_column = 2
+        self.init_phys(len(self.csv_header))
+        self.phys_scaling[9] = self.scaling_bat_motor
+        self.phys_scaling[10] = self.scaling_cur
+        self.phys_scaling[11] = self.scaling_bat_control
 
-    def raw2phys(self) -> None:
+    def split_array(self, dat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
-        ペイロードデータを物理単位に変換します。
+        Partition unpacked data into TX and RX.
+
+        Parameters
+        ----------
+        dat : np.ndarray
+            Unpacked data, raw or converted.
+
+        Returns
+        -------
+        np.ndarray
+            Rows of TX.
+        np.ndarray
+            Rows of RX.
         """
-        if len(self.payload) > 1:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data, 2)
-            unpacked_data[:, 9] *= self.scaling_bat_motor
-            unpacked_data[:, 10] *= self.scaling_cur
-            unpacked_data[:, 11] *= self.scaling_bat_control
-            self.payload = unpacked_data.tolist()
+        tx = dat[:, 0] == self.TX
+        return dat[tx], dat[~tx & (dat[:, 0] == self.RX)]
 
-    # ファイルを送受信で分割するコード
-    """
-    def raw2phys(self):
-        if len(self.payload) > 0:
-            unpacked_data = np.array(self.payload, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            self.payload = unpacked_data
-        if len(self.payload_rx) > 0:
-            unpacked_data = np.array(self.payload_rx, dtype=np.float64)
-            self.millisec2sec(unpacked_data)
-            self.payload_rx = unpacked_data
-    def append(self, dat):
-        unpacked_data = self.unpack(dat)
-        if unpacked_data[0] == 22612:
-            self.payload.append(unpacked_data)
-            # print("tx")
-        elif unpacked_data[0] == 22610:
-            self.payload_rx.append(unpacked_data)
-            # print("rx")
-        # else:
-            # print(unpacked_data[0])
-    def save_raw_csv(self, filename):
-        if len(self.payload) > 0:
-            np.savetxt(filename+"_TX", np.array(self.payload), fmt='%.7f',
-                        delimiter = ', ', header=self.csv_header)
-        if len(self.payload_rx) > 0:
-            np.savetxt(filename+"_RX", np.array(self.payload_rx), fmt='%.7f',
-                        delimiter = ', ', header=self.csv_header)
-    """
+    def output_names(self, root: str) -> List[str]:
+        return [f"{root}_{self.name}_TX.csv", f"{root}_{self.name}_RX.csv"]
+
+    def csv_outputs_array(
+        self, filename: str, dat: np.ndarray, converted: bool = False
+    ) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        TX to filename with _TX and RX to filename with _RX.
+
+        Parameters
+        ----------
+        filename : str
+            保存するファイルの名前。
+        dat : np.ndarray
+            Output of unpack_array, or of raw2phys_array if converted.
+        converted : bool, optional
+            dat is converted to physical units. The default is False.
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of each file and its rows.
+        """
+        if len(dat) == 0:
+            return []
+        outputs = []
+        root, ext = Compression.splitext(filename)
+        for suffix, rows in zip(["_TX", "_RX"], self.split_array(dat)):
+            if len(rows) > 0:
+                outputs.append((root + suffix + ext, self.frame(rows, not converted)))
+        return outputs
+
+    def csv_outputs(self, filename: str) -> List[Tuple[str, pd.DataFrame]]:
+        """
+        TX to filename with _TX and RX to filename with _RX.
+
+        Parameters
+        ----------
+        filename : str
+            保存するファイルの名前。
+
+        Returns
+        -------
+        List[Tuple[str, pd.DataFrame]]
+            Name of each file and its rows.
+        """
+        # 行の型はpayloadのまま
+        return self.csv_outputs_array(filename, np.asarray(self.payload), True)
 
 
 class PageW(PageCsv):
@@ -50,6 +50,28 @@ class TestPageCsv(unittest.TestCase):
         expected = [[1.0, 2.0e-3], [1.0, 2.0e-3]]
         self.assertEqual(self.page.payload, expected)
 
+    def test_raw2phys_array(self):
+        dat = np.array([[1.0, 1500.0, 3.0]])
+        self.page.init_phys(3)
+        self.page.phys_scaling[2] = 2.0
+        self.page.phys_offset[2] = -1.0
+        result = self.page.raw2phys_array(dat)
+        np.testing.assert_array_almost_equal(result, [[1.0, 1.5, 5.0]])
+        np.testing.assert_array_equal(dat, [[1.0, 1500.0, 3.0]])
+
+
+class TestPageU(unittest.TestCase):
+    def test_raw2phys_voltage(self):
+        # 電圧は (raw - offset_voltage) * scaling_voltage
+        page = PageU()
+        dat = np.zeros((1, 16))
+        dat[0, 12:16] = [1100.0, 3000.0, 3300.0, 3400.0]
+        result = page.raw2phys_array(dat)
+        expected = (dat[0, 12:16] - page.offset_voltage) * page.scaling_voltage
+        np.testing.assert_array_equal(result[0, 12:16], expected)
+        np.testing.assert_array_equal(page.offset_voltage, [1000, 2880, 3300, 3300])
+        np.testing.assert_array_equal(page.scaling_voltage, [1.0, 4.0, 1.0, 1.0])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from SylphideProcessor import *
 
 class TestPage(unittest.TestCase):
@@ -30,5 +31,30 @@ class TestMockPage(unittest.TestCase):
         page.append(b"hello")
         self.assertIn("hello", page.payload)
 
+class TestRegistry(unittest.TestCase):
+    def test_dispatch(self):
+        self.assertIs(PAGES["A"], PageA)
+        self.assertIs(PAGES["G"], PageG)
+        self.assertNotIn("W", PAGES)
+        self.assertEqual(DISPATCH[ord("A")], ord("A"))
+        self.assertEqual(DISPATCH[ord("a")], ord("A"))
+        self.assertEqual(DISPATCH[ord("C")], 0)
+        self.assertEqual(PageT().name, "T")
+
+    def test_group_records(self):
+        records = np.zeros((5, 32), dtype=np.uint8)
+        records[:, 0] = [ord(c) for c in "AGaXA"]
+        records[:, 1] = np.arange(5)
+        groups = dict(group_records(records.tobytes()))
+        self.assertEqual(list(groups), ["A", "G"])
+        self.assertEqual(groups["A"][:, 1].tolist(), [0, 2, 4])
+
+    def test_conflict(self):
+        with self.assertRaises(ValueError):
+            class PageZ(Page):
+                headers = b"Za"
+        self.assertEqual(DISPATCH[ord("Z")], 0)
+        self.assertNotIn("Z", PAGES)
+
 if __name__ == "__main__":
     unittest.main()
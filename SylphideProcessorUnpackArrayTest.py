@@ -0,0 +1,164 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from SylphideProcessor import *
+
+
+def make_records(header: str, n: int = 16, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    recs = rng.integers(0, 256, size=(n, 32), dtype=np.uint8)
+    recs[:, 0] = ord(header)
+    return recs
+
+
+class TestFormat2Dtype(unittest.TestCase):
+    def test_itemsize(self):
+        for fmt in ["<1x2x1B1I12H", "1x2x1B1I24B", "<1x2x1B1I", ">6I"]:
+            self.assertEqual(format2dtype(fmt).itemsize, struct.calcsize(fmt))
+
+    def test_unpack_records(self):
+        recs = make_records("H")
+        fmt = "<1x2x1B1I12H"
+        expected = [list(struct.unpack(fmt, r.tobytes())) for r in recs]
+        np.testing.assert_array_equal(unpack_records(fmt, recs), expected)
+
+    def test_unpack_records_offset(self):
+        recs = make_records("P")
+        expected = [list(struct.unpack(">6I", r.tobytes()[8:])) for r in recs]
+        np.testing.assert_array_equal(unpack_records(">6I", recs, 8), expected)
+
+
+class TestUnpackArray(unittest.TestCase):
+    def assert_same_as_append(self, page, header):
+        recs = make_records(header)
+        for r in recs:
+            page.append(r.tobytes())
+        result = page.unpack_array(recs.tobytes())
+        np.testing.assert_array_equal(result, np.array(page.payload, dtype=np.float64))
+
+    def test_pages(self):
+        for header in ["A", "B", "F", "H", "L", "M", "N", "O", "P", "R", "S", "U", "V"]:
+            with self.subTest(page=header):
+                page = globals()[f"Page{header}"]()
+                self.assert_same_as_append(page, header)
+
+    def test_expand_samples(self):
+        page = PageCsv()
+        page.samples_per_record = 3
+        page.sample_stride = 2
+        page.sample_interval = 10
+        page.sample_delay = 5
+        head = np.array([[1, 1000], [2, 2000]])
+        values = np.arange(12).reshape(2, 6)
+        tail = np.array([[7], [8]])
+        expected = [
+            row
+            for i in range(2)
+            for row in page.expand_record(head[i], values[i], tail[i])
+        ]
+        self.assertEqual(expected[0], [1, 975, 0, 1, 7])
+        self.assertEqual(expected[2], [1, 995, 4, 5, 7])
+        np.testing.assert_array_equal(page.expand_samples(head, values, tail), expected)
+
+    def test_page_m(self):
+        # 時刻はリトルエンディアン、磁気はビッグエンディアン
+        page = PageM()
+        recs = make_records("M")
+        le = [struct.unpack("<1x2x1B1I12h", r.tobytes()) for r in recs]
+        be = [struct.unpack(">1x2x1B1I12h", r.tobytes()) for r in recs]
+        expected = [
+            [l[0], l[1] - page.sampling_interval * (3 - i), *b[2 + i * 3 : 5 + i * 3]]
+            for l, b in zip(le, be)
+            for i in range(4)
+        ]
+        np.testing.assert_array_equal(page.unpack_array(recs), expected)
+
+    def test_page_t(self):
+        page = PageT()
+        recs = make_records("T", 30)
+        recs[0::3, 1] = ord("F")
+        recs[1::3, 1] = ord("D")
+        recs[2::3, 1] = ord("X")
+        for r in recs:
+            page.append(r.tobytes())
+        # フォーマットモードとダンプモードは別の表
+        self.assertEqual(len(page.payload), 20)
+        self.assertEqual(len(page.payload_dump), 10)
+        first = struct.unpack("<3x1B1I8B16x", recs[0].tobytes())
+        self.assertEqual(page.payload[0], list(first))
+        np.testing.assert_array_equal(page.unpack_array(recs), page.payload)
+        np.testing.assert_array_equal(page.unpack_dump_array(recs), page.payload_dump)
+        np.testing.assert_array_equal(page.payload_dump[0], recs[1, 2:])
+
+    def test_page_v(self):
+        page = PageV()
+        recs = make_records("V", 30)
+        recs[:, 1:3] = np.frombuffer(b"TX", dtype=np.uint8)
+        recs[1::3, 1:3] = np.frombuffer(b"RX", dtype=np.uint8)
+        recs[2::3, 1] = 0
+        for r in recs:
+            page.append(r.tobytes())
+        tx, rx = page.split_array(page.unpack_array(recs))
+        np.testing.assert_array_equal(tx, page.unpack_array(recs[0::3]))
+        np.testing.assert_array_equal(rx, page.unpack_array(recs[1::3]))
+        page.raw2phys()
+        with tempfile.TemporaryDirectory() as directory:
+            page.save_raw_csv(os.path.join(directory, "log_V.csv"))
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["log_V_RX.csv", "log_V_TX.csv"]
+            )
+            with open(os.path.join(directory, "log_V_RX.csv")) as f:
+                self.assertEqual(len(f.readlines()), 11)
+
+    def test_page_g(self):
+        page = PageG()
+        recs = make_records("G")
+        np.testing.assert_array_equal(page.unpack_array(recs), recs[:, 1:])
+
+
+class TestOutputsArray(unittest.TestCase):
+    def make_page_records(self, header):
+        recs = make_records(header, 30)
+        if header == "T":
+            recs[0::2, 1] = ord("F")
+            recs[1::2, 1] = ord("D")
+        elif header == "V":
+            recs[:, 1:3] = np.frombuffer(b"TX", dtype=np.uint8)
+            recs[1::2, 1:3] = np.frombuffer(b"RX", dtype=np.uint8)
+        return recs
+
+    def assert_same_outputs(self, expected, result):
+        self.assertEqual([f for f, _ in result], [f for f, _ in expected])
+        for (_, df), (_, df_array) in zip(expected, result):
+            if isinstance(df, bytes):
+                self.assertEqual(df_array, df)
+            else:
+                self.assertEqual(df_array.to_csv(index=False), df.to_csv(index=False))
+
+    def test_same_as_payload(self):
+        # 配列のまま変換しても、payloadと同じファイルになる
+        for name in PAGES:
+            for unit_conversion in [False, True]:
+                with self.subTest(page=name, unit_conversion=unit_conversion):
+                    recs = self.make_page_records(name)
+                    page = PAGES[name]()
+                    for r in recs:
+                        page.append(r.tobytes())
+                    if unit_conversion:
+                        page.raw2phys()
+                    self.assertIsInstance(page.payload, list)
+                    self.assert_same_outputs(
+                        page.outputs("log"),
+                        PAGES[name]().outputs_array("log", recs, unit_conversion),
+                    )
+
+    def test_empty(self):
+        for name in PAGES:
+            with self.subTest(page=name):
+                recs = np.empty((0, 32), dtype=np.uint8)
+                self.assertEqual(PAGES[name]().outputs_array("log", recs), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
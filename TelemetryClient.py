@@ -0,0 +1,130 @@
+"""
+Telemetry Client.
+
+Receive decoded pages published by the ground station (TelemetryPublisher).
+
+Example
+-------
+>>> client = TelemetryClient("tcp://127.0.0.1:50000")
+>>> for device, header, dat in client:
+...     print(device, header, dat.shape)
+"""
+
+import socket
+import argparse
+import collections
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from TelemetryPublisher import (
+    MESSAGE_HEADER,
+    message_size,
+    parse_address,
+    unpack_message,
+)
+
+
+class TelemetryClient:
+    """
+    Subscriber of a TelemetryPublisher.
+
+    Attributes
+    ----------
+    address : str
+        tcp://host:port of TcpPublisher, or udp://host:port to bind for
+        UdpPublisher.
+    timeout : float or None
+        Timeout of receive in second. None blocks.
+    """
+
+    def __init__(self, address: str, timeout: Optional[float] = None) -> None:
+        self.address: str = address
+        self.timeout: Optional[float] = timeout
+        self.protocol, host, port = parse_address(address)
+        if self.protocol == "udp":
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind(("" if host == "255.255.255.255" else host, port))
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._socket.settimeout(timeout)
+        self._buffer = bytearray()
+
+    def close(self) -> None:
+        """Close connection."""
+        self._socket.close()
+
+    def __enter__(self) -> "TelemetryClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Tuple[int, str, np.ndarray]]:
+        while True:
+            message = self.receive()
+            if message is None:
+                return
+            yield message
+
+    def receive(self) -> Optional[Tuple[int, str, np.ndarray]]:
+        """
+        Receive a batch of decoded page.
+
+        Returns
+        -------
+        Tuple[int, str, np.ndarray] or None
+            Device number, page header and decoded page with shape
+            (rows, columns). None on timeout or when the publisher closed.
+        """
+        try:
+            if self.protocol == "udp":
+                return unpack_message(self._socket.recv(65536))
+            size = MESSAGE_HEADER.size
+            while True:
+                if len(self._buffer) >= MESSAGE_HEADER.size:
+                    size = message_size(self._buffer)
+                    if len(self._buffer) >= size:
+                        break
+                received = self._socket.recv(max(size - len(self._buffer), 65536))
+                if len(received) == 0:
+                    return None
+                self._buffer += received
+        except socket.timeout:
+            return None
+        message = unpack_message(bytes(self._buffer[:size]))
+        del self._buffer[:size]
+        return message
+
+    def collect(self, count: int) -> Dict[Tuple[int, str], np.ndarray]:
+        """
+        Receive messages and concatenate them by device and page.
+
+        Parameters
+        ----------
+        count : int
+            Number of messages to receive.
+
+        Returns
+        -------
+        Dict[Tuple[int, str], np.ndarray]
+            Decoded pages of each (device, header).
+        """
+        batches: Dict[Tuple[int, str], List[np.ndarray]] = collections.defaultdict(list)
+        for _ in range(count):
+            message = self.receive()
+            if message is None:
+                break
+            device, header, dat = message
+            batches[device, header].append(dat)
+        return {key: np.concatenate(dat) for key, dat in batches.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print published telemetry.")
+    parser.add_argument("address", help="e.g. tcp://127.0.0.1:50000")
+    args = parser.parse_args()
+    with TelemetryClient(args.address) as client:
+        for device, header, dat in client:
+            print(f"{device} {header}: {dat.shape[0]} rows x {dat.shape[1]} columns")
@@ -0,0 +1,494 @@
+"""
+Telemetry Engine.
+
+Reception pipeline of the ground station without GUI, i.e. sources, frame
+parsing, unit conversion, recording, publishing, health metrics, rolling
+statistics and alarms. The pyqtgraph windows of HPANaviGroundStation are one
+of its consumers.
+
+Usage
+-----
+python TelemetryEngine.py [--port PORT ...] [--replay DAT ...]
+"""
+
+import os
+import time
+import queue
+import argparse
+import threading
+import configparser
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import SylphideProcessor
+import TelemetryMetrics
+import TelemetryPublisher
+import TelemetryRecorder
+import TelemetrySource
+import TelemetryStats
+
+# Consumer of decoded pages, called with device number, page header and
+# decoded page with shape (rows, columns)
+Consumer = Callable[[int, str, np.ndarray], None]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add arguments to select sources."""
+    parser.add_argument(
+        "--port", nargs="+", help="serial port(s), e.g. PtyReplay of TelemetrySource"
+    )
+    parser.add_argument(
+        "--replay", nargs="+", metavar="DAT", help="replay recorded .dat file(s)"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay speed, 0: as fast as possible"
+    )
+
+
+def create_sources(
+    port: Optional[List[str]] = None,
+    replay: Optional[List[str]] = None,
+    speed: float = 1.0,
+) -> List[TelemetrySource.DataSource]:
+    """
+    Create sources of frames.
+
+    Parameters
+    ----------
+    port : List[str], optional
+        Serial ports. The default is none, i.e. GroundStationEngine searches
+        them with scan.
+    replay : List[str], optional
+        Recorded .dat files to replay instead of serial ports.
+    speed : float, optional
+        Replay speed. The default is 1.0.
+
+    Returns
+    -------
+    List[TelemetrySource.DataSource]
+        Sources, not opened yet.
+    """
+    if replay is not None:
+        return [TelemetrySource.ReplaySource(filename, speed) for filename in replay]
+    if port is None:
+        # 装置はGroundStationEngineがバックグラウンドで探す
+        return []
+    return [TelemetrySource.SerialSource(name) for name in port]
+
+
+class GroundStationEngine:
+    """
+    Receive, decode, convert, record and publish telemetry of devices.
+
+    Call poll periodically, e.g. from a GUI timer, or use run.
+
+    Attributes
+    ----------
+    sources : List[TelemetrySource.DataSource]
+        Sources of frames, one for each device.
+    config : configparser.SectionProxy
+        [GROUNDSTATION] section of config.ini.
+    record : bool
+        Record received pages into .dat files.
+    unit_conversion : bool
+        Convert pages with the constants of config.ini, or only millisecond
+        to second. The default is unit_conversion of [GROUNDSTATION].
+    scan : bool
+        Search serial ports of HPA_Navi in background and add devices found.
+    scan_period : float
+        Period of the search in second.
+    readers : List[TelemetrySource.SourceReader]
+        Readers of the sources. The index is the device number.
+    device_name : List[str]
+        Name of each device.
+    pages : dict
+        Page objects to decode each header.
+    metrics : List[TelemetryMetrics.HealthMetrics]
+        Health metrics of each device.
+    stats : TelemetryStats.StatsMonitor
+        Rolling statistics and alarms of [ALARM] in config.ini.
+    """
+
+    def __init__(
+        self,
+        sources: List[TelemetrySource.DataSource],
+        config_file: str = "config.ini",
+        record: Optional[bool] = None,
+        unit_conversion: Optional[bool] = None,
+        scan: bool = False,
+        scan_period: float = 1.0,
+    ) -> None:
+        self.sources: List[TelemetrySource.DataSource] = sources
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        if not config.has_section("GROUNDSTATION"):
+            config.add_section("GROUNDSTATION")
+        self.config: configparser.SectionProxy = config["GROUNDSTATION"]
+        if record is None:
+            record = self.config.getboolean("record", fallback=True)
+        self.record: bool = record
+        if unit_conversion is None:
+            unit_conversion = self.config.getboolean("unit_conversion", fallback=True)
+        self.unit_conversion: bool = unit_conversion
+        self.scan: bool = scan
+        self.scan_period: float = scan_period
+        self.readers: List[TelemetrySource.SourceReader] = []
+        self.device_name: List[str] = []
+        self.pages = {
+            header: page_class()
+            for header, page_class in TelemetrySource.TIMED_PAGES.items()
+        }
+        self.metrics: List[TelemetryMetrics.HealthMetrics] = []
+        self.recorders: Dict[int, TelemetryRecorder.RawRecorder] = {}
+        self.metrics_loggers: Dict[int, TelemetryMetrics.MetricsLogger] = {}
+        self.publishers: List[TelemetryPublisher.Publisher] = []
+        self.consumers: List[Consumer] = []
+        self.stats = TelemetryStats.StatsMonitor(
+            [
+                float(window)
+                for window in self.config.get("stats_windows", fallback="10").split(",")
+            ],
+            TelemetryStats.load_alarms(config),
+            {header: page.time_column for header, page in self.pages.items()},
+        )
+        self.add_consumer(self.stats.update)
+        self._started = False
+        self._found: "queue.Queue[str]" = queue.Queue()
+        self._stop_scan = threading.Event()
+        self._scan_thread: Optional[threading.Thread] = None
+
+    @property
+    def devices(self) -> List[int]:
+        """Device numbers."""
+        return list(range(len(self.readers)))
+
+    @property
+    def multiple_devices(self) -> bool:
+        """More than one device may be connected."""
+        return self.scan or len(self.readers) > 1
+
+    @property
+    def finished(self) -> bool:
+        """All sources are replayed to the end or stopped by error."""
+        if self.scan:
+            return False
+        return all(
+            not reader.running
+            or (reader.connected and getattr(reader.source, "finished", False))
+            for reader in self.readers
+        )
+
+    def add_consumer(self, consumer: Consumer) -> None:
+        """
+        Add consumer of decoded pages.
+
+        Parameters
+        ----------
+        consumer : Consumer
+            Called with device number, page header and decoded page for each
+            batch. Time is in second.
+
+        Returns
+        -------
+        None.
+        """
+        self.consumers.append(consumer)
+
+    def open(self) -> int:
+        """
+        Prepare readers of sources without waiting for them.
+
+        The readers open the sources in background and reconnect serial ports
+        after errors, e.g. USB cable is unplugged.
+
+        Returns
+        -------
+        int
+            Number of sources.
+        """
+        print("***** Start connection *****")
+        for source in self.sources:
+            self.add_source(source)
+        return len(self.readers)
+
+    def add_source(self, source: TelemetrySource.DataSource) -> int:
+        """
+        Add a device.
+
+        Parameters
+        ----------
+        source : TelemetrySource.DataSource
+            Source of the device.
+
+        Returns
+        -------
+        int
+            Device number.
+        """
+        device = len(self.readers)
+        self.readers.append(
+            TelemetrySource.SourceReader(
+                source, reconnect=isinstance(source, TelemetrySource.SerialSource)
+            )
+        )
+        self.device_name.append(os.path.splitext(os.path.basename(source.name))[0])
+        self.metrics.append(TelemetryMetrics.HealthMetrics())
+        self.metrics[device].connected = False
+        if self._started:
+            self._start_device(device)
+        return device
+
+    def _start_device(self, device: int) -> None:
+        if self.record:
+            # 複数の装置のログは装置名で区別
+            prefix = "HPANavi"
+            if self.multiple_devices:
+                prefix += "_" + self.device_name[device]
+            self.recorders[device] = TelemetryRecorder.RawRecorder(
+                self.config.get("record_directory", fallback="log"),
+                prefix=prefix,
+                rotation_period=self.config.getfloat(
+                    "record_rotation", fallback=3600.0
+                ),
+            )
+            self.recorders[device].start()
+
+        # ヘルスメトリクスの記録
+        if len(self.config.get("metrics_log", fallback="")) > 0:
+            filename = self.config["metrics_log"]
+            if self.multiple_devices:
+                root, ext = os.path.splitext(filename)
+                filename = f"{root}_{self.device_name[device]}{ext}"
+            self.metrics_loggers[device] = TelemetryMetrics.MetricsLogger(filename)
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+
+        self.readers[device].start()
+
+    def start(self) -> None:
+        """Start publishers, readers and the scan of serial ports."""
+        if self.record:
+            print(
+                "Recording into " + self.config.get("record_directory", fallback="log")
+            )
+
+        # 変換したページを他のプロセスへ配信
+        for address in self.config.get("publish", fallback="").split(","):
+            if len(address.strip()) > 0:
+                publisher = TelemetryPublisher.create_publisher(address.strip())
+                publisher.start()
+                self.publishers.append(publisher)
+                print("Publishing to " + address.strip())
+
+        for device in self.devices:
+            self._start_device(device)
+        self._started = True
+
+        if self.scan:
+            self._stop_scan.clear()
+            self._scan_thread = threading.Thread(target=self._scan, daemon=True)
+            self._scan_thread.start()
+
+    def stop(self) -> None:
+        """Stop readers, process the rest, close sources and flush recorders."""
+        self._stop_scan.set()
+        if self._scan_thread is not None:
+            self._scan_thread.join()
+            self._scan_thread = None
+        for reader in self.readers:
+            reader.stop()
+        self.poll()
+        for recorder in self.recorders.values():
+            recorder.stop()
+        for publisher in self.publishers:
+            publisher.stop()
+        self._started = False
+
+    def poll(self) -> None:
+        """Add devices found and process frames received since the last call."""
+        while True:
+            try:
+                port = self._found.get_nowait()
+            except queue.Empty:
+                break
+            print(f"-> HPA_Navi found on {port}")
+            self.add_source(TelemetrySource.SerialSource(port))
+        # 受信スレッドが前回以降に解析したフレームを装置ごとにまとめて変換
+        for device, reader in enumerate(self.readers):
+            for arrival, records, nbytes in reader.drain():
+                if len(records) > 0:
+                    self.process(device, records, nbytes, arrival)
+            metrics = self.metrics[device]
+            metrics.resync_count = reader.parser.resync_count
+            metrics.dropped_frames = reader.parser.dropped_frames
+            metrics.crc_errors = reader.parser.crc_errors
+            metrics.queue_depth = reader.backlog
+            metrics.connected = reader.connected
+            metrics.reconnects = reader.reconnects
+            metrics.reconnect_latency = reader.reconnect_latency
+        for _, device, name, active, value in self.stats.take_events():
+            state = "ALARM" if active else "Clear"
+            print(f"{state}: {name} = {value:.4g} ({self.device_name[device]})")
+
+    def _scan(self) -> None:
+        # 新しく接続された装置を探し続ける。既知のポートの再接続は各readerが担当
+        known = {reader.source.name for reader in self.readers}
+        while not self._stop_scan.is_set():
+            try:
+                ports = TelemetrySource.SerialSource.find_ports(verbose=False)
+            except Exception as e:
+                print(f"Can't search serial ports: {e}")
+                break
+            for port in ports:
+                if port not in known:
+                    known.add(port)
+                    self._found.put(port)
+            self._stop_scan.wait(self.scan_period)
+
+    def process(
+        self,
+        device: int,
+        records: np.ndarray,
+        nbytes: int,
+        arrival: Optional[float] = None,
+    ) -> None:
+        """
+        Record, decode and distribute pages.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+        records : np.ndarray
+            Pages with shape (N, 32).
+        nbytes : int
+            Number of received bytes.
+        arrival : float, optional
+            time.monotonic() when the pages arrived. The default is now.
+
+        Returns
+        -------
+        None.
+        """
+        metrics = self.metrics[device]
+        metrics.add_frames(records[:, 0], nbytes, arrival)
+        if device in self.recorders:
+            self.recorders[device].write(records)
+        # 小文字のヘッダも登録されたページに振り分け、それ以外は未処理として数える
+        headers = records[:, 0]
+        keys = SylphideProcessor.DISPATCH[headers]
+        for code in np.unique(keys).tolist():
+            header = chr(code)
+            if header not in self.pages:
+                for unknown in np.unique(headers[keys == code]).tolist():
+                    if chr(unknown) not in metrics.unknown:
+                        name = self.device_name[device]
+                        print(f"Unprocessed: {chr(unknown)} ({name})")
+                    metrics.add_unknown(
+                        chr(unknown), int(np.count_nonzero(headers == unknown))
+                    )
+                continue
+            page = self.pages[header]
+            dat = page.unpack_array(records[keys == code])
+            if self.unit_conversion:
+                dat = page.raw2phys_array(dat)
+            else:
+                page.millisec2sec(dat, page.time_column)
+            for publisher in self.publishers:
+                publisher.publish(device, header, dat)
+            for consumer in self.consumers:
+                consumer(device, header, dat)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Take health metrics of each device and write them to the logs.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Snapshot of each device.
+        """
+        snapshots = [metrics.snapshot() for metrics in self.metrics]
+        for device, logger in self.metrics_loggers.items():
+            logger.write(snapshots[device])
+        return snapshots
+
+    def format(self, snapshots: List[Dict[str, Any]]) -> str:
+        """
+        Format snapshots as text for display.
+
+        Parameters
+        ----------
+        snapshots : List[Dict[str, Any]]
+            Output of snapshot.
+
+        Returns
+        -------
+        str
+            Multi-line text.
+        """
+        text = []
+        if len(snapshots) == 0:
+            text.append("Waiting for HPA_Navi")
+        for device, snapshot in enumerate(snapshots):
+            if len(snapshots) > 1:
+                text.append(f"[{self.device_name[device]}]")
+            text.append(TelemetryMetrics.HealthMetrics.format(snapshot))
+            if self.readers[device].error is not None:
+                text.append(f"Error      : {self.readers[device].error}")
+            alarms = self.stats.format(device)
+            if len(alarms) > 0:
+                text.append(alarms)
+        for publisher in self.publishers:
+            text.append(
+                f"Published  : {getattr(publisher, 'subscribers', '-')} subscribers, "
+                f"{publisher.dropped:,} dropped"
+            )
+        return "\n".join(text)
+
+    def run(self, period: float = 0.01, metrics_period: float = 1.0) -> None:
+        """
+        Process frames until replay finishes or KeyboardInterrupt.
+
+        Parameters
+        ----------
+        period : float, optional
+            Polling period in second. The default is 0.01.
+        metrics_period : float, optional
+            Period in second to print and log health metrics. 0 disables.
+            The default is 1.0.
+
+        Returns
+        -------
+        None.
+        """
+        reported = time.monotonic()
+        try:
+            while not self.finished:
+                self.poll()
+                now = time.monotonic()
+                if 0 < metrics_period <= now - reported:
+                    print(self.format(self.snapshot()))
+                    reported = now
+                time.sleep(period)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HPA_Navi Ground Station (headless)")
+    add_arguments(parser)
+    parser.add_argument(
+        "--metrics", type=float, default=1.0, help="period to print health metrics"
+    )
+    args = parser.parse_args()
+    engine = GroundStationEngine(
+        create_sources(args.port, args.replay, args.speed),
+        record=False if args.replay is not None else None,
+        scan=args.port is None and args.replay is None,
+    )
+    engine.open()
+    engine.start()
+    engine.run(metrics_period=args.metrics)
+    engine.stop()
+    print(engine.format(engine.snapshot()))
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from TelemetryEngine import *
+from TelemetryTestData import make_pages
+
+
+class TestGroundStationEngine(unittest.TestCase):
+    def setUp(self):
+        # 前半はHページ、後半は処理されないZページ
+        self.pages = make_pages(20)
+        self.pages[10:, 0] = ord("Z")
+
+    def test_run(self):
+        pages = self.pages
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.dat")
+            pages.tofile(filename)
+            config_file = os.path.join(directory, "config.ini")
+            with open(config_file, "w") as f:
+                f.write(f"[GROUNDSTATION]\nrecord_directory = {directory}/log\n")
+            engine = GroundStationEngine(
+                create_sources(replay=[filename], speed=0), config_file, record=True
+            )
+            received = []
+            engine.add_consumer(lambda *args: received.append(args))
+            self.assertEqual(engine.open(), 1)
+            engine.start()
+            engine.run(period=0.001, metrics_period=0)
+            engine.stop()
+            recorded = np.fromfile(engine.recorders[0].filename, dtype=np.uint8)
+        np.testing.assert_array_equal(recorded.reshape(pages.shape), pages)
+        dat = np.concatenate([args[2] for args in received])
+        self.assertEqual({args[:2] for args in received}, {(0, "H")})
+        np.testing.assert_array_equal(dat[:, 1], np.arange(10) * 10 / 1e3)
+        self.assertEqual(engine.metrics[0].unknown["Z"], 10)
+        self.assertEqual(int(engine.metrics[0].frames.sum()), 20)
+
+    def test_unit_conversion(self):
+        # [GROUNDSTATION]のunit_conversionで変換を切り替える
+        with tempfile.TemporaryDirectory() as directory:
+            config_file = os.path.join(directory, "config.ini")
+            for option, expected in [("", True), ("unit_conversion = no\n", False)]:
+                with open(config_file, "w") as f:
+                    f.write("[GROUNDSTATION]\n" + option)
+                engine = GroundStationEngine([], config_file)
+                self.assertEqual(engine.unit_conversion, expected)
+            engine = GroundStationEngine([], config_file, unit_conversion=True)
+            self.assertTrue(engine.unit_conversion)
+
+
+if __name__ == "__main__":
+    unittest.main()
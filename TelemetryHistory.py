@@ -0,0 +1,281 @@
+"""
+Telemetry History.
+
+Disk-backed history of decoded pages for long sessions. Samples are appended
+to a columnar float64 file and memory-mapped on demand. Min/max summaries of
+SUMMARY_FACTOR ** (level + 1) samples are maintained for each level, so that
+zoomed out views read only the summaries.
+
+Samples of a page must be appended in the order of time.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Number of samples (or lower level tiles) summarized by one tile
+SUMMARY_FACTOR = 64
+# Number of summary levels, i.e. tiles of 64, 4096 and 262144 samples
+SUMMARY_LEVELS = 3
+
+
+def summarize(dat: np.ndarray) -> np.ndarray:
+    """
+    Summarize complete blocks of SUMMARY_FACTOR rows.
+
+    Parameters
+    ----------
+    dat : np.ndarray
+        Samples with shape (N, columns) or tiles with shape (N, 2, columns).
+
+    Returns
+    -------
+    np.ndarray
+        Tiles with shape (N // SUMMARY_FACTOR, 2, columns), [:, 0] is min and
+        [:, 1] is max. NaN is ignored.
+    """
+    blocks = len(dat) // SUMMARY_FACTOR
+    dat = dat[: blocks * SUMMARY_FACTOR]
+    if dat.ndim == 2:
+        dat = np.stack([dat, dat], axis=1)
+    dat = dat.reshape(blocks, SUMMARY_FACTOR, 2, dat.shape[-1])
+    return np.stack(
+        [np.fmin.reduce(dat[:, :, 0], axis=1), np.fmax.reduce(dat[:, :, 1], axis=1)],
+        axis=1,
+    )
+
+
+class ColumnStore:
+    """
+    Samples of a page in memory-mapped files with min/max summaries.
+
+    Files are prefix.f64 for samples and prefix_L<level>.f64 for summaries.
+
+    Attributes
+    ----------
+    prefix : str
+        Prefix of the files.
+    columns : int
+        Number of columns.
+    time_column : int
+        Column of time.
+    """
+
+    def __init__(self, prefix: str, columns: int, time_column: int = 1) -> None:
+        self.prefix: str = prefix
+        self.columns: int = columns
+        self.time_column: int = time_column
+        self._rows: List[int] = [0] * (SUMMARY_LEVELS + 1)
+        self._files = [
+            open(self._filename(level), mode="ab")
+            for level in range(-1, SUMMARY_LEVELS)
+        ]
+        # 次のタイルにまだ満たない行
+        self._tail: List[np.ndarray] = [np.empty((0, columns))] + [
+            np.empty((0, 2, columns)) for level in range(1, SUMMARY_LEVELS)
+        ]
+        self._maps: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._rows[0]
+
+    def _filename(self, level: int) -> str:
+        if level < 0:
+            return self.prefix + ".f64"
+        return f"{self.prefix}_L{level}.f64"
+
+    def _write(self, level: int, dat: np.ndarray) -> None:
+        if len(dat) > 0:
+            self._files[level + 1].write(np.ascontiguousarray(dat).tobytes())
+            self._rows[level + 1] += len(dat)
+
+    def append(self, dat: np.ndarray) -> None:
+        """
+        Append samples.
+
+        Parameters
+        ----------
+        dat : np.ndarray
+            Samples with shape (N, columns).
+
+        Returns
+        -------
+        None.
+        """
+        dat = np.asarray(dat, dtype=np.float64)
+        self._write(-1, dat)
+        for level in range(SUMMARY_LEVELS):
+            dat = np.concatenate([self._tail[level], dat])
+            tiles = summarize(dat)
+            self._tail[level] = dat[len(tiles) * SUMMARY_FACTOR :]
+            self._write(level, tiles)
+            if len(tiles) == 0:
+                break
+            dat = tiles
+
+    def flush(self) -> None:
+        """Flush files."""
+        for fobj in self._files:
+            fobj.flush()
+
+    def close(self) -> None:
+        """Close files."""
+        self._maps.clear()
+        for fobj in self._files:
+            fobj.close()
+
+    def samples(self) -> np.ndarray:
+        """Memory-mapped samples with shape (N, columns)."""
+        return self._map(-1)
+
+    def tiles(self, level: int) -> np.ndarray:
+        """Memory-mapped tiles of level with shape (N, 2, columns)."""
+        return self._map(level)
+
+    def _map(self, level: int) -> np.ndarray:
+        rows = self._rows[level + 1]
+        shape = (rows, self.columns) if level < 0 else (rows, 2, self.columns)
+        mapped = self._maps.get(level)
+        if mapped is None or len(mapped) != rows:
+            if rows == 0:
+                return np.empty(shape)
+            self._files[level + 1].flush()
+            mapped = np.memmap(
+                self._filename(level), dtype=np.float64, mode="r", shape=shape
+            )
+            self._maps[level] = mapped
+        return mapped
+
+    def view(
+        self, t0: float, t1: float, max_points: int = 4000
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples between t0 and t1 reduced to about max_points.
+
+        Parameters
+        ----------
+        t0 : float
+            Start time.
+        t1 : float
+            End time.
+        max_points : int, optional
+            Maximum number of points. The default is 4000.
+
+        Returns
+        -------
+        np.ndarray
+            Time of each point.
+        np.ndarray
+            Points with shape (M, columns). Tiles give two points, min and
+            max.
+        """
+        samples = self.samples()
+        if len(samples) == 0:
+            return np.empty(0), np.empty((0, self.columns))
+        # 時刻で二分探索するので、読み込むのはlog N個のページだけ
+        times = samples[:, self.time_column]
+        start = max(int(np.searchsorted(times, t0)) - 1, 0)
+        stop = min(int(np.searchsorted(times, t1, side="right")) + 1, len(samples))
+        # 点数がmax_points以下になる最も細かいレベルを選ぶ
+        level = -1
+        points = stop - start
+        while level + 1 < SUMMARY_LEVELS and points > max_points:
+            level += 1
+            points = 2 * (stop - start) // SUMMARY_FACTOR ** (level + 1)
+        pieces = self._view(start, stop, level)
+        return (
+            np.concatenate([piece[0] for piece in pieces]),
+            np.concatenate([piece[1] for piece in pieces]),
+        )
+
+    def _view(
+        self, start: int, stop: int, level: int
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if level < 0:
+            dat = np.array(self.samples()[start:stop])
+            return [(dat[:, self.time_column], dat)]
+        size = SUMMARY_FACTOR ** (level + 1)
+        tiles = self.tiles(level)
+        first = start // size
+        last = min(stop, len(tiles) * size) // size
+        if last <= first:
+            return self._view(start, stop, level - 1)
+        dat = np.array(tiles[first:last])
+        # タイルは最小、最大の2点として描画
+        x = dat[:, :, self.time_column].reshape(-1)
+        pieces = [(x, dat.reshape(-1, self.columns))]
+        if last * size < stop:
+            pieces += self._view(last * size, stop, level - 1)
+        return pieces
+
+
+class TelemetryHistory:
+    """
+    Disk-backed history of each device and page.
+
+    append can be used as a consumer of TelemetryEngine.GroundStationEngine.
+
+    Attributes
+    ----------
+    directory : str
+        Directory of the files.
+    time_columns : Dict[str, int]
+        Column of time of each page.
+    prefix : str
+        Prefix of the files of this session.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        time_columns: Optional[Dict[str, int]] = None,
+        prefix: str = "HPANavi",
+    ) -> None:
+        self.directory: str = directory
+        self.time_columns: Dict[str, int] = time_columns or {}
+        self.prefix: str = f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.stores: Dict[Tuple[int, str], ColumnStore] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, device: int, header: str, dat: np.ndarray) -> None:
+        """
+        Append decoded page.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+        header : str
+            Page header.
+        dat : np.ndarray
+            Decoded page with shape (rows, columns).
+
+        Returns
+        -------
+        None.
+        """
+        key = device, header
+        if key not in self.stores:
+            self.stores[key] = ColumnStore(
+                os.path.join(self.directory, f"{self.prefix}_{device}_{header}"),
+                dat.shape[1],
+                self.time_columns.get(header, 1),
+            )
+        self.stores[key].append(dat)
+
+    def view(
+        self, device: int, header: str, t0: float, t1: float, max_points: int = 4000
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples of device and page between t0 and t1, see ColumnStore.view.
+        """
+        if (device, header) not in self.stores:
+            return np.empty(0), np.empty((0, 0))
+        return self.stores[device, header].view(t0, t1, max_points)
+
+    def close(self) -> None:
+        """Close all files."""
+        for store in self.stores.values():
+            store.close()
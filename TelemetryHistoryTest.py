@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from TelemetryHistory import *
+from TelemetryTestData import make_samples
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ColumnStore(os.path.join(self.directory.name, "test"), 3)
+        self.dat = make_samples(300000, [np.sin])
+        for i in range(0, len(self.dat), 997):
+            self.store.append(self.dat[i : i + 997])
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_tiles(self):
+        np.testing.assert_array_equal(self.store.samples(), self.dat)
+        for level in range(SUMMARY_LEVELS):
+            size = SUMMARY_FACTOR ** (level + 1)
+            tiles = self.store.tiles(level)
+            self.assertEqual(len(tiles), len(self.dat) // size)
+            blocks = self.dat[: len(tiles) * size].reshape(len(tiles), size, 3)
+            np.testing.assert_array_equal(tiles[:, 0], blocks.min(axis=1))
+            np.testing.assert_array_equal(tiles[:, 1], blocks.max(axis=1))
+
+    def test_view(self):
+        # 狭い範囲はそのままのサンプル
+        x, y = self.store.view(100.0, 110.0, 4000)
+        np.testing.assert_array_equal(y, self.dat[9999:11002])
+        # 全体は要約で、最後まで途切れない
+        x, y = self.store.view(0.0, 3000.0, 4000)
+        self.assertLessEqual(len(x), 4000)
+        self.assertEqual(x[-1], self.dat[-1, 1])
+        self.assertTrue(np.all(np.diff(x) >= 0))
+        self.assertEqual(y[:, 2].min(), self.dat[:, 2].min())
+        self.assertEqual(y[:, 2].max(), self.dat[:, 2].max())
+
+
+class TestTelemetryHistory(unittest.TestCase):
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as directory:
+            history = TelemetryHistory(directory, {"V": 2})
+            history.append(0, "V", np.zeros((10, 4)))
+            history.append(1, "A", make_samples(10, [np.sin]))
+            self.assertEqual(history.stores[0, "V"].time_column, 2)
+            x, y = history.view(1, "A", 0.0, 1.0)
+            self.assertEqual(len(x), 10)
+            history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,340 @@
+"""
+Telemetry Metrics.
+
+Health metrics of live telemetry, i.e. frame rates, drops, CRC errors and
+latency.
+"""
+
+import csv
+import json
+import time
+import threading
+import collections
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import SylphideProcessor
+
+# Pages reported in fixed columns of csv log
+METRICS_PAGES = [chr(code) for code in range(ord("A"), ord("Z") + 1)]
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+class HealthMetrics:
+    """
+    Collect health metrics of live telemetry.
+
+    Rates are averaged over the latest window. Latency is measured from the
+    arrival of a frame to the update of the plot showing it.
+
+    Attributes
+    ----------
+    window : float
+        Period in second to average rates.
+    frames : np.ndarray
+        Total number of frames for each header byte.
+    bytes_total : int
+        Total number of received bytes.
+    unknown : collections.Counter
+        Number of frames of each unprocessed header.
+    resync_count : int
+        Number of resync events of the frame parser.
+    dropped_frames : int
+        Number of frames missing in the sequence numbers.
+    crc_errors : int
+        Number of frames whose CRC does not match. They are not discarded.
+    queue_depth : int
+        Number of bytes waiting to be processed.
+    connected : bool
+        The source is connected.
+    reconnects : int
+        Number of reconnections after errors of the source.
+    reconnect_latency : float
+        Period in second from the last error to the reconnection.
+    """
+
+    def __init__(self, window: float = 5.0, latency_size: int = 1000) -> None:
+        self.window: float = window
+        self.frames: np.ndarray = np.zeros(256, dtype=np.int64)
+        self.bytes_total: int = 0
+        self.unknown: collections.Counter = collections.Counter()
+        self.resync_count: int = 0
+        self.dropped_frames: int = 0
+        self.crc_errors: int = 0
+        self.queue_depth: int = 0
+        self.connected: bool = True
+        self.reconnects: int = 0
+        self.reconnect_latency: float = float("nan")
+        self._history: Deque[Tuple[float, np.ndarray, int]] = collections.deque()
+        self._latency: Deque[float] = collections.deque(maxlen=latency_size)
+        self._arrival: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_frames(
+        self, headers: np.ndarray, nbytes: int, arrival: Optional[float] = None
+    ) -> None:
+        """
+        Count received frames.
+
+        Parameters
+        ----------
+        headers : np.ndarray
+            Header bytes of the frames.
+        nbytes : int
+            Number of received bytes.
+        arrival : float, optional
+            time.monotonic() when the frames arrived. The default is now.
+
+        Returns
+        -------
+        None.
+        """
+        if arrival is None:
+            arrival = time.monotonic()
+        counts = np.bincount(headers, minlength=256)
+        with self._lock:
+            self.frames += counts
+            self.bytes_total += nbytes
+            self._history.append((arrival, counts, nbytes))
+            while arrival - self._history[0][0] > self.window:
+                self._history.popleft()
+            # 小文字などのヘッダも、描画されるページの名前で待つ
+            pages = np.unique(SylphideProcessor.DISPATCH[np.flatnonzero(counts)])
+            for code in pages[pages > 0].tolist():
+                self._arrival.setdefault(chr(code), arrival)
+
+    def add_unknown(self, header: str, count: int = 1) -> None:
+        """Count frames of unprocessed header."""
+        with self._lock:
+            self.unknown[header] += count
+
+    def drawn(self, header: str, now: Optional[float] = None) -> None:
+        """
+        Record latency when the frames of header are displayed.
+
+        Parameters
+        ----------
+        header : str
+            Header of the page.
+        now : float, optional
+            time.monotonic() of the display. The default is now.
+
+        Returns
+        -------
+        None.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            arrival = self._arrival.pop(header, None)
+            if arrival is not None:
+                self._latency.append(now - arrival)
+
+    def rates(self) -> Tuple[Dict[str, float], float]:
+        """
+        Calculate rates in the latest window.
+
+        Returns
+        -------
+        Dict[str, float]
+            Frames per second of each header.
+        float
+            Bytes per second.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while len(self._history) > 0 and now - self._history[0][0] > self.window:
+                self._history.popleft()
+            if len(self._history) == 0:
+                return {}, 0.0
+            span = max(now - self._history[0][0], 1.0e-3)
+            counts = np.sum([h[1] for h in self._history], axis=0)
+            nbytes = sum(h[2] for h in self._history)
+        fps = {chr(code): float(counts[code] / span) for code in np.flatnonzero(counts)}
+        return fps, nbytes / span
+
+    def latency(self) -> Dict[int, float]:
+        """
+        Calculate percentiles of latency.
+
+        Returns
+        -------
+        Dict[int, float]
+            Latency in second for each percentile in LATENCY_PERCENTILES.
+            NaN before any measurement.
+        """
+        with self._lock:
+            samples = np.array(self._latency)
+        if len(samples) == 0:
+            return {q: float("nan") for q in LATENCY_PERCENTILES}
+        values = np.percentile(samples, LATENCY_PERCENTILES)
+        return dict(zip(LATENCY_PERCENTILES, values.tolist()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarize current metrics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Metrics which can be serialized to JSON.
+        """
+        fps, bps = self.rates()
+        with self._lock:
+            unknown = dict(self.unknown)
+            frames_total = int(self.frames.sum())
+        return {
+            "time": time.time(),
+            "frames_total": frames_total,
+            "frames_per_sec": fps,
+            "bytes_per_sec": bps,
+            "unknown": unknown,
+            "resync_count": self.resync_count,
+            "dropped_frames": self.dropped_frames,
+            "crc_errors": self.crc_errors,
+            "queue_depth": self.queue_depth,
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "reconnect_latency": self.reconnect_latency,
+            "latency": self.latency(),
+        }
+
+    @staticmethod
+    def format(snapshot: Dict[str, Any]) -> str:
+        """
+        Format snapshot as text for display.
+
+        Parameters
+        ----------
+        snapshot : Dict[str, Any]
+            Output of snapshot.
+
+        Returns
+        -------
+        str
+            Multi-line text.
+        """
+        lines = [
+            f"Received   : {snapshot['frames_total']:,} frames, "
+            f"{snapshot['bytes_per_sec']:,.0f} byte/s",
+            f"Resync     : {snapshot['resync_count']}",
+            f"Dropped    : {snapshot['dropped_frames']:,} frames, "
+            f"{snapshot['crc_errors']:,} CRC errors",
+            f"Queue depth: {snapshot['queue_depth']:,} byte",
+            f"Connection : {'connected' if snapshot['connected'] else 'lost'}, "
+            f"{snapshot['reconnects']} reconnects"
+            + (
+                f", last {snapshot['reconnect_latency']:.2f} s"
+                if snapshot["reconnects"] > 0
+                else ""
+            ),
+            "Latency    : "
+            + ", ".join(
+                f"p{q} {value * 1e3:.1f} ms" for q, value in snapshot["latency"].items()
+            ),
+            "Page rates :",
+        ]
+        for header, fps in sorted(snapshot["frames_per_sec"].items()):
+            lines.append(f"  {header}: {fps:8.1f} frames/s")
+        if len(snapshot["unknown"]) > 0:
+            lines.append("Unprocessed:")
+            for header, count in sorted(snapshot["unknown"].items()):
+                lines.append(f"  {header!r}: {count:,} frames")
+        return "\n".join(lines)
+
+
+class MetricsLogger:
+    """
+    Append metrics snapshots to a log file.
+
+    The file is csv with fixed columns, or JSON lines if the file name ends
+    with .json or .jsonl.
+
+    Attributes
+    ----------
+    filename : str
+        Log file.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename: str = filename
+        self.json: bool = filename.lower().endswith((".json", ".jsonl"))
+
+    @staticmethod
+    def columns() -> List[str]:
+        """Columns of csv log."""
+        return (
+            [
+                "time",
+                "frames_total",
+                "bytes_per_sec",
+                "unknown_total",
+                "resync_count",
+                "dropped_frames",
+                "crc_errors",
+                "queue_depth",
+                "connected",
+                "reconnects",
+                "reconnect_latency",
+            ]
+            + [f"latency_p{q}" for q in LATENCY_PERCENTILES]
+            + [f"fps_{header}" for header in METRICS_PAGES]
+        )
+
+    @staticmethod
+    def flatten(snapshot: Dict[str, Any]) -> List[Any]:
+        """Arrange snapshot in the order of columns."""
+        fps = snapshot["frames_per_sec"]
+        return (
+            [
+                snapshot["time"],
+                snapshot["frames_total"],
+                snapshot["bytes_per_sec"],
+                sum(snapshot["unknown"].values()),
+                snapshot["resync_count"],
+                snapshot["dropped_frames"],
+                snapshot["crc_errors"],
+                snapshot["queue_depth"],
+                int(snapshot["connected"]),
+                snapshot["reconnects"],
+                snapshot["reconnect_latency"],
+            ]
+            + [snapshot["latency"][q] for q in LATENCY_PERCENTILES]
+            + [fps.get(header, 0.0) for header in METRICS_PAGES]
+        )
+
+    def write(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Append snapshot.
+
+        Parameters
+        ----------
+        snapshot : Dict[str, Any]
+            Output of HealthMetrics.snapshot.
+
+        Returns
+        -------
+        None.
+        """
+        with open(self.filename, mode="a", newline="") as f:
+            if self.json:
+                # NaNはJSONで表せないのでnullにする
+                snapshot = dict(
+                    snapshot,
+                    latency={
+                        q: None if np.isnan(value) else value
+                        for q, value in snapshot["latency"].items()
+                    },
+                    reconnect_latency=(
+                        None
+                        if np.isnan(snapshot["reconnect_latency"])
+                        else snapshot["reconnect_latency"]
+                    ),
+                )
+                f.write(json.dumps(snapshot) + "\n")
+                return
+            writer = csv.writer(f)
+            if f.tell() == 0:
+                writer.writerow(self.columns())
+            writer.writerow(self.flatten(snapshot))
@@ -0,0 +1,65 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+from TelemetryMetrics import *
+
+
+class TestHealthMetrics(unittest.TestCase):
+    def test_counts(self):
+        metrics = HealthMetrics()
+        metrics.add_frames(np.array([ord("A")] * 3 + [ord("H")], dtype=np.uint8), 152)
+        metrics.add_unknown("G", 2)
+        metrics.add_unknown("G", 3)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["frames_total"], 4)
+        self.assertEqual(snapshot["unknown"], {"G": 5})
+        self.assertEqual(set(snapshot["frames_per_sec"]), {"A", "H"})
+        metrics.dropped_frames = 7
+        metrics.crc_errors = 2
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["dropped_frames"], 7)
+        self.assertIn(
+            "Dropped    : 7 frames, 2 CRC errors", HealthMetrics.format(snapshot)
+        )
+
+    def test_latency(self):
+        metrics = HealthMetrics()
+        metrics.add_frames(np.array([ord("A")], dtype=np.uint8), 38, arrival=10.0)
+        metrics.drawn("A", now=10.5)
+        metrics.drawn("A", now=11.0)
+        self.assertAlmostEqual(metrics.latency()[50], 0.5)
+
+    def test_latency_lowercase(self):
+        # 小文字のヘッダのフレームもページAとして描画される
+        metrics = HealthMetrics()
+        headers = np.array([ord("a"), ord("b")], dtype=np.uint8)
+        metrics.add_frames(headers, 76, arrival=10.0)
+        metrics.drawn("A", now=10.25)
+        metrics.drawn("B", now=10.75)
+        self.assertAlmostEqual(metrics.latency()[50], 0.5)
+        self.assertEqual(metrics._arrival, {})
+
+
+class TestMetricsLogger(unittest.TestCase):
+    def test_write(self):
+        metrics = HealthMetrics()
+        metrics.add_frames(np.array([ord("A")], dtype=np.uint8), 38)
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ["metrics.csv", "metrics.jsonl"]:
+                logger = MetricsLogger(os.path.join(directory, name))
+                logger.write(metrics.snapshot())
+                logger.write(metrics.snapshot())
+                with open(logger.filename) as f:
+                    lines = f.read().splitlines()
+                if logger.json:
+                    self.assertEqual(len(lines), 2)
+                    self.assertIsNone(json.loads(lines[0])["latency"]["50"])
+                else:
+                    self.assertEqual(len(lines), 3)
+                    self.assertEqual(lines[0].split(","), MetricsLogger.columns())
+
+
+if __name__ == "__main__":
+    unittest.main()
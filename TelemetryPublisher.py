@@ -0,0 +1,381 @@
+"""
+Telemetry Publisher.
+
+Publish decoded pages of the ground station to other processes over local
+TCP/UDP sockets. TelemetryClient receives them.
+
+Message format
+[0-1]:   magic, "HN"
+[2]:     version
+[3]:     page header, ASCII
+[4-5]:   device number, uint16 little endian
+[6-7]:   number of columns, uint16 little endian
+[8-11]:  number of rows, uint32 little endian
+[12-]:   rows x columns float64 little endian, row major
+
+Columns are the same as the csv files of HPANaviConvertor.
+"""
+
+import queue
+import socket
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+MESSAGE_MAGIC = b"HN"
+MESSAGE_VERSION = 1
+MESSAGE_HEADER = struct.Struct("<2sBcHHI")
+MESSAGE_DTYPE = np.dtype("<f8")
+
+
+def pack_message(device: int, header: str, dat: np.ndarray) -> bytes:
+    """
+    Pack a batch of decoded page into a message.
+
+    Parameters
+    ----------
+    device : int
+        Device number.
+    header : str
+        Page header.
+    dat : np.ndarray
+        Decoded page with shape (rows, columns).
+
+    Returns
+    -------
+    bytes
+        Message.
+    """
+    dat = np.ascontiguousarray(dat, dtype=MESSAGE_DTYPE)
+    rows, columns = dat.shape
+    return (
+        MESSAGE_HEADER.pack(
+            MESSAGE_MAGIC, MESSAGE_VERSION, header.encode(), device, columns, rows
+        )
+        + dat.tobytes()
+    )
+
+
+def message_size(buf: bytes) -> int:
+    """
+    Size of the message starting at buf.
+
+    Parameters
+    ----------
+    buf : bytes
+        At least MESSAGE_HEADER.size bytes of the message.
+
+    Raises
+    ------
+    ValueError
+        If buf is not a message.
+
+    Returns
+    -------
+    int
+        Size of the message in byte.
+    """
+    magic, version, _, _, columns, rows = MESSAGE_HEADER.unpack_from(buf)
+    if magic != MESSAGE_MAGIC or version != MESSAGE_VERSION:
+        raise ValueError("Not a telemetry message")
+    return MESSAGE_HEADER.size + rows * columns * MESSAGE_DTYPE.itemsize
+
+
+def unpack_message(buf: bytes) -> Tuple[int, str, np.ndarray]:
+    """
+    Unpack a message.
+
+    Parameters
+    ----------
+    buf : bytes
+        Message.
+
+    Returns
+    -------
+    int
+        Device number.
+    str
+        Page header.
+    np.ndarray
+        Decoded page with shape (rows, columns).
+    """
+    size = message_size(buf)
+    _, _, header, device, columns, rows = MESSAGE_HEADER.unpack_from(buf)
+    if len(buf) < size:
+        raise ValueError("Truncated telemetry message")
+    dat = np.frombuffer(
+        buf, dtype=MESSAGE_DTYPE, count=rows * columns, offset=MESSAGE_HEADER.size
+    )
+    return device, header.decode(), dat.reshape(rows, columns)
+
+
+class Publisher:
+    """
+    Base class of publishers.
+
+    publish must never block, so that a slow subscriber does not stall
+    reception.
+
+    Attributes
+    ----------
+    dropped : int
+        Number of messages dropped because subscribers could not keep up.
+    """
+
+    def __init__(self) -> None:
+        self.dropped: int = 0
+
+    def start(self) -> None:
+        """Start publishing."""
+
+    def stop(self) -> None:
+        """Stop publishing."""
+
+    def publish(self, device: int, header: str, dat: np.ndarray) -> None:
+        """
+        Publish a batch of decoded page.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+        header : str
+            Page header.
+        dat : np.ndarray
+            Decoded page with shape (rows, columns).
+
+        Returns
+        -------
+        None.
+        """
+        raise NotImplementedError
+
+
+class _Subscriber:
+    """TCP subscriber with bounded queue and its own sender thread."""
+
+    def __init__(self, conn: socket.socket, queue_size: int) -> None:
+        self.conn: socket.socket = conn
+        self.dropped: int = 0
+        self.closed: bool = False
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def offer(self, message: bytes) -> int:
+        # 溢れたら古いメッセージを捨てて新しいものを優先
+        dropped = 0
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                break
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    pass
+        self.dropped += dropped
+        return dropped
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+    def _run(self) -> None:
+        while not self.closed:
+            message = self._queue.get()
+            if message is None:
+                break
+            try:
+                self.conn.sendall(message)
+            except OSError:
+                break
+        self.closed = True
+
+
+class TcpPublisher(Publisher):
+    """
+    Publish messages to TCP subscribers.
+
+    Each subscriber has a bounded queue. When a subscriber can not keep up,
+    its oldest messages are dropped.
+
+    Attributes
+    ----------
+    host : str
+        Address to listen.
+    port : int
+        Port to listen. 0 selects a free port, which is set after start.
+    queue_size : int
+        Maximum number of messages waiting for each subscriber.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, queue_size: int = 256
+    ) -> None:
+        super().__init__()
+        self.host: str = host
+        self.port: int = port
+        self.queue_size: int = queue_size
+        self._server: Optional[socket.socket] = None
+        self._subscribers: List[_Subscriber] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def subscribers(self) -> int:
+        """Number of connected subscribers."""
+        with self._lock:
+            return sum(not s.closed for s in self._subscribers)
+
+    def start(self) -> None:
+        """Listen and accept subscribers in background."""
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(
+            target=self._accept, args=(self._server,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Close all connections."""
+        if self._server is not None:
+            # shutdownで待機中のacceptを抜ける
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.close()
+            self._subscribers.clear()
+
+    def publish(self, device: int, header: str, dat: np.ndarray) -> None:
+        message = pack_message(device, header, dat)
+        with self._lock:
+            for subscriber in self._subscribers:
+                self.dropped += subscriber.offer(message)
+            # 切断された購読者を除く
+            for subscriber in [s for s in self._subscribers if s.closed]:
+                subscriber.close()
+                self._subscribers.remove(subscriber)
+
+    def _accept(self, server: socket.socket) -> None:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._subscribers.append(_Subscriber(conn, self.queue_size))
+
+
+class UdpPublisher(Publisher):
+    """
+    Publish messages as UDP datagrams.
+
+    Batches larger than max_datagram are split by rows. Datagrams which the
+    socket can not take immediately are dropped.
+
+    Attributes
+    ----------
+    destinations : List[Tuple[str, int]]
+        Addresses and ports of subscribers, broadcast address is allowed.
+    max_datagram : int
+        Maximum size of a datagram in byte.
+    """
+
+    def __init__(
+        self, destinations: List[Tuple[str, int]], max_datagram: int = 8192
+    ) -> None:
+        super().__init__()
+        self.destinations: List[Tuple[str, int]] = destinations
+        self.max_datagram: int = max_datagram
+        self._socket: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        """Open socket."""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self._socket.setblocking(False)
+
+    def stop(self) -> None:
+        """Close socket."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def publish(self, device: int, header: str, dat: np.ndarray) -> None:
+        if self._socket is None or len(dat) == 0:
+            return
+        row_size = dat.shape[1] * MESSAGE_DTYPE.itemsize
+        rows = max((self.max_datagram - MESSAGE_HEADER.size) // row_size, 1)
+        for start in range(0, len(dat), rows):
+            message = pack_message(device, header, dat[start : start + rows])
+            for destination in self.destinations:
+                try:
+                    self._socket.sendto(message, destination)
+                except OSError:
+                    self.dropped += 1
+
+
+def parse_address(address: str) -> Tuple[str, str, int]:
+    """
+    Parse address like tcp://127.0.0.1:50000 or udp://255.255.255.255:50001.
+
+    Parameters
+    ----------
+    address : str
+        Address. Protocol defaults to tcp and host to 127.0.0.1.
+
+    Returns
+    -------
+    str
+        Protocol, tcp or udp.
+    str
+        Host.
+    int
+        Port.
+    """
+    protocol, _, rest = address.rpartition("://")
+    host, _, port = rest.rpartition(":")
+    return protocol.lower() or "tcp", host or "127.0.0.1", int(port)
+
+
+def create_publisher(address: str) -> Publisher:
+    """
+    Create publisher of address.
+
+    Parameters
+    ----------
+    address : str
+        See parse_address.
+
+    Returns
+    -------
+    Publisher
+        TcpPublisher listening on address or UdpPublisher sending to address.
+    """
+    protocol, host, port = parse_address(address)
+    if protocol == "udp":
+        return UdpPublisher([(host, port)])
+    if protocol == "tcp":
+        return TcpPublisher(host, port)
+    raise ValueError(f"Unknown protocol: {protocol}")
@@ -0,0 +1,73 @@
+import time
+import unittest
+import numpy as np
+from TelemetryPublisher import *
+from TelemetryClient import TelemetryClient
+
+
+class TestMessage(unittest.TestCase):
+    def test_pack(self):
+        dat = np.arange(12, dtype=float).reshape(3, 4)
+        message = pack_message(2, "H", dat)
+        self.assertEqual(message_size(message), len(message))
+        device, header, out = unpack_message(message)
+        self.assertEqual((device, header), (2, "H"))
+        np.testing.assert_array_equal(out, dat)
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("udp://0.0.0.0:5000"), ("udp", "0.0.0.0", 5000))
+        self.assertEqual(parse_address("5000"), ("tcp", "127.0.0.1", 5000))
+
+
+class TestTcpPublisher(unittest.TestCase):
+    def setUp(self):
+        self.publisher = TcpPublisher(queue_size=4)
+        self.publisher.start()
+
+    def tearDown(self):
+        self.publisher.stop()
+
+    def connect(self):
+        client = TelemetryClient(f"tcp://127.0.0.1:{self.publisher.port}", 5.0)
+        while self.publisher.subscribers == 0:
+            time.sleep(0.01)
+        return client
+
+    def test_subscribers(self):
+        clients = [self.connect() for i in range(2)]
+        while self.publisher.subscribers < 2:
+            time.sleep(0.01)
+        dat = np.random.default_rng(0).random((100, 5))
+        self.publisher.publish(1, "A", dat[:50])
+        self.publisher.publish(1, "A", dat[50:])
+        for client in clients:
+            np.testing.assert_array_equal(client.collect(2)[1, "A"], dat)
+            client.close()
+
+    def test_backpressure(self):
+        client = self.connect()
+        dat = np.zeros((10000, 10))
+        start = time.perf_counter()
+        for i in range(200):
+            self.publisher.publish(0, "A", dat)
+        # 読まない購読者がいても配信は止まらない
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertGreater(self.publisher.dropped, 0)
+        client.close()
+
+
+class TestUdpPublisher(unittest.TestCase):
+    def test_split(self):
+        client = TelemetryClient("udp://127.0.0.1:0", 5.0)
+        port = client._socket.getsockname()[1]
+        publisher = UdpPublisher([("127.0.0.1", port)], max_datagram=1000)
+        publisher.start()
+        dat = np.arange(300, dtype=float).reshape(100, 3)
+        publisher.publish(0, "M", dat)
+        publisher.stop()
+        np.testing.assert_array_equal(client.collect(3)[0, "M"], dat)
+        client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Telemetry Recorder.
+
+Save received pages into Sylphide format .dat files in background.
+"""
+
+import os
+import time
+import queue
+import threading
+from typing import Any, Optional
+
+import numpy as np
+
+
+class RawRecorder:
+    """
+    Append received pages to .dat files on a dedicated thread.
+
+    Pages are written as they are, i.e. 32 byte records which
+    HPANaviConvertor can read. write only enqueues the data, so the caller
+    never waits for the disk.
+
+    Attributes
+    ----------
+    directory : str
+        Directory where log files are created.
+    prefix : str
+        Prefix of log file names.
+    rotation_period : float
+        Period in second to switch to a new file. 0 disables rotation.
+    buffer_size : int
+        Size of write buffer in byte.
+    flush_period : float
+        Maximum period in second that data stays in the buffer.
+    filename : str
+        Name of the file currently written.
+    """
+
+    def __init__(
+        self,
+        directory: str = ".",
+        prefix: str = "HPANavi",
+        rotation_period: float = 3600.0,
+        buffer_size: int = 1 << 20,
+        flush_period: float = 1.0,
+    ) -> None:
+        self.directory: str = directory
+        self.prefix: str = prefix
+        self.rotation_period: float = rotation_period
+        self.buffer_size: int = buffer_size
+        self.flush_period: float = flush_period
+        self.filename: str = ""
+        self.bytes_written: int = 0
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start writer thread."""
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Write remaining data, close file and stop writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def write(self, dat: Any) -> None:
+        """
+        Enqueue pages to be recorded.
+
+        Parameters
+        ----------
+        dat : bytes or np.ndarray
+            Concatenated pages or uint8 array with shape (N, 32).
+
+        Returns
+        -------
+        None.
+        """
+        if isinstance(dat, np.ndarray):
+            dat = dat.tobytes()
+        if len(dat) > 0:
+            self._queue.put(bytes(dat))
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        self.filename = os.path.join(self.directory, f"{self.prefix}_{stamp}.dat")
+        suffix = 1
+        while os.path.exists(self.filename):
+            self.filename = os.path.join(
+                self.directory, f"{self.prefix}_{stamp}_{suffix}.dat"
+            )
+            suffix += 1
+        return open(self.filename, mode="ab", buffering=self.buffer_size)
+
+    def _run(self) -> None:
+        fobj = None
+        opened = 0.0
+        flushed = time.monotonic()
+        try:
+            while True:
+                try:
+                    dat = self._queue.get(timeout=self.flush_period)
+                except queue.Empty:
+                    dat = b""
+                if dat is None:
+                    break
+                now = time.monotonic()
+                if len(dat) > 0:
+                    if fobj is not None and 0 < self.rotation_period <= now - opened:
+                        fobj.close()
+                        fobj = None
+                    if fobj is None:
+                        fobj = self._open()
+                        opened = now
+                    fobj.write(dat)
+                    self.bytes_written += len(dat)
+                if fobj is not None and now - flushed >= self.flush_period:
+                    fobj.flush()
+                    flushed = now
+        finally:
+            if fobj is not None:
+                fobj.close()
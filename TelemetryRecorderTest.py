@@ -0,0 +1,36 @@
+import os
+import glob
+import time
+import tempfile
+import unittest
+import numpy as np
+from TelemetryRecorder import *
+
+
+class TestRawRecorder(unittest.TestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = RawRecorder(directory)
+            recorder.start()
+            records = np.arange(64, dtype=np.uint8).reshape(2, 32)
+            recorder.write(records)
+            recorder.write(b"A" * 32)
+            recorder.stop()
+            with open(recorder.filename, "rb") as f:
+                self.assertEqual(f.read(), records.tobytes() + b"A" * 32)
+            self.assertEqual(recorder.bytes_written, 96)
+
+    def test_rotation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = RawRecorder(directory, rotation_period=0.01)
+            recorder.start()
+            for _ in range(3):
+                recorder.write(b"A" * 32)
+                time.sleep(0.05)
+            recorder.stop()
+            files = glob.glob(os.path.join(directory, "*.dat"))
+            self.assertEqual(len(files), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,745 @@
+"""
+Telemetry Source.
+
+Sources of Sylphide protocol frames for the ground station, i.e. serial port
+of HPA_Navi or replay of a recorded .dat file, and the frame parser.
+
+Frame format
+[0-1]:   header, 0xF7 0xE0
+[2-3]:   sequence number, uint16 little endian
+[4-35]:  page
+[36-37]: CRC16-CCITT of [2-35], uint16 little endian
+
+The sequence number and CRC are not confirmed with frames of a real device,
+so they are only counted in the health metrics and never discard a frame.
+"""
+
+import os
+import time
+import queue
+import argparse
+import threading
+import contextlib
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import Compression
+import SylphideProcessor
+
+FRAME_SIZE = 38
+FRAME_HEADER = b"\xf7\xe0"
+PAGE_SIZE = 32
+# Bytes of compressed logs decompressed at once in replay
+REPLAY_BLOCK_SIZE = PAGE_SIZE << 17
+
+# USB VID:PID of HPA_Navi
+DEVICE_IDS = ["VID:PID=04B4:F232", "VID:PID=0483:5740"]
+
+# Pages which have GNSS time
+TIMED_PAGES = {
+    header: page_class
+    for header, page_class in SylphideProcessor.PAGES.items()
+    if page_class.time_offset is not None
+}
+
+
+def _crc16_table() -> np.ndarray:
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table[i] = crc
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(dat: np.ndarray) -> np.ndarray:
+    """
+    Calculate CRC16-CCITT of every row.
+
+    Parameters
+    ----------
+    dat : np.ndarray
+        uint8 array with shape (N, M).
+
+    Returns
+    -------
+    np.ndarray
+        CRC of each row, uint16 array with shape (N,).
+    """
+    crc = np.zeros(len(dat), dtype=np.uint16)
+    for i in range(dat.shape[1]):
+        crc = (crc << 8) ^ _CRC16_TABLE[(crc >> 8) ^ dat[:, i]]
+    return crc
+
+
+def pack_frames(pages: np.ndarray, sequence: int = 0) -> bytes:
+    """
+    Pack pages into frames.
+
+    Parameters
+    ----------
+    pages : np.ndarray
+        uint8 array with shape (N, 32).
+    sequence : int, optional
+        Sequence number of the first frame. The default is 0.
+
+    Returns
+    -------
+    bytes
+        Concatenated frames.
+    """
+    frames = np.empty((len(pages), FRAME_SIZE), dtype=np.uint8)
+    frames[:, 0:2] = np.frombuffer(FRAME_HEADER, dtype=np.uint8)
+    seq = (np.arange(len(pages)) + sequence).astype("<u2")
+    frames[:, 2:4] = seq.view(np.uint8).reshape(-1, 2)
+    frames[:, 4:36] = pages
+    frames[:, 36:38] = (
+        crc16(frames[:, 2:36]).astype("<u2").view(np.uint8).reshape(-1, 2)
+    )
+    return frames.tobytes()
+
+
+def page_time(pages: np.ndarray) -> np.ndarray:
+    """
+    Extract GNSS time of pages.
+
+    Parameters
+    ----------
+    pages : np.ndarray
+        uint8 array with shape (N, 32).
+
+    Returns
+    -------
+    np.ndarray
+        GNSS time in millisecond. NaN for pages without time.
+    """
+    out = np.full(len(pages), np.nan)
+    headers = SylphideProcessor.DISPATCH[pages[:, 0]]
+    for header, page_class in TIMED_PAGES.items():
+        mask = headers == ord(header)
+        if np.any(mask):
+            out[mask] = SylphideProcessor.unpack_records(
+                "<1I", pages[mask], page_class.time_offset
+            )[:, 0]
+    return out
+
+
+class FrameParser:
+    """
+    Extract pages from received byte stream.
+
+    Bytes are kept until a whole frame arrives. When a frame does not begin
+    with the header, the parser skips to the next header (resync). Frames
+    whose CRC does not match and gaps of the sequence number are counted,
+    but every frame is kept.
+
+    Attributes
+    ----------
+    resync_count : int
+        Number of resync events.
+    skipped_bytes : int
+        Number of bytes discarded by resync.
+    crc_errors : int
+        Number of frames whose CRC does not match.
+    dropped_frames : int
+        Number of frames missing in the sequence numbers.
+    """
+
+    def __init__(self) -> None:
+        self.resync_count: int = 0
+        self.skipped_bytes: int = 0
+        self.crc_errors: int = 0
+        self.dropped_frames: int = 0
+        self._buffer = bytearray()
+        self._sequence: Optional[int] = None
+
+    def reset(self) -> None:
+        """Discard incomplete frame, e.g. on reconnection."""
+        self._buffer = bytearray()
+        # 再接続の前後の番号の飛びは数えない
+        self._sequence = None
+
+    def _check(self, frames: np.ndarray) -> np.ndarray:
+        # CRCの不一致と連番の飛びを数える、CRCの仕様が違っても受信を止めない
+        stored = frames[:, 36].astype(np.uint16) | (
+            frames[:, 37].astype(np.uint16) << 8
+        )
+        self.crc_errors += int(np.count_nonzero(crc16(frames[:, 2:36]) != stored))
+        sequence = frames[:, 2].astype(np.int64) | (frames[:, 3].astype(np.int64) << 8)
+        if len(sequence) > 0:
+            if self._sequence is not None:
+                sequence = np.concatenate(([self._sequence], sequence))
+            step = np.diff(sequence) % 0x10000
+            self.dropped_frames += int(np.sum(step[step > 0] - 1))
+            self._sequence = int(sequence[-1])
+        return frames[:, 4:36]
+
+    def feed(self, dat: bytes) -> np.ndarray:
+        """
+        Parse received bytes.
+
+        Parameters
+        ----------
+        dat : bytes
+            Received bytes.
+
+        Returns
+        -------
+        np.ndarray
+            Pages of complete frames, uint8 array with shape (N, 32).
+        """
+        self._buffer += dat
+        buf = np.frombuffer(self._buffer, dtype=np.uint8)
+        frames = None
+        out: List[np.ndarray] = []
+        pos = 0
+        while len(buf) - pos >= FRAME_SIZE:
+            num = (len(buf) - pos) // FRAME_SIZE
+            frames = buf[pos : pos + num * FRAME_SIZE].reshape(num, FRAME_SIZE)
+            valid = (frames[:, 0] == FRAME_HEADER[0]) & (
+                frames[:, 1] == FRAME_HEADER[1]
+            )
+            num_valid = num if np.all(valid) else int(np.argmin(valid))
+            out.append(self._check(frames[:num_valid]))
+            pos += num_valid * FRAME_SIZE
+            if num_valid < num:
+                self.resync_count += 1
+                found = self._buffer.find(FRAME_HEADER, pos + 1)
+                if found < 0:
+                    # 最後の1バイトはヘッダの先頭かもしれない
+                    found = len(buf) - 1
+                self.skipped_bytes += found - pos
+                pos = found
+        pages = (
+            np.concatenate(out)
+            if len(out) > 0
+            else np.empty((0, PAGE_SIZE), dtype=np.uint8)
+        )
+        # バッファを縮める前にビューを解放
+        buf = frames = out = None
+        del self._buffer[:pos]
+        return pages
+
+
+class DataSource:
+    """
+    Abstract source of Sylphide protocol frames.
+
+    Attributes
+    ----------
+    name : str
+        Name to identify the source.
+    """
+
+    def __init__(self) -> None:
+        self.name: str = ""
+
+    def open(self) -> None:
+        """Open the source."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def close(self) -> None:
+        """Close the source."""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def read(self) -> bytes:
+        """
+        Read bytes received since the last call without blocking.
+
+        Returns
+        -------
+        bytes
+            Received bytes, which may end in the middle of a frame.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    @property
+    def pending(self) -> int:
+        """Number of bytes which have arrived but are not read yet."""
+        return 0
+
+
+class SerialSource(DataSource):
+    """
+    Read frames from the serial port of HPA_Navi.
+
+    Attributes
+    ----------
+    port : str
+        Name of serial port.
+    baudrate : int
+        Baudrate of serial port.
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600) -> None:
+        super().__init__()
+        self.name = port
+        self.port: str = port
+        self.baudrate: int = baudrate
+        self.serial = None
+
+    @staticmethod
+    def find_ports(verbose: bool = True) -> List[str]:
+        """
+        Search serial ports of HPA_Navi.
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Print all serial ports. The default is True.
+
+        Returns
+        -------
+        List[str]
+            Names of serial ports.
+        """
+        import serial.tools.list_ports
+
+        devices = []
+        for info in serial.tools.list_ports.comports():
+            if verbose:
+                print(info)
+            if any(info[2].find(device_id) > 0 for device_id in DEVICE_IDS):
+                devices.append(info[0])
+        return devices
+
+    def open(self) -> None:
+        import serial
+
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0.1)
+        self.serial.reset_input_buffer()
+
+    def close(self) -> None:
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+
+    def read(self) -> bytes:
+        num = self.serial.in_waiting
+        if num == 0:
+            return b""
+        return self.serial.read(num)
+
+    @property
+    def pending(self) -> int:
+        return self.serial.in_waiting if self.serial is not None else 0
+
+
+class ReplaySource(DataSource):
+    """
+    Replay a recorded .dat file as frames.
+
+    Frames are released following the GNSS time of the pages. Gaps of the
+    time longer than max_gap and backward steps are ignored.
+
+    The .dat file is memory-mapped. Compressed files, e.g. LOG.dat.gz, and
+    members of zip archives, ARCHIVE.zip/MEMBER, are decompressed block by
+    block while replayed, so that only one block is kept in memory.
+
+    Attributes
+    ----------
+    filename : str
+        Recorded .dat file, e.g. LOG.dat, LOG.dat.gz or ARCHIVE.zip/MEMBER.
+    speed : float
+        Replay speed relative to real time. 0 releases frames as fast as
+        possible.
+    max_gap : float
+        Longest time gap in second to be reproduced.
+    max_frames : int
+        Maximum number of frames released by a read.
+    pages : np.ndarray
+        Pages of the current block, or of the whole mapped file.
+    schedule : np.ndarray
+        Release time of each page of pages in second of replay.
+    position : int
+        Number of released frames.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        speed: float = 1.0,
+        max_gap: float = 1.0,
+        max_frames: int = 100000,
+    ) -> None:
+        super().__init__()
+        self.name = filename
+        self.filename: str = filename
+        self.speed: float = speed
+        self.max_gap: float = max_gap
+        self.max_frames: int = max_frames
+        self.pages = np.empty((0, PAGE_SIZE), dtype=np.uint8)
+        self.schedule = np.empty(0)
+        self.position: int = 0
+        self._start: float = 0.0
+        # 圧縮されたファイルのブロック、pagesの先頭の番号、前のブロックの最後の時刻
+        self._blocks: Optional[Iterator[bytes]] = None
+        self._stack = contextlib.ExitStack()
+        self._offset: int = 0
+        self._last_time: float = np.nan
+
+    @property
+    def finished(self) -> bool:
+        """True when all frames are released."""
+        return self._blocks is None and self.position >= self._offset + len(self.pages)
+
+    def open(self) -> None:
+        self.close()
+        if Compression.mappable(self.filename):
+            num = os.path.getsize(self.filename) // PAGE_SIZE
+            # 空のファイルはmmapできない
+            if num > 0:
+                self._load(
+                    np.memmap(
+                        self.filename, dtype=np.uint8, mode="r", shape=(num, PAGE_SIZE)
+                    )
+                )
+        else:
+            fobj = self._stack.enter_context(Compression.open_input(self.filename))
+            self._blocks = Compression.read_blocks(
+                fobj, record_size=PAGE_SIZE, block_size=REPLAY_BLOCK_SIZE
+            )
+            self._next_block()
+        self._start = time.monotonic()
+
+    def close(self) -> None:
+        self._stack.close()
+        self._blocks = None
+        self.pages = np.empty((0, PAGE_SIZE), dtype=np.uint8)
+        self.schedule = np.empty(0)
+        self.position = 0
+        self._offset = 0
+        self._last_time = np.nan
+
+    def _load(self, pages: np.ndarray) -> None:
+        # 前のブロックから続けて、ページの時刻の差で放出する時刻を決める
+        times = page_time(pages)
+        elapsed = np.diff(times, prepend=self._last_time) / 1.0e3
+        elapsed = np.nan_to_num(elapsed, nan=0.0)
+        elapsed[(elapsed < 0) | (elapsed > self.max_gap)] = 0.0
+        base = self.schedule[-1] if len(self.schedule) > 0 else 0.0
+        self._offset += len(self.pages)
+        self.pages = pages
+        self.schedule = base + np.cumsum(elapsed)
+        self._last_time = times[-1]
+
+    def _next_block(self) -> None:
+        block = next(self._blocks, None)
+        if block is None:
+            self._stack.close()
+            self._blocks = None
+            return
+        self._load(np.frombuffer(block, dtype=np.uint8).reshape(-1, PAGE_SIZE))
+
+    def read(self) -> bytes:
+        start = self.position - self._offset
+        if self.speed > 0:
+            now = (time.monotonic() - self._start) * self.speed
+            end = int(np.searchsorted(self.schedule, now, side="right"))
+        else:
+            end = len(self.pages)
+        end = min(end, start + self.max_frames)
+        if end <= start:
+            return b""
+        frames = pack_frames(self.pages[start:end], self._offset + start)
+        self.position = self._offset + end
+        # ブロックを放出し終えたら次のブロックを展開する
+        if self._blocks is not None and end == len(self.pages):
+            self._next_block()
+        return frames
+
+    @property
+    def pending(self) -> int:
+        # 圧縮されたファイルは読み込んだブロックの分だけ
+        start = self.position - self._offset
+        if self.speed <= 0:
+            return (len(self.pages) - start) * FRAME_SIZE
+        now = (time.monotonic() - self._start) * self.speed
+        end = int(np.searchsorted(self.schedule, now, side="right"))
+        return max(end - start, 0) * FRAME_SIZE
+
+
+class SourceReader:
+    """
+    Open and read a source and parse frames on a dedicated thread.
+
+    Each source has its own reader, so that a slow or stalled device never
+    blocks the others. When the source can not be opened or fails while
+    reading, e.g. USB cable is unplugged, the reader retries to open it with
+    exponential backoff.
+
+    Attributes
+    ----------
+    source : DataSource
+        Source of frames.
+    parser : FrameParser
+        Parser of the source.
+    period : float
+        Polling period of the source in second.
+    reconnect : bool
+        Retry to open the source after errors. Otherwise the reader stops.
+    min_backoff : float
+        First interval of retries in second.
+    max_backoff : float
+        Maximum interval of retries in second.
+    connected : bool
+        The source is opened.
+    error : Exception or None
+        Last exception of the source.
+    reconnects : int
+        Number of reconnections after errors.
+    reconnect_latency : float
+        Period in second from the last error to the reconnection.
+    """
+
+    def __init__(
+        self,
+        source: DataSource,
+        period: float = 0.001,
+        reconnect: bool = True,
+        min_backoff: float = 0.1,
+        max_backoff: float = 5.0,
+    ) -> None:
+        self.source: DataSource = source
+        self.parser: FrameParser = FrameParser()
+        self.period: float = period
+        self.reconnect: bool = reconnect
+        self.min_backoff: float = min_backoff
+        self.max_backoff: float = max_backoff
+        self.connected: bool = False
+        self.error: Optional[Exception] = None
+        self.reconnects: int = 0
+        self.reconnect_latency: float = float("nan")
+        self.pending: int = 0
+        self._disconnected: Optional[float] = None
+        self._queued_bytes: int = 0
+        self._queue: "queue.Queue[Tuple[float, np.ndarray, int]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def backlog(self) -> int:
+        """Number of received bytes not yet taken by drain."""
+        with self._lock:
+            return self.pending + self._queued_bytes
+
+    @property
+    def running(self) -> bool:
+        """Reader thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start reader thread, which opens the source."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop reader thread and close the source."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def drain(self) -> List[Tuple[float, np.ndarray, int]]:
+        """
+        Take batches parsed since the last call.
+
+        Returns
+        -------
+        List[Tuple[float, np.ndarray, int]]
+            Arrival time (time.monotonic()), pages with shape (N, 32) and
+            number of received bytes of each batch.
+        """
+        batches = []
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            self._queued_bytes -= sum(batch[2] for batch in batches)
+        return batches
+
+    def _open(self) -> bool:
+        try:
+            self.source.open()
+        except Exception as e:
+            if str(e) != str(self.error):
+                print(f"Can't open {self.source.name}: {e}")
+            self.error = e
+            return False
+        print(self.source.name + " opened")
+        self.connected = True
+        self.parser.reset()
+        if self._disconnected is not None:
+            self.reconnects += 1
+            self.reconnect_latency = time.monotonic() - self._disconnected
+        return True
+
+    def _close(self, error: Exception) -> None:
+        print(f"{self.source.name}: {error}")
+        self.error = error
+        self.connected = False
+        self.pending = 0
+        self._disconnected = time.monotonic()
+        try:
+            self.source.close()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            if not self.connected:
+                if not self._open():
+                    if not self.reconnect:
+                        break
+                    # 接続できるまで間隔を倍々に延ばして再試行
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = self.min_backoff
+            try:
+                received = self.source.read()
+                pending = self.source.pending
+            except Exception as e:
+                self._close(e)
+                if not self.reconnect:
+                    break
+                continue
+            if len(received) == 0:
+                self.pending = pending
+                self._stop.wait(self.period)
+                continue
+            arrival = time.monotonic()
+            pages = self.parser.feed(received)
+            with self._lock:
+                self.pending = pending
+                self._queued_bytes += len(received)
+            self._queue.put((arrival, pages, len(received)))
+        if self.connected:
+            self.source.close()
+            self.connected = False
+
+
+class PtyReplay:
+    """
+    Write replayed frames into a pseudo-terminal (POSIX only).
+
+    The ground station or any serial terminal can open port as if it were
+    HPA_Navi.
+
+    Attributes
+    ----------
+    source : DataSource
+        Source of frames.
+    port : str
+        Name of the slave side of the pseudo-terminal.
+    period : float
+        Polling period of the source in second.
+    """
+
+    def __init__(self, source: DataSource, period: float = 0.001) -> None:
+        self.source: DataSource = source
+        self.period: float = period
+        self.port: str = ""
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Open pseudo-terminal and start writing frames."""
+        import tty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.source.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop writing frames and close pseudo-terminal."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.close()
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def _run(self) -> None:
+        while self._running:
+            dat = self.source.read()
+            if len(dat) > 0:
+                os.write(self._master, dat)
+            else:
+                time.sleep(self.period)
+
+
+def benchmark(source: DataSource) -> None:
+    """
+    Measure throughput of parsing and decoding.
+
+    Parameters
+    ----------
+    source : DataSource
+        Source of frames.
+
+    Returns
+    -------
+    None.
+    """
+    pages = {header: page_class() for header, page_class in TIMED_PAGES.items()}
+    parser = FrameParser()
+    num_frames = 0
+    source.open()
+    start = time.perf_counter()
+    while not getattr(source, "finished", False):
+        records = parser.feed(source.read())
+        num_frames += len(records)
+        for header, dat in SylphideProcessor.group_records(records):
+            if header in pages:
+                dat = pages[header].unpack_array(dat)
+                pages[header].raw2phys_array(dat)
+    elapsed = time.perf_counter() - start
+    source.close()
+    print(
+        f"{num_frames:,} frames in {elapsed:.3f} s, "
+        f"{num_frames / max(elapsed, 1e-9):,.0f} frames/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay HPA_Navi log file.")
+    parser.add_argument("filename", help="recorded .dat file")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay speed, 0: as fast as possible"
+    )
+    parser.add_argument(
+        "--pty", action="store_true", help="serve frames through a pseudo-terminal"
+    )
+    args = parser.parse_args()
+    if args.pty:
+        replay = PtyReplay(ReplaySource(args.filename, args.speed))
+        replay.start()
+        print(f"Replaying {args.filename} on {replay.port}")
+        try:
+            while not replay.source.finished:
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        replay.stop()
+    else:
+        benchmark(ReplaySource(args.filename, speed=0))
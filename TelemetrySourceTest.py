@@ -0,0 +1,190 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+from TelemetrySource import *
+from TelemetryTestData import make_pages
+
+
+class TestFrameParser(unittest.TestCase):
+    def test_split(self):
+        pages = make_pages()
+        frames = pack_frames(pages)
+        parser = FrameParser()
+        out = [parser.feed(frames[i : i + 7]) for i in range(0, len(frames), 7)]
+        np.testing.assert_array_equal(np.concatenate(out), pages)
+        self.assertEqual(parser.resync_count, 0)
+
+    def test_resync(self):
+        pages = make_pages()
+        frames = pack_frames(pages)
+        parser = FrameParser()
+        out = parser.feed(b"\x00\xf7" + frames[:76] + b"\x01" + frames[76:])
+        np.testing.assert_array_equal(out, pages)
+        self.assertEqual(parser.resync_count, 2)
+        self.assertEqual(parser.skipped_bytes, 3)
+
+    def test_dropped(self):
+        pages = make_pages()
+        frames = bytearray(pack_frames(pages, sequence=0xFFF0))
+        # 2番目のフレームを壊し、5番目から7番目は失われる
+        frames[38 + 10] ^= 0xFF
+        frames = frames[: 38 * 4] + frames[38 * 7 :]
+        parser = FrameParser()
+        out = parser.feed(bytes(frames))
+        # CRCの合わないフレームも捨てない
+        expected = np.delete(pages, [4, 5, 6], axis=0)
+        expected[1, 6] ^= 0xFF
+        np.testing.assert_array_equal(out, expected)
+        self.assertEqual(parser.crc_errors, 1)
+        # 番号は65535から0に戻る
+        self.assertEqual(parser.dropped_frames, 3)
+        self.assertEqual(parser.resync_count, 0)
+        # 再接続の後は番号が続かなくても数えない
+        parser.reset()
+        parser.feed(pack_frames(pages[:2], sequence=100))
+        self.assertEqual(parser.dropped_frames, 3)
+
+    def test_unknown_crc(self):
+        # CRCの仕様が違っても受信は止まらない
+        pages = make_pages()
+        frames = np.frombuffer(pack_frames(pages), dtype=np.uint8).reshape(-1, 38)
+        frames = frames.copy()
+        frames[:, 36:38] = 0
+        parser = FrameParser()
+        np.testing.assert_array_equal(parser.feed(frames.tobytes()), pages)
+        self.assertEqual(parser.crc_errors, len(pages))
+
+    def test_crc16(self):
+        dat = np.frombuffer(b"123456789", dtype=np.uint8).reshape(1, -1)
+        self.assertEqual(crc16(dat)[0], 0x31C3)
+
+
+class TestReplaySource(unittest.TestCase):
+    def test_page_time(self):
+        pages = make_pages()
+        pages[0, 0] = ord("G")
+        result = page_time(pages)
+        self.assertTrue(np.isnan(result[0]))
+        np.testing.assert_array_equal(result[1:], np.arange(1, 20) * 10)
+
+    def test_read(self):
+        pages = make_pages()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.dat")
+            pages.tofile(filename)
+            with open(filename, "rb") as f:
+                Compression.write(filename + ".xz", f.read())
+            for name in [filename, filename + ".xz"]:
+                source = ReplaySource(name, speed=0)
+                source.open()
+                out = FrameParser().feed(source.read())
+                self.assertTrue(source.finished)
+                source.close()
+                np.testing.assert_array_equal(out, pages)
+
+    def test_blocks(self):
+        # 圧縮されたファイルはブロックごとに展開し、同じ時刻に放出する
+        pages = make_pages(50)
+        pages[7, 0] = ord("G")
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.dat")
+            pages.tofile(filename)
+            with open(filename, "rb") as f:
+                Compression.write(filename + ".gz", f.read())
+            mapped = ReplaySource(filename, speed=0)
+            mapped.open()
+            with patch("TelemetrySource.REPLAY_BLOCK_SIZE", PAGE_SIZE * 8):
+                source = ReplaySource(filename + ".gz", speed=0)
+                source.open()
+                out, schedule = [], []
+                while not source.finished:
+                    self.assertLessEqual(len(source.pages), 8)
+                    schedule.append(source.schedule)
+                    out.append(FrameParser().feed(source.read()))
+                source.close()
+        self.assertEqual(len(out), 7)
+        np.testing.assert_array_equal(np.concatenate(out), pages)
+        np.testing.assert_allclose(np.concatenate(schedule), mapped.schedule)
+        mapped.close()
+
+    def test_empty(self):
+        # 空のファイルや1ページに満たないファイルはすぐに終わる
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.dat")
+            for size in (0, PAGE_SIZE - 1):
+                with open(filename, "wb") as f:
+                    f.write(bytes(size))
+                source = ReplaySource(filename, speed=0)
+                source.open()
+                self.assertEqual(source.read(), b"")
+                self.assertTrue(source.finished)
+                source.close()
+
+
+class TestSourceReader(unittest.TestCase):
+    def test_drain(self):
+        pages = make_pages()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.dat")
+            pages.tofile(filename)
+            reader = SourceReader(ReplaySource(filename, speed=0))
+            reader.start()
+            while not (reader.connected and reader.source.finished):
+                time.sleep(0.01)
+            reader.stop()
+        batches = reader.drain()
+        np.testing.assert_array_equal(
+            np.concatenate([batch[1] for batch in batches]), pages
+        )
+        self.assertEqual(sum(batch[2] for batch in batches), len(pages) * FRAME_SIZE)
+        self.assertEqual(reader.backlog, 0)
+        self.assertIsNone(reader.error)
+
+    def test_reconnect(self):
+        frames = pack_frames(make_pages())
+        source = UnpluggedSource([frames[:100], OSError("unplugged"), frames[100:]])
+        reader = SourceReader(source, min_backoff=0.01)
+        reader.start()
+        while len(source.chunks) > 0:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        reader.stop()
+        pages = np.concatenate([batch[1] for batch in reader.drain()])
+        # 途中で切れたフレームは捨てて、再接続後に同期し直す
+        np.testing.assert_array_equal(pages, np.delete(make_pages(), 2, axis=0))
+        self.assertEqual(source.opened, 3)
+        self.assertEqual(reader.reconnects, 1)
+        self.assertGreaterEqual(reader.reconnect_latency, 0.01)
+
+
+class UnpluggedSource(DataSource):
+    """Source which fails once while reading and at the first reopen."""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.name = "unplugged"
+        self.chunks = chunks
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        if self.opened == 2:
+            raise OSError("not found")
+
+    def close(self):
+        pass
+
+    def read(self):
+        if len(self.chunks) == 0:
+            return b""
+        chunk = self.chunks.pop(0)
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Telemetry Spectrum.
+
+Live spectrum and spectrogram of vibration, e.g. accelerometer and gyroscope
+of page A. Samples are buffered as they arrive, and process computes FFT only
+of the overlapping windows completed since the last call within a time
+budget, so that the spectrum does not delay the reception.
+"""
+
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class SpectrumAnalyzer:
+    """
+    Incremental power spectral density of columns with overlapping windows.
+
+    Attributes
+    ----------
+    columns : List[int]
+        Columns of the decoded page to analyze.
+    nfft : int
+        Number of samples of a FFT window.
+    hop : int
+        Number of samples between the starts of windows.
+    history : int
+        Number of windows kept for the spectrogram.
+    average : int
+        Number of latest windows averaged for the spectrum.
+    max_backlog : int
+        Maximum number of windows waiting for process. Older samples are
+        skipped when process can not keep up.
+    time_column : int
+        Column of time.
+    sample_rate : float
+        Sample rate in Hz estimated from time. NaN until two samples arrive.
+    count : int
+        Number of windows computed.
+    skipped : int
+        Number of samples skipped.
+    """
+
+    def __init__(
+        self,
+        columns: List[int],
+        nfft: int = 256,
+        overlap: float = 0.5,
+        history: int = 256,
+        average: int = 8,
+        max_backlog: int = 64,
+        time_column: int = 1,
+    ) -> None:
+        self.columns: List[int] = columns
+        self.nfft: int = nfft
+        self.hop: int = max(int(nfft * (1.0 - overlap)), 1)
+        self.history: int = history
+        self.average: int = average
+        self.max_backlog: int = max_backlog
+        self.time_column: int = time_column
+        self.sample_rate: float = np.nan
+        self.count: int = 0
+        self.skipped: int = 0
+        self._window = np.hanning(nfft)
+        self._limit = nfft + self.hop * (max_backlog - 1)
+        # 未処理のサンプル、[_start:_end]が有効
+        self._buffer = np.empty((2 * self._limit, len(columns)))
+        self._start = 0
+        self._end = 0
+        self._last_time = np.nan
+        self._spectrogram = np.full((history, nfft // 2 + 1, len(columns)), np.nan)
+
+    @property
+    def pending(self) -> int:
+        """Number of windows waiting for process."""
+        samples = self._end - self._start
+        if samples < self.nfft:
+            return 0
+        return (samples - self.nfft) // self.hop + 1
+
+    def append(self, dat: np.ndarray) -> None:
+        """
+        Buffer samples of decoded page.
+
+        Parameters
+        ----------
+        dat : np.ndarray
+            Decoded page with shape (rows, columns).
+
+        Returns
+        -------
+        None.
+        """
+        if len(dat) == 0:
+            return
+        t = np.concatenate([[self._last_time], dat[:, self.time_column]])
+        dt = np.diff(t)
+        dt = dt[dt > 0]
+        if len(dt) > 0:
+            self.sample_rate = 1.0 / float(np.median(dt))
+        self._last_time = t[-1]
+
+        samples = dat[-self._limit :, self.columns]
+        self.skipped += len(dat) - len(samples)
+        if self._end + len(samples) > len(self._buffer):
+            size = self._end - self._start
+            self._buffer[:size] = self._buffer[self._start : self._end]
+            self._start, self._end = 0, size
+        self._buffer[self._end : self._end + len(samples)] = samples
+        self._end += len(samples)
+        # 処理が追いつかないときは古い窓を飛ばして最新のスペクトルを表示
+        excess = self._end - self._start - self._limit
+        if excess > 0:
+            excess = -(-excess // self.hop) * self.hop
+            self._start += excess
+            self.skipped += excess
+
+    def process(self, budget: float = 0.005, chunk: int = 16) -> int:
+        """
+        Compute FFT of windows completed since the last call.
+
+        Parameters
+        ----------
+        budget : float, optional
+            Time budget in second. Windows left are computed in the next call.
+            The default is 0.005.
+        chunk : int, optional
+            Number of windows computed at once. The default is 16.
+
+        Returns
+        -------
+        int
+            Number of windows computed.
+        """
+        start = time.perf_counter()
+        rate = self.sample_rate if np.isfinite(self.sample_rate) else 1.0
+        # 片側パワースペクトル密度
+        scale = 2.0 / (rate * np.sum(self._window**2))
+        computed = 0
+        while self.pending > 0:
+            k = min(self.pending, chunk)
+            stop = self._start + self.nfft + self.hop * (k - 1)
+            # (k, columns, nfft) のビュー、コピーしない
+            frames = np.lib.stride_tricks.sliding_window_view(
+                self._buffer[self._start : stop], self.nfft, axis=0
+            )[:: self.hop]
+            frames = frames - frames.mean(axis=-1, keepdims=True)
+            psd = np.abs(np.fft.rfft(frames * self._window, axis=-1)) ** 2 * scale
+            rows = (self.count + np.arange(k)) % self.history
+            self._spectrogram[rows] = psd.transpose(0, 2, 1)
+            self.count += k
+            self._start += self.hop * k
+            computed += k
+            if time.perf_counter() - start > budget:
+                break
+        return computed
+
+    def frequencies(self) -> np.ndarray:
+        """Frequencies of spectrum in Hz."""
+        rate = self.sample_rate if np.isfinite(self.sample_rate) else 1.0
+        return np.fft.rfftfreq(self.nfft, 1.0 / rate)
+
+    def spectrum(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Spectrum averaged over the latest windows.
+
+        Returns
+        -------
+        np.ndarray
+            Frequencies in Hz.
+        np.ndarray
+            Power spectral density with shape (frequencies, columns). NaN
+            before the first window.
+        """
+        latest = self.count - 1 - np.arange(min(self.average, self.count))
+        rows = latest % self.history
+        if len(rows) == 0:
+            return self.frequencies(), self._spectrogram[0]
+        return self.frequencies(), self._spectrogram[rows].mean(axis=0)
+
+    def spectrogram(self, columns: Optional[List[int]] = None) -> np.ndarray:
+        """
+        Spectrogram from the oldest to the latest window.
+
+        Parameters
+        ----------
+        columns : List[int], optional
+            Indices of columns summed. The default is all.
+
+        Returns
+        -------
+        np.ndarray
+            Power spectral density with shape (history, frequencies). NaN
+            for windows not computed yet.
+        """
+        if columns is None:
+            columns = list(range(len(self.columns)))
+        return np.roll(
+            self._spectrogram[:, :, columns].sum(axis=-1), -self.count, axis=0
+        )
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+from TelemetrySpectrum import *
+from TelemetryTestData import make_samples
+
+
+class TestSpectrumAnalyzer(unittest.TestCase):
+    def setUp(self):
+        # 100 Hzで20 Hzと5 Hzの正弦波
+        self.dat = make_samples(
+            2000,
+            [
+                lambda t: np.sin(2 * np.pi * 20.0 * t),
+                lambda t: np.sin(2 * np.pi * 5.0 * t),
+            ],
+        )
+
+    def test_peak(self):
+        analyzer = SpectrumAnalyzer([2, 3], nfft=128, overlap=0.5)
+        dat = self.dat[:1000]
+        for i in range(0, len(dat), 37):
+            analyzer.append(dat[i : i + 37])
+        self.assertAlmostEqual(analyzer.sample_rate, 100.0, places=6)
+        self.assertEqual(analyzer.pending, (1000 - 128) // 64 + 1)
+        self.assertEqual(analyzer.process(budget=1.0), 14)
+        self.assertEqual(analyzer.pending, 0)
+        freq, psd = analyzer.spectrum()
+        self.assertAlmostEqual(freq[np.argmax(psd[:, 0])], 20.0, delta=100.0 / 128)
+        self.assertAlmostEqual(freq[np.argmax(psd[:, 1])], 5.0, delta=100.0 / 128)
+        # パワーの合計は正弦波の分散 1/2
+        self.assertAlmostEqual(np.sum(psd[:, 0]) * (freq[1] - freq[0]), 0.5, 2)
+
+    def test_incremental(self):
+        # 少しずつ処理しても、まとめて処理しても同じ結果
+        dat = self.dat
+        whole = SpectrumAnalyzer([2, 3], nfft=128, history=32)
+        whole.append(dat)
+        whole.process(budget=1.0)
+        step = SpectrumAnalyzer([2, 3], nfft=128, history=32)
+        for i in range(0, len(dat), 50):
+            step.append(dat[i : i + 50])
+            step.process(budget=1.0, chunk=1)
+        self.assertEqual(step.count, whole.count)
+        np.testing.assert_allclose(step.spectrogram(), whole.spectrogram())
+        self.assertEqual(step.spectrogram().shape, (32, 65))
+
+    def test_budget(self):
+        analyzer = SpectrumAnalyzer([2], nfft=64, max_backlog=8)
+        analyzer.append(self.dat[:1000])
+        # 処理しきれない古いサンプルは飛ばす
+        self.assertEqual(analyzer.pending, 8)
+        self.assertEqual(analyzer.skipped, 1000 - (64 + 32 * 7))
+        self.assertEqual(analyzer.process(budget=0.0, chunk=3), 3)
+        self.assertEqual(analyzer.pending, 5)
+        self.assertTrue(np.all(np.isnan(analyzer.spectrogram()[:-3])))
+
+
+if __name__ == "__main__":
+    unittest.main()
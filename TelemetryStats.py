@@ -0,0 +1,390 @@
+"""
+Telemetry Stats.
+
+Rolling statistics and alarms of decoded pages. The window is divided into
+buckets, so that each sample updates only its bucket, i.e. constant time per
+sample, and statistics combine a fixed number of buckets.
+
+Alarms are defined in [ALARM] of config.ini.
+"""
+
+import time
+import collections
+import configparser
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class RollingStats:
+    """
+    Rolling count, mean, standard deviation, min and max of each column.
+
+    The window ends at the latest sample, and its start moves in steps of
+    window / buckets.
+
+    Attributes
+    ----------
+    columns : int
+        Number of columns.
+    window : float
+        Length of window in second.
+    buckets : int
+        Number of buckets in window.
+    """
+
+    def __init__(self, columns: int, window: float = 10.0, buckets: int = 50) -> None:
+        self.columns: int = columns
+        self.window: float = window
+        self.buckets: int = buckets
+        self._width: float = window / buckets
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all samples."""
+        self.latest: Optional[int] = None
+        self._id = np.full(self.buckets, np.iinfo(np.int64).min, dtype=np.int64)
+        self._count = np.zeros((self.buckets, self.columns))
+        self._sum = np.zeros((self.buckets, self.columns))
+        self._sumsq = np.zeros((self.buckets, self.columns))
+        self._min = np.full((self.buckets, self.columns), np.inf)
+        self._max = np.full((self.buckets, self.columns), -np.inf)
+
+    def update(self, t: np.ndarray, dat: np.ndarray) -> None:
+        """
+        Add samples.
+
+        When the time of all samples is before the window, e.g. the time goes
+        back after a reboot of the device, the statistics start over.
+
+        Parameters
+        ----------
+        t : np.ndarray
+            Time of samples in second.
+        dat : np.ndarray
+            Samples with shape (N, columns). NaN and inf are ignored.
+
+        Returns
+        -------
+        None.
+        """
+        valid = np.isfinite(t)
+        ids = np.floor(t[valid] / self._width).astype(np.int64)
+        if len(ids) == 0:
+            return
+        latest = int(ids.max())
+        if self.latest is not None and latest <= self.latest - self.buckets:
+            # 再起動や再生のやり直しで時刻が窓より前に戻ったら、やり直す
+            self.reset()
+        if self.latest is not None:
+            latest = max(latest, self.latest)
+        # 窓から外れた古いサンプルは捨てる
+        keep = ids > latest - self.buckets
+        ids = ids[keep]
+        dat = dat[valid][keep]
+        finite = np.isfinite(dat)
+        values = np.where(finite, dat, 0.0)
+
+        # 再利用するバケットを初期化
+        slots = ids % self.buckets
+        stale = np.unique(slots[self._id[slots] != ids])
+        self._id[slots] = ids
+        self._count[stale] = 0.0
+        self._sum[stale] = 0.0
+        self._sumsq[stale] = 0.0
+        self._min[stale] = np.inf
+        self._max[stale] = -np.inf
+
+        np.add.at(self._count, slots, finite)
+        np.add.at(self._sum, slots, values)
+        np.add.at(self._sumsq, slots, values * values)
+        np.minimum.at(self._min, slots, np.where(finite, dat, np.inf))
+        np.maximum.at(self._max, slots, np.where(finite, dat, -np.inf))
+        self.latest = latest
+
+    def result(self) -> Dict[str, np.ndarray]:
+        """
+        Statistics of window.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            count, mean, std, min and max of each column. NaN if no sample.
+        """
+        if self.latest is None:
+            valid = np.zeros(self.buckets, dtype=bool)
+        else:
+            valid = self._id > self.latest - self.buckets
+        count = self._count[valid].sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._sum[valid].sum(axis=0) / count
+            var = self._sumsq[valid].sum(axis=0) / count - mean * mean
+        empty = count == 0
+        return {
+            "count": count,
+            "mean": mean,
+            "std": np.sqrt(np.maximum(var, 0.0)),
+            "min": np.where(
+                empty, np.nan, self._min[valid].min(axis=0, initial=np.inf)
+            ),
+            "max": np.where(
+                empty, np.nan, self._max[valid].max(axis=0, initial=-np.inf)
+            ),
+        }
+
+
+class Alarm:
+    """
+    Threshold and rate of change alarm of a column.
+
+    Attributes
+    ----------
+    name : str
+        Name of alarm.
+    header : str
+        Page header.
+    column : int
+        Column of the csv file of the page.
+    low : float or None
+        Alarm when a sample is lower than low.
+    high : float or None
+        Alarm when a sample is higher than high.
+    rate : float or None
+        Alarm when the rate of change per second exceeds rate.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        header: str,
+        column: int,
+        low: Optional[float] = None,
+        high: Optional[float] = None,
+        rate: Optional[float] = None,
+    ) -> None:
+        self.name: str = name
+        self.header: str = header
+        self.column: int = column
+        self.low: Optional[float] = low
+        self.high: Optional[float] = high
+        self.rate: Optional[float] = rate
+
+    def check(
+        self, t: np.ndarray, values: np.ndarray, last: Optional[Tuple[float, float]]
+    ) -> bool:
+        """
+        Check samples of a batch.
+
+        Parameters
+        ----------
+        t : np.ndarray
+            Time of samples in second.
+        values : np.ndarray
+            Samples of column.
+        last : Tuple[float, float] or None
+            Time and value of the last sample of the previous batch.
+
+        Returns
+        -------
+        bool
+            Any sample violates the limits.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            active = False
+            if self.low is not None:
+                active |= bool(np.any(values < self.low))
+            if self.high is not None:
+                active |= bool(np.any(values > self.high))
+            if self.rate is not None:
+                if last is not None:
+                    t = np.concatenate([[last[0]], t])
+                    values = np.concatenate([[last[1]], values])
+                dt = np.diff(t)
+                rate = np.abs(np.diff(values)[dt > 0] / dt[dt > 0])
+                active |= bool(np.any(rate > self.rate))
+        return active
+
+
+def load_alarms(config: configparser.ConfigParser) -> List[Alarm]:
+    """
+    Read alarms from [ALARM] section.
+
+    Each option is name = page, column, low, high, rate. Empty limit is not
+    checked.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        Configuration.
+
+    Returns
+    -------
+    List[Alarm]
+        Alarms.
+    """
+    alarms = []
+    if not config.has_section("ALARM"):
+        return alarms
+    for name, value in config["ALARM"].items():
+        fields = [field.strip() for field in value.split(",")]
+        fields += [""] * (5 - len(fields))
+        limits = [float(field) if len(field) > 0 else None for field in fields[2:5]]
+        alarms.append(Alarm(name, fields[0].upper(), int(fields[1]), *limits))
+    return alarms
+
+
+class StatsMonitor:
+    """
+    Rolling statistics and alarms of each device and page.
+
+    update can be used as a consumer of TelemetryEngine.GroundStationEngine.
+
+    Attributes
+    ----------
+    windows : List[float]
+        Lengths of windows in second.
+    alarms : List[Alarm]
+        Alarms checked for every device. Alarms of a column which the page
+        does not have are removed with an error message when the page is
+        received first.
+    time_columns : Dict[str, int]
+        Column of time of each page.
+    active : Dict[Tuple[int, str], bool]
+        State of each device and alarm name.
+    events : collections.deque
+        Changes of alarms not taken yet, (time.time(), device, name, active,
+        value).
+    """
+
+    def __init__(
+        self,
+        windows: Optional[List[float]] = None,
+        alarms: Optional[List[Alarm]] = None,
+        time_columns: Optional[Dict[str, int]] = None,
+        buckets: int = 50,
+    ) -> None:
+        self.windows: List[float] = windows or [10.0]
+        self.alarms: List[Alarm] = alarms or []
+        self.time_columns: Dict[str, int] = time_columns or {}
+        self.buckets: int = buckets
+        self.stats: Dict[Tuple[int, str], List[RollingStats]] = {}
+        self.active: Dict[Tuple[int, str], bool] = {}
+        self.events: Deque[Tuple[float, int, str, bool, float]] = collections.deque(
+            maxlen=1000
+        )
+        self._last: Dict[Tuple[int, str], Tuple[float, float]] = {}
+
+    def update(self, device: int, header: str, dat: np.ndarray) -> None:
+        """
+        Update statistics and check alarms with decoded page.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+        header : str
+            Page header.
+        dat : np.ndarray
+            Decoded page with shape (rows, columns).
+
+        Returns
+        -------
+        None.
+        """
+        if len(dat) == 0:
+            return
+        key = device, header
+        if key not in self.stats:
+            self.stats[key] = [
+                RollingStats(dat.shape[1], window, self.buckets)
+                for window in self.windows
+            ]
+            self._check_columns(header, dat.shape[1])
+        t = dat[:, self.time_columns.get(header, 1)]
+        for stats in self.stats[key]:
+            stats.update(t, dat)
+        for alarm in self.alarms:
+            if alarm.header != header:
+                continue
+            values = dat[:, alarm.column]
+            active = alarm.check(t, values, self._last.get((device, alarm.name)))
+            self._last[device, alarm.name] = (t[-1], values[-1])
+            if active != self.active.get((device, alarm.name), False):
+                self.events.append(
+                    (time.time(), device, alarm.name, active, float(values[-1]))
+                )
+            self.active[device, alarm.name] = active
+
+    def _check_columns(self, header: str, columns: int) -> None:
+        # 列がページにない警報は、処理を止めないよう無効にする
+        invalid = [
+            alarm
+            for alarm in self.alarms
+            if alarm.header == header and not 0 <= alarm.column < columns
+        ]
+        for alarm in invalid:
+            print(
+                f"Alarm {alarm.name} disabled: page {header} has no column "
+                f"{alarm.column} (0 to {columns - 1})"
+            )
+            self.alarms.remove(alarm)
+
+    def result(
+        self, device: int, header: str, window: int = 0
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Statistics of device and page, see RollingStats.result.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+        header : str
+            Page header.
+        window : int, optional
+            Index of windows. The default is 0.
+
+        Returns
+        -------
+        Dict[str, np.ndarray] or None
+            None if the page is not received yet.
+        """
+        if (device, header) not in self.stats:
+            return None
+        return self.stats[device, header][window].result()
+
+    def take_events(self) -> List[Tuple[float, int, str, bool, float]]:
+        """Take changes of alarms since the last call."""
+        events = []
+        while len(self.events) > 0:
+            events.append(self.events.popleft())
+        return events
+
+    def format(self, device: int) -> str:
+        """
+        Format alarms of device as text for display.
+
+        Parameters
+        ----------
+        device : int
+            Device number.
+
+        Returns
+        -------
+        str
+            Lines of each alarm with its statistics of each window.
+        """
+        lines = []
+        for alarm in self.alarms:
+            state = "ALARM" if self.active.get((device, alarm.name), False) else "ok"
+            for window, length in enumerate(self.windows):
+                stats = self.result(device, alarm.header, window)
+                if stats is None:
+                    break
+                c = alarm.column
+                lines.append(
+                    f"{alarm.name[:11]:11s}: {state:5s} {length:g} s mean "
+                    f"{stats['mean'][c]:.4g} std {stats['std'][c]:.3g} "
+                    f"min {stats['min'][c]:.4g} max {stats['max'][c]:.4g}"
+                )
+        return "\n".join(lines)
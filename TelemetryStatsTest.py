@@ -0,0 +1,107 @@
+import io
+import unittest
+import contextlib
+import configparser
+import numpy as np
+from TelemetryStats import *
+from TelemetryTestData import make_samples
+
+SIGNALS = [np.sin, lambda t: np.cos(3 * t)]
+
+
+class TestRollingStats(unittest.TestCase):
+    def setUp(self):
+        self.dat = make_samples(5000, SIGNALS)
+
+    def test_result(self):
+        dat = self.dat
+        stats = RollingStats(4, window=10.0, buckets=50)
+        for i in range(0, len(dat), 123):
+            stats.update(dat[i : i + 123, 1], dat[i : i + 123])
+        # 窓は最新のバケット (49.8 s から) までの50バケット、すなわち40 s以降
+        expected = dat[4000:]
+        result = stats.result()
+        np.testing.assert_array_equal(result["count"], len(expected))
+        np.testing.assert_allclose(result["mean"], expected.mean(axis=0), atol=1e-9)
+        np.testing.assert_allclose(result["std"], expected.std(axis=0), atol=1e-6)
+        np.testing.assert_array_equal(result["min"], expected.min(axis=0))
+        np.testing.assert_array_equal(result["max"], expected.max(axis=0))
+
+    def test_nan(self):
+        stats = RollingStats(2)
+        self.assertTrue(np.all(np.isnan(stats.result()["mean"])))
+        t = np.arange(4.0)
+        stats.update(t, np.array([[0, 1], [1, np.nan], [2, 3], [np.nan, 5]]))
+        result = stats.result()
+        np.testing.assert_array_equal(result["count"], [3, 3])
+        np.testing.assert_array_equal(result["mean"], [1, 3])
+        np.testing.assert_array_equal(result["min"], [0, 1])
+
+    def test_gap(self):
+        # 窓より長い欠落の後は古いバケットを使わない
+        stats = RollingStats(1, window=1.0, buckets=10)
+        stats.update(np.arange(10) * 0.1, np.full((10, 1), 100.0))
+        stats.update(np.array([5.0]), np.array([[1.0]]))
+        result = stats.result()
+        np.testing.assert_array_equal(result["count"], [1])
+        np.testing.assert_array_equal(result["max"], [1])
+
+    def test_backward(self):
+        # 再起動で時刻が0に戻った後も更新を続ける
+        stats = RollingStats(1, window=1.0, buckets=10)
+        stats.update(np.arange(100, 110) * 0.1, np.full((10, 1), 100.0))
+        stats.update(np.arange(5) * 0.1, np.full((5, 1), 1.0))
+        result = stats.result()
+        np.testing.assert_array_equal(result["count"], [5])
+        np.testing.assert_array_equal(result["mean"], [1])
+        stats.update(np.array([0.5]), np.array([[7.0]]))
+        np.testing.assert_array_equal(stats.result()["max"], [7])
+
+
+class TestStatsMonitor(unittest.TestCase):
+    def setUp(self):
+        self.dat = make_samples(501, SIGNALS)
+
+    def test_alarm(self):
+        config = configparser.ConfigParser()
+        config.read_string("[ALARM]\nlow = h, 2, -0.5, ,\nrate = H, 3, , , 10\n")
+        alarms = load_alarms(config)
+        self.assertEqual(alarms[0].header, "H")
+        self.assertEqual((alarms[0].low, alarms[0].high), (-0.5, None))
+        self.assertEqual(alarms[1].rate, 10.0)
+
+        monitor = StatsMonitor([1.0, 10.0], alarms)
+        dat = self.dat
+        monitor.update(0, "H", dat[:300])
+        self.assertEqual(monitor.active, {(0, "low"): False, (0, "rate"): False})
+        self.assertEqual(monitor.take_events(), [])
+        # sin(t) < -0.5 は t > 3.67
+        monitor.update(0, "H", dat[300:500])
+        self.assertTrue(monitor.active[0, "low"])
+        # 前のバッチの最後のサンプルからの変化率も確認
+        step = dat[500:].copy()
+        step[:, 3] += 1.0
+        monitor.update(0, "H", step)
+        self.assertTrue(monitor.active[0, "rate"])
+        events = monitor.take_events()
+        self.assertEqual(
+            [event[2:4] for event in events], [("low", True), ("rate", True)]
+        )
+        self.assertEqual(len(monitor.format(0).splitlines()), 4)
+        self.assertEqual(monitor.result(0, "H", 1)["count"][0], 501)
+        self.assertIsNone(monitor.result(1, "H"))
+
+    def test_invalid_column(self):
+        config = configparser.ConfigParser()
+        config.read_string("[ALARM]\ntypo = H, 40, 0, ,\nlow = H, 2, -0.5, ,\n")
+        monitor = StatsMonitor([1.0], load_alarms(config))
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            monitor.update(0, "H", self.dat[:400])
+        self.assertIn("typo disabled", out.getvalue())
+        self.assertEqual([alarm.name for alarm in monitor.alarms], ["low"])
+        self.assertTrue(monitor.active[0, "low"])
+        self.assertEqual(monitor.result(0, "H")["count"][0], 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
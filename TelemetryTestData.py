@@ -0,0 +1,60 @@
+"""
+Telemetry Test Data.
+
+Pages and decoded samples shared by the tests of the ground station, e.g.
+TelemetryEngineTest and TelemetrySourceTest.
+"""
+
+from typing import Callable, List
+
+import numpy as np
+
+import TelemetrySource
+
+
+def make_pages(n: int = 20, header: str = "H", seed: int = 0) -> np.ndarray:
+    """
+    Random pages with GNSS time.
+
+    Parameters
+    ----------
+    n : int, optional
+        Number of pages. The default is 20.
+    header : str, optional
+        Header of the pages. The default is "H".
+    seed : int, optional
+        Seed of the random bytes. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array with shape (n, 32). GNSS time at [4-7] is 0, 10, 20, ...
+        millisecond.
+    """
+    rng = np.random.default_rng(seed)
+    pages = rng.integers(0, 256, size=(n, TelemetrySource.PAGE_SIZE), dtype=np.uint8)
+    pages[:, 0] = ord(header)
+    pages[:, 4:8] = (np.arange(n, dtype="<u4") * 10).view(np.uint8).reshape(n, 4)
+    return pages
+
+
+def make_samples(n: int, signals: List[Callable], rate: float = 100.0) -> np.ndarray:
+    """
+    Decoded samples of signals.
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+    signals : List[Callable]
+        Functions of time in second, e.g. np.sin, one for each column.
+    rate : float, optional
+        Sampling rate in Hz. The default is 100.0.
+
+    Returns
+    -------
+    np.ndarray
+        Columns of device 0, time in second and the signals.
+    """
+    t = np.arange(n) / rate
+    return np.stack([np.zeros(n), t] + [signal(t) for signal in signals], axis=1)
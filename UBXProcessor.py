@@ -0,0 +1,324 @@
+"""
+UBX Processor.
+
+Extract the UBX stream of u-blox receivers from G pages, index the messages
+and decode NAV-PVT and NAV-POSLLH into columns, so that the GNSS solution can
+be analyzed without u-center.
+
+Usage
+-----
+python UBXProcessor.py LOG.dat|LOG.ubx
+"""
+
+import os
+import argparse
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from SylphideProcessor import as_records, write_csv
+
+SYNC = b"\xb5\x62"
+# Sync chars, class, id and length before payload, checksum after payload
+HEADER_SIZE = 6
+CHECKSUM_SIZE = 2
+
+# Index of messages
+INDEX_DTYPE = np.dtype(
+    [
+        ("cls", "u1"),
+        ("id", "u1"),
+        ("offset", "i8"),
+        ("length", "u2"),
+        ("valid", "?"),
+    ]
+)
+
+# Payload of messages: (name, [(field, type, offset, scaling), ...])
+MESSAGES: Dict[Tuple[int, int], Tuple[str, list]] = {
+    (0x01, 0x02): (
+        "NAV-POSLLH",
+        [
+            ("iTOW (s)", "<u4", 0, 1e-3),
+            ("lon (deg.)", "<i4", 4, 1e-7),
+            ("lat (deg.)", "<i4", 8, 1e-7),
+            ("height (m)", "<i4", 12, 1e-3),
+            ("hMSL (m)", "<i4", 16, 1e-3),
+            ("hAcc (m)", "<u4", 20, 1e-3),
+            ("vAcc (m)", "<u4", 24, 1e-3),
+        ],
+    ),
+    (0x01, 0x07): (
+        "NAV-PVT",
+        [
+            ("iTOW (s)", "<u4", 0, 1e-3),
+            ("year", "<u2", 4, None),
+            ("month", "u1", 6, None),
+            ("day", "u1", 7, None),
+            ("hour", "u1", 8, None),
+            ("min", "u1", 9, None),
+            ("sec", "u1", 10, None),
+            ("valid", "u1", 11, None),
+            ("tAcc (s)", "<u4", 12, 1e-9),
+            ("nano (s)", "<i4", 16, 1e-9),
+            ("fixType", "u1", 20, None),
+            ("flags", "u1", 21, None),
+            ("flags2", "u1", 22, None),
+            ("numSV", "u1", 23, None),
+            ("lon (deg.)", "<i4", 24, 1e-7),
+            ("lat (deg.)", "<i4", 28, 1e-7),
+            ("height (m)", "<i4", 32, 1e-3),
+            ("hMSL (m)", "<i4", 36, 1e-3),
+            ("hAcc (m)", "<u4", 40, 1e-3),
+            ("vAcc (m)", "<u4", 44, 1e-3),
+            ("velN (m/s)", "<i4", 48, 1e-3),
+            ("velE (m/s)", "<i4", 52, 1e-3),
+            ("velD (m/s)", "<i4", 56, 1e-3),
+            ("gSpeed (m/s)", "<i4", 60, 1e-3),
+            ("headMot (deg.)", "<i4", 64, 1e-5),
+            ("sAcc (m/s)", "<u4", 68, 1e-3),
+            ("headAcc (deg.)", "<u4", 72, 1e-5),
+            ("pDOP", "<u2", 76, 1e-2),
+            ("headVeh (deg.)", "<i4", 84, 1e-5),
+            ("magDec (deg.)", "<i2", 88, 1e-2),
+            ("magAcc (deg.)", "<u2", 90, 1e-2),
+        ],
+    ),
+}
+
+
+def extract_stream(records: Any) -> bytes:
+    """
+    Concatenate payloads of G pages into the UBX stream.
+
+    Parameters
+    ----------
+    records : bytes or np.ndarray
+        Concatenated pages of any header.
+
+    Returns
+    -------
+    bytes
+        UBX stream.
+    """
+    records = as_records(records)
+    return records[records[:, 0] == ord("G"), 1:].tobytes()
+
+
+def checksum(dat: bytes) -> bytes:
+    """
+    8-bit Fletcher checksum of UBX.
+
+    Parameters
+    ----------
+    dat : bytes
+        Class, id, length and payload.
+
+    Returns
+    -------
+    bytes
+        CK_A and CK_B.
+    """
+    ck_a = ck_b = 0
+    for value in dat:
+        ck_a = (ck_a + value) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return bytes([ck_a, ck_b])
+
+
+def index_messages(stream: Any) -> np.ndarray:
+    """
+    Index UBX messages of a stream.
+
+    Length and checksum of all sync chars are computed at once, and messages
+    whose checksum is valid are taken in the order of offset. Sync chars in
+    a valid message are skipped. Others are indexed with valid False, e.g.
+    messages broken by lost pages.
+
+    Parameters
+    ----------
+    stream : bytes or np.ndarray
+        UBX stream.
+
+    Returns
+    -------
+    np.ndarray
+        Index with INDEX_DTYPE. offset is the position of sync chars and
+        length is of payload.
+    """
+    buf = np.frombuffer(stream, dtype=np.uint8) if isinstance(stream, bytes) else stream
+    candidates = np.flatnonzero((buf[:-1] == SYNC[0]) & (buf[1:] == SYNC[1]))
+    candidates = candidates[candidates + HEADER_SIZE <= len(buf)]
+    length = buf[candidates + 4].astype(np.int64) | (
+        buf[candidates + 5].astype(np.int64) << 8
+    )
+    end = candidates + HEADER_SIZE + length + CHECKSUM_SIZE
+    # 最後の不完全なメッセージは含めない
+    complete = end <= len(buf)
+    candidates, length, end = candidates[complete], length[complete], end[complete]
+
+    # 累積和の差で全候補のチェックサムを計算、2**64での桁あふれは256の剰余に影響しない
+    p1 = np.zeros(len(buf) + 2, dtype=np.uint64)
+    np.cumsum(buf, dtype=np.uint64, out=p1[1 : len(buf) + 1])
+    p2 = np.zeros(len(buf) + 2, dtype=np.uint64)
+    np.cumsum(p1[: len(buf) + 1], dtype=np.uint64, out=p2[1:])
+    start = (candidates + 2).astype(np.int64)
+    stop = end - CHECKSUM_SIZE
+    n = (stop - start).astype(np.uint64)
+    ck_a = (p1[stop] - p1[start]) & 0xFF
+    ck_b = (p2[stop + 1] - p2[start + 1] - n * p1[start]) & 0xFF
+    valid = (ck_a == buf[stop]) & (ck_b == buf[stop + 1])
+
+    # 有効なメッセージの中に現れた同期文字は除く
+    keep = np.zeros(len(candidates), dtype=bool)
+    position = 0
+    for i, (offset, message_end, ok) in enumerate(
+        zip(candidates.tolist(), end.tolist(), valid.tolist())
+    ):
+        if offset < position:
+            continue
+        keep[i] = True
+        if ok:
+            position = message_end
+
+    index = np.empty(np.count_nonzero(keep), dtype=INDEX_DTYPE)
+    index["cls"] = buf[candidates[keep] + 2]
+    index["id"] = buf[candidates[keep] + 3]
+    index["offset"] = candidates[keep]
+    index["length"] = length[keep]
+    index["valid"] = valid[keep]
+    return index
+
+
+def decode(
+    stream: Any, index: np.ndarray, cls: int, message_id: int
+) -> Dict[str, np.ndarray]:
+    """
+    Decode valid messages of class and id into columns.
+
+    Parameters
+    ----------
+    stream : bytes or np.ndarray
+        UBX stream.
+    index : np.ndarray
+        Output of index_messages.
+    cls : int
+        Class of messages, one of MESSAGES.
+    message_id : int
+        ID of messages.
+
+    Returns
+    -------
+    Dict[str, np.ndarray]
+        Columns in the order of MESSAGES, scaled to the units of the names.
+    """
+    buf = np.frombuffer(stream, dtype=np.uint8) if isinstance(stream, bytes) else stream
+    _, fields = MESSAGES[cls, message_id]
+    size = max(offset + np.dtype(dtype).itemsize for _, dtype, offset, _ in fields)
+    selected = index[
+        index["valid"]
+        & (index["cls"] == cls)
+        & (index["id"] == message_id)
+        & (index["length"] >= size)
+    ]
+    # 全メッセージのペイロードを一度に切り出して構造化配列として読む
+    payload = buf[selected["offset"][:, np.newaxis] + HEADER_SIZE + np.arange(size)]
+    records = np.ascontiguousarray(payload).view(
+        np.dtype(
+            {
+                "names": [name for name, _, _, _ in fields],
+                "formats": [dtype for _, dtype, _, _ in fields],
+                "offsets": [offset for _, _, offset, _ in fields],
+                "itemsize": size,
+            }
+        )
+    )[:, 0]
+    columns = {}
+    for name, _, _, scaling in fields:
+        columns[name] = records[name] if scaling is None else records[name] * scaling
+    return columns
+
+
+def to_frame(columns: Dict[str, np.ndarray]) -> Optional[pd.DataFrame]:
+    """
+    Arrange decoded columns as rows of csv file.
+
+    Parameters
+    ----------
+    columns : Dict[str, np.ndarray]
+        Output of decode.
+
+    Returns
+    -------
+    pd.DataFrame or None
+        Rows with the header. None without messages.
+    """
+    if len(columns) == 0 or len(next(iter(columns.values()))) == 0:
+        return None
+    df = pd.DataFrame(columns)
+    df.columns = ["# " + df.columns[0]] + list(df.columns[1:])
+    return df
+
+
+def save_csv(
+    columns: Dict[str, np.ndarray], filename: str, append: bool = False
+) -> None:
+    """
+    Save decoded columns to csv file.
+
+    Parameters
+    ----------
+    columns : Dict[str, np.ndarray]
+        Output of decode.
+    filename : str
+        Name of the file.
+    append : bool, optional
+        Append to the existing file. The default is False.
+
+    Returns
+    -------
+    None.
+    """
+    df = to_frame(columns)
+    if df is not None:
+        write_csv(df, filename, append)
+
+
+def summary(index: np.ndarray) -> str:
+    """
+    Number of messages of each class and id.
+
+    Parameters
+    ----------
+    index : np.ndarray
+        Output of index_messages.
+
+    Returns
+    -------
+    str
+        Multi-line text.
+    """
+    text = []
+    valid = index[index["valid"]]
+    keys, counts = np.unique(valid[["cls", "id"]], return_counts=True)
+    for key, count in zip(keys, counts):
+        name = MESSAGES.get((int(key["cls"]), int(key["id"])), ("",))[0]
+        text.append(f"0x{key['cls']:02X} 0x{key['id']:02X} {name:10s}: {count:,}")
+    text.append(f"Invalid checksum: {len(index) - len(valid):,}")
+    return "\n".join(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode UBX messages of HPA_Navi.")
+    parser.add_argument("filename", help="log file (.dat) or UBX stream (.ubx)")
+    args = parser.parse_args()
+    with open(args.filename, "rb") as fobj:
+        dat = fobj.read()
+    name, ext = os.path.splitext(args.filename)
+    if ext.lower() != ".ubx":
+        dat = extract_stream(dat[: len(dat) // 32 * 32])
+    index = index_messages(dat)
+    print(summary(index))
+    for (cls, message_id), (message, _) in MESSAGES.items():
+        save_csv(decode(dat, index, cls, message_id), f"{name}_G_{message}.csv")
@@ -0,0 +1,80 @@
+import struct
+import unittest
+import numpy as np
+from UBXProcessor import *
+
+
+def make_message(cls: int, message_id: int, payload: bytes) -> bytes:
+    body = struct.pack("<BBH", cls, message_id, len(payload)) + payload
+    return SYNC + body + checksum(body)
+
+
+def make_pvt(itow: int, lat: float, lon: float) -> bytes:
+    payload = bytearray(92)
+    struct.pack_into("<IH5B", payload, 0, itow, 2024, 8, 1, 12, 34, 56)
+    struct.pack_into("<B3B", payload, 20, 3, 1, 0, 12)
+    struct.pack_into("<2i", payload, 24, round(lon * 1e7), round(lat * 1e7))
+    struct.pack_into("<3i", payload, 48, 1000, -2000, 300)
+    struct.pack_into("<H", payload, 76, 123)
+    return make_message(0x01, 0x07, bytes(payload))
+
+
+def make_posllh(itow: int, height: int) -> bytes:
+    return make_message(
+        0x01, 0x02, struct.pack("<I3iI2I", itow, 0, 0, height, 0, 0, 0)[:28]
+    )
+
+
+class TestUBX(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.messages = []
+        for i in range(50):
+            self.messages.append(make_pvt(1000 * i, 35.0 + i * 1e-5, 139.0))
+            self.messages.append(make_posllh(1000 * i, 10000 + i))
+            self.messages.append(make_message(0x0A, 0x04, b"\xb5\x62" + bytes(30)))
+        # 同期文字を含むゴミと、途中で切れたメッセージ
+        self.stream = (
+            b"\xb5\x62\x01"
+            + b"".join(self.messages[:30])
+            + make_pvt(0, 0.0, 0.0)[:40]
+            + b"".join(self.messages[30:])
+            + rng.integers(0, 256, 11, dtype=np.uint8).tobytes()
+        )
+
+    def test_checksum(self):
+        # 累積和による一括計算と逐次計算が一致
+        index = index_messages(self.stream)
+        valid = index[index["valid"]]
+        self.assertEqual(len(valid), len(self.messages))
+        for entry, message in zip(valid, self.messages):
+            start = entry["offset"]
+            self.assertEqual(self.stream[start : start + entry["length"] + 8], message)
+        # 先頭のゴミと切れたメッセージは無効として索引に残る
+        self.assertEqual(np.count_nonzero(~index["valid"]), 2)
+
+    def test_decode(self):
+        index = index_messages(self.stream)
+        pvt = decode(self.stream, index, 0x01, 0x07)
+        np.testing.assert_allclose(pvt["iTOW (s)"], np.arange(50))
+        np.testing.assert_allclose(pvt["lat (deg.)"], 35.0 + np.arange(50) * 1e-5)
+        np.testing.assert_array_equal(pvt["numSV"], 12)
+        np.testing.assert_array_equal(pvt["year"], 2024)
+        np.testing.assert_allclose(pvt["velE (m/s)"], -2.0)
+        np.testing.assert_allclose(pvt["pDOP"], 1.23)
+        posllh = decode(self.stream, index, 0x01, 0x02)
+        np.testing.assert_allclose(posllh["height (m)"], 10.0 + np.arange(50) * 1e-3)
+        empty = decode(b"", index_messages(b""), 0x01, 0x07)
+        self.assertEqual(len(empty["lat (deg.)"]), 0)
+
+    def test_extract_stream(self):
+        stream = self.stream[: len(self.stream) // 31 * 31]
+        pages = np.zeros((len(stream) // 31 * 2, 32), dtype=np.uint8)
+        pages[0::2, 0] = ord("G")
+        pages[0::2, 1:] = np.frombuffer(stream, dtype=np.uint8).reshape(-1, 31)
+        pages[1::2, 0] = ord("A")
+        self.assertEqual(extract_stream(pages.tobytes()), stream)
+
+
+if __name__ == "__main__":
+    unittest.main()